@@ -1,6 +1,11 @@
 import sys
 import os
+import io
+import csv
 import json
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 import docx
 import docx.oxml
 from docx import Document
@@ -8,57 +13,23 @@ from docx.oxml import parse_xml
 from lxml import etree
 from openpyxl import Workbook
 from openpyxl.styles import Font
+from openpyxl.cell import WriteOnlyCell
 from docx.oxml import CT_P, CT_Tbl
 from docx.shared import Pt, RGBColor
 import re
+from stream_docx import StreamingDocxWriter
+from warm_cache import FileCache
+# Answers starting with this phrase are highlighted in red in the final document
+from local_rules import UNSATISFIED_PHRASE
+from run_context import RunContext, AI_RESPONSES_FILE
 
 # Hardcoded paths (Update these paths as needed)
 TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates") # points towards the templates 
 JSON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ephemeral/ai_responses.json") #points towards ai_responses
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "BLITZ-output")
 
-# Ensure output directory exists
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# Get selected SDs from command-line arguments or use default
-selected_sds = sys.argv[1:] if len(sys.argv) > 1 else ["NDcPP_v3.0"] # Example: ["NDcPP_v3.0", "PKG_SSH_v1.0"]
-#selected_sds = ["NDcPP_v3.0"] # Default for testing
-
-print(f"Processing SDs: {selected_sds}")
-template_paths = [os.path.join(TEMPLATE_DIR, f"{sd}-template.docx") for sd in selected_sds]
-
-# Load JSON input
-try:
-    
-    # Load from JSON file 
-    with open(JSON_PATH, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    # -------------------------
-    doc_data = data.get("DOC", [])
-    excel_data = data.get("Excel", [])
-    print(f"Loaded JSON data.") #(Source: {JSON_PATH if 'f' in locals() else 'string'})")
-except FileNotFoundError:
-    print(f"Error: JSON input file not found at {JSON_PATH}")
-    sys.exit(1)
-except json.JSONDecodeError as e:
-    print(f"Error: Could not decode JSON: {e}")
-    sys.exit(1)
-
-# Load all template documents
-template_docs = []
-for path in template_paths:
-    if os.path.exists(path):
-        try:
-            template_docs.append(Document(path))
-            print(f"Loaded template: {path}")
-        except Exception as e:
-            print(f"Error loading template {path}: {e}")
-    else:
-        print(f"Warning: Template file not found: {path}")
-
-if not template_docs:
-    print("Error: No template documents were successfully loaded. Exiting.")
-    sys.exit(1)
+# Heading of the section that is always added first when present in a template
+GENERAL_REQ_HEADING_PART = "GENERAL REQUIREMENTS FOR DISTRIBUTED TOES" # Match partial heading
 
 # Helper function to iterate through block items (paragraphs and tables) in order
 def iter_block_items(parent):
@@ -81,34 +52,73 @@ def find_placeholders(text):
     # Regex to find <Ans# followed by one or more digits, then >
     return re.findall(r"<Ans#\d+>", text)
 
+# HELPER FUNCTION to get the text of a content block for placeholder checks
+def get_block_text(block):
+    """Returns the text of a paragraph, or of every cell paragraph of a table.
+
+    Table text is read from the <w:tc> elements directly instead of through
+    row.cells, which rebuilds the merged-cell grid on every access. row.cells
+    repeats a merged cell's text (after the cell for a horizontal merge, in the
+    following rows for a vertical one), so the repeats always come after the
+    first occurrence: the placeholders are found in the same first-occurrence
+    order, which is all read_answer_keys and select_tss_content use.
+    """
+    if isinstance(block, docx.text.paragraph.Paragraph):
+        return block.text
+    if isinstance(block, docx.table.Table):
+        return "\n".join(
+            docx.text.paragraph.Paragraph(p, block).text
+            for p in block._tbl.xpath('./w:tr/w:tc/w:p')
+        )
+    return ""
+
+# Heading level of the heading styles the structure is built from (other blocks are content)
+HEADING_LEVELS = {'Heading 3': 3, 'Heading 4': 4, 'Heading 5': 5}
+
+# Compiled template plans and answer keys, kept between runs of a long-lived process (blitz_daemon.py)
+_template_plans = FileCache()
+_template_keys = FileCache()
+
+# Compile the heading levels of a template's body blocks
+def compile_template_plan(doc):
+    """Returns the heading level (3-5, or 0 for content) of each body block of a document, in order.
+
+    Looking up the paragraph styles is most of the cost of build_heading_structure; the plan
+    lets the structure of a fresh copy of the same template be built without it.
+    """
+    return [HEADING_LEVELS.get(block.style.name, 0) if isinstance(block, docx.text.paragraph.Paragraph) else 0
+            for block in iter_block_items(doc)]
+
 # Build hierarchical heading structure for a document
-def build_heading_structure(doc):
+def build_heading_structure(doc, plan=None):
     structure = []
     current_h3 = None
     current_h4 = None
     current_h5 = None
-    for block in iter_block_items(doc):
+    if plan is None:
+        plan = compile_template_plan(doc)
+    for block, level in zip(iter_block_items(doc), plan):
         if isinstance(block, docx.text.paragraph.Paragraph):
-            style_name = block.style.name
             text = block.text.strip()
 
-            if style_name == 'Heading 3':
-                current_h3 = {'paragraph': block, 'subheadings': [], 'needed': False}
+            if level == 3:
+                current_h3 = {'paragraph': block, 'text': text, 'subheadings': [], 'needed': False}
                 structure.append(current_h3)
                 current_h4 = None
                 current_h5 = None
-            elif style_name == 'Heading 4':
+            elif level == 4:
                 if current_h3 is not None:
-                    current_h4 = {'paragraph': block, 'subheadings': [], 'needed': False}
+                    current_h4 = {'paragraph': block, 'text': text, 'subheadings': [], 'needed': False}
                     current_h3['subheadings'].append(current_h4)
                     current_h5 = None
-            elif style_name == 'Heading 5':
+            elif level == 5:
                 if current_h4 is not None:
                     is_tss = text.endswith(" TSS")
                     is_agd = text.endswith(" AGD")
                     sfr_base = text[:-4] if is_tss or is_agd else text # Base name
                     current_h5 = {
                         'paragraph': block,
+                        'text': text,
                         'content': [],
                         'referenced': False,
                         'is_tss': is_tss,
@@ -158,20 +168,22 @@ def modify_table(table, answers):
             # Apply all replacements to each paragraph within the cell
             for paragraph in cell.paragraphs:
                  # Pass the paragraph and the *entire* answers dict to the new function
-                 replace_all_placeholders_in_paragraph(paragraph, answers)
+                 replace_all_placeholders_in_paragraph(paragraph, answers, highlight_unsatisfied=True)
     else:
         print("Warning: Table has less than 2 rows, cannot modify.")
 
 
 # Replace text in a cell's paragraphs, handling splits across runs. Replace multiple placeholders within a single paragraph's text
 # Replace multiple placeholders and return True if any changes were made
-def replace_all_placeholders_in_paragraph(paragraph, replacements):
+def replace_all_placeholders_in_paragraph(paragraph, replacements, highlight_unsatisfied=False):
     """Replaces all placeholders found in the paragraph's text using the replacements dictionary.
 
     Args:
         paragraph: The docx paragraph object.
         replacements: A dictionary where keys are placeholders (e.g., '<Ans#1>')
                       and values are the replacement strings.
+        highlight_unsatisfied: If True, the rebuilt run is coloured red when the
+                      resulting text contains UNSATISFIED_PHRASE.
 
     Returns:
         bool: True if any placeholder was found and replaced in the paragraph, False otherwise.
@@ -199,6 +211,9 @@ def replace_all_placeholders_in_paragraph(paragraph, replacements):
         # Add a new run with the fully modified text
         new_run = paragraph.add_run(modified_text)
         new_run.bold = True
+        if highlight_unsatisfied and UNSATISFIED_PHRASE in modified_text:
+            # Highlight the requirements that are not being satisfied in red colour
+            new_run.font.color.rgb = RGBColor(255, 0, 0)
         # print(f"    Rebuilt paragraph with modified text.") # Debug print
         return True # Indicate replacement occurred
     else:
@@ -206,60 +221,64 @@ def replace_all_placeholders_in_paragraph(paragraph, replacements):
         return False # Indicate no replacement occurred
 
 
-# Copy a block (paragraph or table) to the target document
-def copy_block_to_doc(target_doc, block):
+# Serialize a block (paragraph or table) so it can be copied into another document
+def serialize_block(block):
     if isinstance(block, docx.text.paragraph.Paragraph):
         elem = block._element
     elif isinstance(block, docx.table.Table):
         elem = block._tbl
     else:
-        return
+        return None
+    if elem is None:
+        return None
+    return etree.tostring(elem, encoding='unicode')
+
 
+# Append a serialized block to the target document
+# The target is either a docx Document or a StreamingDocxWriter (--stream mode)
+# source is the template the block was taken from (the writer merges its numbering and relationships)
+def append_xml_to_doc(target_doc, xml_string, source=None):
     try:
-        if elem is not None:
-            xml_string = etree.tostring(elem, encoding='unicode')
-            if xml_string:
-                copied_elem = parse_xml(xml_string)
-                target_doc.element.body.append(copied_elem)
-            # else: print(f"Warning: XML string for {type(block).__name__} is empty.")
-        # else: print(f"Warning: Element for {type(block).__name__} is None.")
+        if not xml_string:
+            return
+        if isinstance(target_doc, StreamingDocxWriter):
+            # Written straight into the output zip, no copy is kept in memory
+            target_doc.append_xml(xml_string, source)
+        else:
+            copied_elem = parse_xml(xml_string)
+            target_doc.element.body.append(copied_elem)
     except Exception as e:
-        print(f"Error copying element {type(block).__name__}: {e}")
+        print(f"Error copying element: {e}")
 
 
-# --- Main Script Logic ---
-
-# Build structures and link AGD
-structures = {}
-for sd, doc in zip(selected_sds, template_docs):
-    print(f"\nBuilding structure for {sd}...")
-    structures[sd] = build_heading_structure(doc)
-    print(f"Linking AGD sections for {sd}...")
-    link_agd_to_tss(structures[sd])
+# Copy a block (paragraph or table) to the target document
+def copy_block_to_doc(target_doc, block):
+    try:
+        append_xml_to_doc(target_doc, serialize_block(block))
+    except Exception as e:
+        print(f"Error copying element {type(block).__name__}: {e}")
 
-# Build mapping from base SFR name to (sd, h5_node) for TSS sections
-sfr_to_tss_node = {}
-for sd, structure in structures.items():
-    for h3 in structure:
-        for h4 in h3['subheadings']:
-            for h5 in h4['subheadings']:
-                if h5['is_tss']:
-                    sfr_base = h5['sfr_base']
-                    if sfr_base not in sfr_to_tss_node:
-                       sfr_to_tss_node[sfr_base] = (sd, h5)
 
 # Mark referenced TSS nodes and modify their content based on JSON
-print("\nProcessing JSON data for document modifications...")
-for obj in doc_data:
-    sfr = obj.get("SFR")
-    if sfr and sfr in sfr_to_tss_node:
-        sd, h5_node = sfr_to_tss_node[sfr]
+def apply_answers(sd, sfr_to_tss_node, doc_data):
+    """Fills the <Ans#N> placeholders of the TSS sections referenced by the JSON 'DOC' objects.
+
+    Args:
+        sd: Name of the SD whose template nodes are being modified.
+        sfr_to_tss_node: Mapping of base SFR name to its TSS H5 node in this SD.
+        doc_data: The aggregated 'DOC' objects from ai_responses.json.
+    """
+    for obj in doc_data:
+        sfr = obj.get("SFR")
+        if not sfr or sfr not in sfr_to_tss_node:
+            continue
+        h5_node = sfr_to_tss_node[sfr]
         print(f"\nProcessing SFR: {sfr} (found in {sd})") # Debug print
 
         # Mark node as referenced if not already
         if not h5_node['referenced']:
             h5_node['referenced'] = True
-            print(f"  Marked TSS as referenced: '{h5_node['paragraph'].text.strip()}'")
+            print(f"  Marked TSS as referenced: '{h5_node['text']}'")
 
         # Extract answers and store the keys provided for this SFR
         answers = {k: v for k, v in obj.items() if k.startswith("Ans#")}
@@ -271,235 +290,586 @@ for obj in doc_data:
             print(f"  No 'Ans#' found for SFR '{sfr}' in JSON object. Skipping content modification.") # Debug print
             continue # No answers to process for this SFR
 
-        print(f"  Applying replacements to content blocks of '{h5_node['paragraph'].text.strip()}'...") # Debug print
+        print(f"  Applying replacements to content blocks of '{h5_node['text']}'...") # Debug print
         # Iterate through ALL content blocks (paragraphs and tables) associated with this H5
-        for block_idx, block in enumerate(h5_node['content']):
+        for block in h5_node['content']:
             if isinstance(block, docx.text.paragraph.Paragraph):
                 # Apply replacements directly to the paragraph
-                # print(f"    Processing content paragraph {block_idx}: '{block.text[:50]}...'") # Debug
                 replace_all_placeholders_in_paragraph(block, answers)
             elif isinstance(block, docx.table.Table):
                 # Apply replacements to all paragraphs within all cells of the table
-                # print(f"    Processing content table {block_idx}...") # Debug
-                for row_idx, row in enumerate(block.rows):
-                    for cell_idx, cell in enumerate(row.cells):
-                        for para_idx, paragraph in enumerate(cell.paragraphs):
-                            # print(f"      Processing table para ({row_idx},{cell_idx},{para_idx}): '{paragraph.text[:50]}...'") # Debug
-                            replace_all_placeholders_in_paragraph(paragraph, answers)
-    elif sfr:
-        print(f"Warning: SFR '{sfr}' from JSON not found as a TSS heading in templates.")
-
-# Propagate 'needed' flags upwards
-print("\nPropagating 'needed' flags...")
-for sd, structure in structures.items():
+                for row in block.rows:
+                    for cell in row.cells:
+                        for paragraph in cell.paragraphs:
+                            replace_all_placeholders_in_paragraph(paragraph, answers, highlight_unsatisfied=True)
+
+
+# Load a template with its heading structure
+def load_template(template_path):
+    """Returns (doc, structure) of a freshly loaded template, using its cached plan if it is unchanged."""
+    doc = Document(template_path)
+    plan = _template_plans.get(template_path, lambda _: compile_template_plan(doc))
+    return doc, build_heading_structure(doc, plan)
+
+
+# Collect the <Ans#N> placeholders that each TSS H5 of one template expects
+def read_answer_keys(template_path):
+    """Returns base SFR name -> answer keys of a template's TSS sections (first section of an SFR wins)."""
+    _, structure = load_template(template_path)
+    keys_by_sfr = {}
     for h3 in structure:
-        h3_needed = False
         for h4 in h3['subheadings']:
-            h4_needed = False
             for h5 in h4['subheadings']:
-                is_needed_agd = h5['linked_as_agd'] and any(tss_h5['referenced'] for tss_h5 in h4['subheadings'] if tss_h5['is_tss'] and tss_h5['sfr_base'] == h5['sfr_base'])
-                if h5['referenced'] or is_needed_agd:
-                    h4_needed = True
-                    h3_needed = True
-            h4['needed'] = h4_needed
-        h3['needed'] = h3_needed
-
-# Create the final AAR-TSS document
-print("\nCreating final AAR-TSS document...")
-final_doc = Document()
-
-# Apply basic styles (or copy from template if needed)
-try:
-    heading3_style = final_doc.styles['Heading 3']
-    # Apply formatting as needed
-    heading4_style = final_doc.styles['Heading 4']
-    # Apply formatting as needed
-    heading5_style = final_doc.styles['Heading 5']
-    # Apply formatting as needed
-    normal_style = final_doc.styles['Normal']
-    normal_style.font.name = 'Calibri'
-    normal_style.font.size = Pt(11)
-except KeyError as e:
-    print(f"Warning: Style {e} not found in default document. Formatting may differ.")
-
-# Add Content to Final Document (including General Reqs and Needed sections)
-general_req_heading_part = "GENERAL REQUIREMENTS FOR DISTRIBUTED TOES"
-general_req_added = False
-
-
-# --- Add Content to Final Document ---
-
-# Add the general requirements section first, if it exists and is needed
-general_req_heading_part = "GENERAL REQUIREMENTS FOR DISTRIBUTED TOES" # Match partial heading
-general_req_added = False
-for sd in selected_sds:
-    structure = structures[sd]
+                if not h5['is_tss'] or h5['sfr_base'] in keys_by_sfr:
+                    continue
+                keys = []
+                for block in h5['content']:
+                    for placeholder in find_placeholders(get_block_text(block)):
+                        key = placeholder.strip("<>")
+                        if key not in keys:
+                            keys.append(key)
+                keys_by_sfr[h5['sfr_base']] = keys
+    return keys_by_sfr
+
+
+# Collect the <Ans#N> placeholders that each TSS H5 of the selected templates expects
+def template_answer_keys(selected_sds):
+    """Returns the answer keys each SFR's TSS section expects, read from the SD templates.
+
+    An SFR that appears in several templates takes the keys of the first selected SD that
+    has it, since that SD's section is the one merged into the report.
+
+    Args:
+        selected_sds: SD names in selection order (e.g. ["NDcPP_v3.0", "PKG_SSH_v1.0"]).
+
+    Returns:
+        dict: Base SFR name -> list of answer keys in template order (e.g. ['Ans#1', 'Ans#2']).
+    """
+    expected_keys = {}
+    for sd in selected_sds:
+        template_path = os.path.join(TEMPLATE_DIR, f"{sd}-template.docx")
+        try:
+            keys_by_sfr = _template_keys.get(template_path, read_answer_keys)
+        except Exception as e:
+            print(f"Warning: Could not load template {template_path}: {e}")
+            continue
+        for sfr_base, keys in keys_by_sfr.items():
+            expected_keys.setdefault(sfr_base, list(keys))
+    return expected_keys
+
+
+# Select the content blocks of a referenced TSS H5 that go into the final document
+def select_tss_content(h5):
+    """Returns the serialized content blocks of a referenced TSS H5, skipping blocks
+    whose first <Ans#N> placeholder was not answered in the JSON."""
+    selected = []
+    # Get the set of answer keys provided for this specific H5 node
+    provided_keys = h5.get('provided_answer_keys', set()) # Default to empty set
+    print(f"      Processing {len(h5['content'])} content block(s) for {h5['text']}. Provided keys: {provided_keys}") # Debug
+
+    for block_idx, block in enumerate(h5['content']):
+        # Find placeholders in the block's text (using the helper function)
+        placeholders_in_block = find_placeholders(get_block_text(block))
+
+        if placeholders_in_block:
+            # If there are placeholders, check if the *first* one found was provided in the JSON
+            primary_placeholder = placeholders_in_block[0] # e.g., "<Ans#3>"
+            # Extract the key part, e.g., "Ans#3"
+            primary_key = primary_placeholder.strip("<>") # Removes < and >
+
+            if primary_key not in provided_keys:
+                print(f"        Skipping block {block_idx} ({type(block).__name__}) because primary placeholder '{primary_placeholder}' key '{primary_key}' not in provided keys {provided_keys}") # Debug
+                continue # Skip this block
+
+        selected.append(serialize_block(block))
+    return selected
+
+
+# Build one SD's contribution to the report (runs in a worker process when several SDs are selected)
+def build_sd_fragment(sd, template_path, doc_data, plan=None, owned_elsewhere=(), capture_output=False):
+    """Loads one SD template, applies the JSON answers to it and returns its report fragment.
+
+    The fragment is computed as if this SD were the only one selected, except that the
+    answers of SFRs in owned_elsewhere are not applied. Which SD owns an SFR that appears
+    in several templates, and which H5 headings were already emitted by an earlier SD, is
+    decided afterwards by SDFragmentMerger in selected_sds order.
+
+    Args:
+        sd: Name of the SD (e.g. "NDcPP_v3.0").
+        template_path: Path to the SD's AAR template.
+        doc_data: The aggregated 'DOC' objects from ai_responses.json.
+        plan: compile_template_plan() of the template, if already known.
+        owned_elsewhere: Base SFR names whose TSS heading is in an earlier selected SD's template.
+        capture_output: Collect the console output in fragment['log'] instead of printing it
+            (in worker processes, so the logs of the SDs are not interleaved).
+
+    Returns:
+        dict: Picklable fragment with the serialized blocks, the SD's TSS sfr_bases and
+              the console output produced while building it (if captured).
+    """
+    fragment = {'sd': sd, 'template_path': template_path, 'loaded': False,
+                'tss_bases': [], 'general_req': None, 'h3s': [], 'log': ""}
+    if not capture_output:
+        _fill_sd_fragment(fragment, doc_data, plan, owned_elsewhere)
+        return fragment
+    # Only in a worker process: redirect_stdout swaps sys.stdout for every thread of the process
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        _fill_sd_fragment(fragment, doc_data, plan, owned_elsewhere)
+    fragment['log'] = log.getvalue()
+    return fragment
+
+
+def _fill_sd_fragment(fragment, doc_data, plan, owned_elsewhere):
+    """Loads the fragment's template and adds its selected blocks to the fragment (see build_sd_fragment)."""
+    sd, template_path = fragment['sd'], fragment['template_path']
+    try:
+        doc = Document(template_path)
+        print(f"Loaded template: {template_path}")
+    except Exception as e:
+        print(f"Error loading template {template_path}: {e}")
+        return
+    fragment['loaded'] = True
+
+    # Build structure and link AGD
+    print(f"\nBuilding structure for {sd}...")
+    structure = build_heading_structure(doc, plan)
+    print(f"Linking AGD sections for {sd}...")
+    link_agd_to_tss(structure)
+
+    # Build mapping from base SFR name to the first TSS h5_node in this SD
+    # and from each TSS node to its parent H4 so 'needed' flags can be set directly
+    sfr_to_tss_node = {}
+    tss_node_h4 = {}
     for h3 in structure:
-        if h3['paragraph'].text.strip().startswith(general_req_heading_part):
-             print(f"Adding General Requirements section found in {sd}")
-             copy_block_to_doc(final_doc, h3['paragraph'])
-             for h4 in h3['subheadings']:
-                 copy_block_to_doc(final_doc, h4['paragraph'])
-                 for h5 in h4['subheadings']:
-                     copy_block_to_doc(final_doc, h5['paragraph'])
-                     for block in h5['content']:
-                         copy_block_to_doc(final_doc, block)
-                     if h5['agd_content']:
-                          for agd_block in h5['agd_content']:
-                              copy_block_to_doc(final_doc, agd_block)
-             general_req_added = True
-             break
-    if general_req_added:
-        break
-
-if not general_req_added:
-    print("General Requirements section not found or not added.")
-
-# Add all needed sections based on referenced TSS and their parents/linked AGDs
-processed_h5_texts = set()
-
-# Add all needed sections based on referenced TSS and their parents/linked AGDs
-processed_h5_texts = set() # Keep track of H5 headings already added to avoid duplication
-
-for sd in selected_sds:
-    structure = structures[sd]
+        for h4 in h3['subheadings']:
+            for h5 in h4['subheadings']:
+                if h5['is_tss'] and h5['sfr_base'] not in sfr_to_tss_node:
+                    sfr_to_tss_node[h5['sfr_base']] = h5
+                    tss_node_h4[id(h5)] = h4
+    fragment['tss_bases'] = list(sfr_to_tss_node)
+
+    # SFRs of an earlier SD are merged from that SD's template
+    apply_answers(sd, {sfr_base: h5 for sfr_base, h5 in sfr_to_tss_node.items() if sfr_base not in owned_elsewhere},
+                  doc_data)
+
+    # Record which referenced sfr_bases make each H4 needed
+    for sfr_base, h5 in sfr_to_tss_node.items():
+        if h5['referenced']:
+            tss_node_h4[id(h5)].setdefault('needed_bases', set()).add(sfr_base)
+
     for h3 in structure:
-        # Skip the general reqs H3 if it was handled separately and already added
-        if general_req_added and h3['paragraph'].text.strip().startswith(general_req_heading_part):
+        if h3['text'].startswith(GENERAL_REQ_HEADING_PART):
+            # Handled separately: the first SD that has it contributes it in full
+            if fragment['general_req'] is None:
+                general_req = [serialize_block(h3['paragraph'])]
+                for h4 in h3['subheadings']:
+                    general_req.append(serialize_block(h4['paragraph']))
+                    for h5 in h4['subheadings']:
+                        general_req.append(serialize_block(h5['paragraph']))
+                        general_req.extend(serialize_block(block) for block in h5['content'])
+                        general_req.extend(serialize_block(block) for block in h5['agd_content'])
+                fragment['general_req'] = general_req
             continue
 
-        if h3['needed']:
-            print(f"Adding needed H3: {h3['paragraph'].text.strip()}")
-            copy_block_to_doc(final_doc, h3['paragraph']) # Copy H3 heading
+        h3_entry = {'text': h3['text'], 'xml': serialize_block(h3['paragraph']), 'h4s': []}
+        for h4 in h3['subheadings']:
+            if not h4.get('needed_bases'):
+                continue
+            h4_entry = {'text': h4['text'], 'xml': serialize_block(h4['paragraph']),
+                        'needed_bases': h4['needed_bases'], 'h5s': []}
+            for h5 in h4['subheadings']:
+                if h5['referenced'] and not h5['linked_as_agd']:
+                    agd_text = h5['agd_content'][0].text.strip() if h5['agd_content'] else None # First block is the AGD H5 paragraph
+                    h4_entry['h5s'].append({
+                        'kind': 'tss',
+                        'sfr_base': h5['sfr_base'],
+                        'text': h5['text'],
+                        'xml': serialize_block(h5['paragraph']),
+                        'blocks': select_tss_content(h5),
+                        'agd_text': agd_text,
+                        'agd_blocks': [serialize_block(block) for block in h5['agd_content']],
+                    })
+                elif not h5['is_tss'] and not h5['linked_as_agd']:
+                    h4_entry['h5s'].append({
+                        'kind': 'misc',
+                        'text': h5['text'],
+                        'xml': serialize_block(h5['paragraph']),
+                        'blocks': [serialize_block(block) for block in h5['content']],
+                    })
+            h3_entry['h4s'].append(h4_entry)
+        if h3_entry['h4s']:
+            fragment['h3s'].append(h3_entry)
+
+
+# Merge the SD fragments, in selected_sds order, into the blocks of the final document
+class SDFragmentMerger:
+    """Selects the blocks of each SD fragment for the final document as the fragments arrive.
+
+    Fragments must be added in selected_sds order. A fragment's blocks are passed to emit as
+    soon as it is added, so only the ownership and heading indexes stay in memory; the general
+    requirements section (which goes first in the document) is kept in general_req.
 
-            for h4 in h3['subheadings']:
-                if h4['needed']:
-                    print(f"  Adding needed H4: {h4['paragraph'].text.strip()}")
-                    copy_block_to_doc(final_doc, h4['paragraph']) # Copy H4 heading
+    Args:
+        emit: Called with each selected serialized block and the path of the template it was
+              taken from, in document order (after the general requirements section).
+
+    Attributes:
+        sfr_owner: Base SFR name -> first SD whose template holds its TSS heading.
+        general_req: (sd, template_path, blocks) of the first fragment with a general requirements
+                     section, or None.
+        block_count: Number of blocks passed to emit.
+    """
 
-                    for h5 in h4['subheadings']:
-                        h5_text = h5['paragraph'].text.strip()
-                        is_agd_linked_to_needed_tss = h5['linked_as_agd'] # Check if it's an AGD linked earlier
-
-                        # Primary condition: Process H5 if it's a TSS node that was referenced by JSON
-                        if h5['referenced'] and not h5['linked_as_agd']:
-                           if h5_text not in processed_h5_texts:
-                                print(f"    Adding referenced TSS H5: {h5_text}")
-                                copy_block_to_doc(final_doc, h5['paragraph']) # Copy H5 heading
-                                processed_h5_texts.add(h5_text) # Mark heading as added
-
-                                # --- Conditional Content Copying ---
-                                # Get the set of answer keys provided for this specific H5 node
-                                provided_keys = h5.get('provided_answer_keys', set()) # Default to empty set
-                                print(f"      Processing {len(h5['content'])} content block(s) for {h5_text}. Provided keys: {provided_keys}") # Debug
-
-                                for block_idx, block in enumerate(h5['content']):
-                                    copy_this_block = True # Assume we copy unless a rule says otherwise
-                                    block_text = ""
-
-                                    # Get text content to check for placeholders
-                                    if isinstance(block, docx.text.paragraph.Paragraph):
-                                        block_text = block.text
-                                    elif isinstance(block, docx.table.Table):
-                                        # Combine text from all cells for placeholder checking
-                                        try:
-                                            block_text = "\n".join(cell.text for row in block.rows for cell in row.cells)
-                                        except Exception:
-                                             block_text = "" # Handle potential errors getting table text
-
-                                    # Find placeholders in the block's text (using the helper function)
-                                    placeholders_in_block = find_placeholders(block_text)
-
-                                    if placeholders_in_block:
-                                        # If there are placeholders, check if the *first* one found was provided in the JSON
-                                        primary_placeholder = placeholders_in_block[0] # e.g., "<Ans#3>"
-                                        # Extract the key part, e.g., "Ans#3"
-                                        primary_key = primary_placeholder.strip("<>") # Removes < and >
-
-                                        if primary_key not in provided_keys:
-                                            copy_this_block = False # Skip this block
-                                            print(f"        Skipping block {block_idx} ({type(block).__name__}) because primary placeholder '{primary_placeholder}' key '{primary_key}' not in provided keys {provided_keys}") # Debug
-
-                                    # Copy the block if it passed the check
-                                    if copy_this_block:
-                                        # print(f"        Copying block {block_idx} ({type(block).__name__})") # Debug
-                                        copy_block_to_doc(final_doc, block)
-                                    # else: Already printed reason for skipping
-                                # --- End Conditional Content Copying ---
-
-                                # --- Add linked AGD content unconditionally if TSS was added ---
-                                if h5['agd_content']:
-                                    agd_h5_para = h5['agd_content'][0] # First block is the AGD H5 paragraph
-                                    agd_h5_text = agd_h5_para.text.strip()
-                                    print(f"    Adding linked AGD section: {agd_h5_text}")
-                                    if agd_h5_text not in processed_h5_texts:
-                                        # Copy all blocks stored in agd_content (heading + content)
-                                        for agd_block in h5['agd_content']:
-                                            copy_block_to_doc(final_doc, agd_block)
-                                        processed_h5_texts.add(agd_h5_text) # Mark AGD heading as processed
-                                    else:
-                                         print(f"    Skipping already processed AGD: {agd_h5_text}") # Debug
-                                # else: print(f"    No linked AGD content found for {h5_text}") # Debug
-                           else:
-                                print(f"    Skipping already processed TSS H5: {h5_text}") # Debug
-
-                        # Condition 2: Handle miscellaneous H5s under a needed H4 that aren't TSS/AGD
-                        # Only copy these if they haven't been linked as AGD elsewhere
-                        elif not h5['is_tss'] and not h5['linked_as_agd']:
-                            # Check if this miscellaneous H5 has already been added
-                            if h5_text not in processed_h5_texts:
-                                print(f"    Adding miscellaneous needed H5: {h5_text}")
-                                copy_block_to_doc(final_doc, h5['paragraph']) # Copy H5 heading
-                                processed_h5_texts.add(h5_text) # Mark heading as added
-                                # Copy its content unconditionally (assuming misc sections don't use <Ans#>)
-                                # Or apply conditional logic if they might contain placeholders too
-                                print(f"      Adding {len(h5['content'])} content block(s) for misc H5 {h5_text}")
-                                for block in h5['content']:
-                                    copy_block_to_doc(final_doc, block)
-                            # else: print(f"    Skipping already processed misc H5: {h5_text}") # Debug
-# (The loop structure continues until all H3/H4/H5 are processed)
-
-# For highlighting the requirements that are not being satisfied in red colour.
-for table in final_doc.tables:
-    for row in table.rows:
-        for cell in row.cells:
-            for paragraph in cell.paragraphs:
-                if "This requirement is not being satisfied." in paragraph.text:
-                    for run in paragraph.runs:
-                        run.font.color.rgb = RGBColor(255, 0, 0)
-
-# Save the final document
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
-final_doc_path = os.path.join(OUTPUT_DIR, "AAR-TSS.docx")
-try:
-    final_doc.save(final_doc_path)
-    print(f"\nSuccessfully saved AAR-TSS document to {final_doc_path}")
-except Exception as e:
-    print(f"\nError saving final document: {e}")
-
-# Create the Gaps Excel sheet
-print("\nCreating Gaps Excel sheet...")
-wb = Workbook()
-ws = wb.active
-ws.title = "Gaps"
-header = ["SFR", "TSS-requirement", "Missing information"]
-ws.append(header)
-for cell in ws[1]:
-    cell.font = Font(bold=True)
-
-for obj in excel_data:
-    ws.append([
-        obj.get("SFR", ""),
-        obj.get("TSS-requirement", ""),
-        obj.get("Missing information", "")
-    ])
-
-excel_path = os.path.join(OUTPUT_DIR, "Gaps.xlsx")
-try:
-    wb.save(excel_path)
-    print(f"Successfully saved Gaps sheet to {excel_path}")
-except Exception as e:
-    print(f"Error saving Gaps Excel sheet: {e}")
-
-print("\nScript finished.")
\ No newline at end of file
+    def __init__(self, emit):
+        self.emit = emit
+        self.sfr_owner = {}
+        self.general_req = None
+        self.block_count = 0
+        self._fragment_count = 0
+        self._template_path = None
+        # A TSS H5 is emitted once, by the owner of its sfr_base (only the first TSS H5 of an sfr_base
+        # is referenced in a fragment). An AGD or miscellaneous H5 heading can appear under several H4s
+        # and SDs; it is emitted at its first position, recorded here as (fragment, H3, H4, H5) indexes.
+        self._h5_first_position = {}
+
+    def _emit(self, xml_string):
+        self.emit(xml_string, self._template_path)
+        self.block_count += 1
+
+    def add(self, fragment):
+        """Emit the blocks of the next SD's fragment that are not owned or emitted by an earlier SD."""
+        sd = fragment['sd']
+        fragment_idx = self._fragment_count
+        self._fragment_count += 1
+        self._template_path = fragment['template_path']
+        for sfr_base in fragment['tss_bases']:
+            self.sfr_owner.setdefault(sfr_base, sd)
+        if self.general_req is None and fragment['general_req'] is not None:
+            self.general_req = (sd, fragment['template_path'], fragment['general_req'])
+
+        # Add all needed sections based on referenced TSS and their parents/linked AGDs
+        for h3_idx, h3_entry in enumerate(fragment['h3s']):
+            # An H4 is needed only for the referenced SFRs this SD owns
+            needed_h4s = [(h4_idx, h4_entry) for h4_idx, h4_entry in enumerate(h3_entry['h4s'])
+                          if any(self.sfr_owner[sfr_base] == sd for sfr_base in h4_entry['needed_bases'])]
+            if not needed_h4s:
+                continue
+            print(f"Adding needed H3: {h3_entry['text']}")
+            self._emit(h3_entry['xml']) # Copy H3 heading
+
+            for h4_idx, h4_entry in needed_h4s:
+                print(f"  Adding needed H4: {h4_entry['text']}")
+                self._emit(h4_entry['xml']) # Copy H4 heading
+
+                for h5_idx, h5_entry in enumerate(h4_entry['h5s']):
+                    h5_text = h5_entry['text']
+                    position = (fragment_idx, h3_idx, h4_idx, h5_idx)
+
+                    # Primary condition: Process H5 if it's a TSS node that was referenced by JSON
+                    if h5_entry['kind'] == 'tss':
+                        if self.sfr_owner[h5_entry['sfr_base']] != sd:
+                            continue # Referenced in an earlier SD's template
+                        print(f"    Adding referenced TSS H5: {h5_text}")
+                        self._emit(h5_entry['xml']) # Copy H5 heading
+                        for xml_string in h5_entry['blocks']:
+                            self._emit(xml_string)
+
+                        # --- Add linked AGD content unconditionally if TSS was added ---
+                        agd_h5_text = h5_entry['agd_text']
+                        if agd_h5_text is not None:
+                            print(f"    Adding linked AGD section: {agd_h5_text}")
+                            if self._h5_first_position.setdefault(agd_h5_text, position) == position:
+                                # Copy all blocks stored in agd_content (heading + content)
+                                for xml_string in h5_entry['agd_blocks']:
+                                    self._emit(xml_string)
+                            else:
+                                print(f"    Skipping already processed AGD: {agd_h5_text}") # Debug
+
+                    # Condition 2: Handle miscellaneous H5s under a needed H4 that aren't TSS/AGD
+                    # Only copy these if they haven't been linked as AGD elsewhere
+                    elif self._h5_first_position.setdefault(h5_text, position) == position:
+                        print(f"    Adding miscellaneous needed H5: {h5_text}")
+                        self._emit(h5_entry['xml']) # Copy H5 heading
+                        # Copy its content unconditionally (assuming misc sections don't use <Ans#>)
+                        print(f"      Adding {len(h5_entry['blocks'])} content block(s) for misc H5 {h5_text}")
+                        for xml_string in h5_entry['blocks']:
+                            self._emit(xml_string)
+
+    def general_req_blocks(self):
+        """(template_path, blocks) of the general requirements section (added first in the document), or (None, [])."""
+        if self.general_req is None:
+            print("General Requirements section not found or not added.")
+            return None, []
+        print(f"Adding General Requirements section found in {self.general_req[0]}")
+        return self.general_req[1:]
+
+
+def merge_sd_fragments(fragments):
+    """Returns (emit_blocks, sfr_owner) where emit_blocks is the ordered list of serialized
+    blocks for the final document and sfr_owner maps each base SFR name to the first SD
+    whose template holds its TSS heading."""
+    body_blocks = []
+    merger = SDFragmentMerger(lambda xml_string, template_path: body_blocks.append(xml_string))
+    for fragment in fragments:
+        merger.add(fragment)
+    return merger.general_req_blocks()[1] + body_blocks, merger.sfr_owner
+
+
+# --- Main Script Logic ---
+def assemble_report(doc_data, excel_data, selected_sds, cli_flags=(), output_dir=None, parallel=None):
+    """
+    Build AAR-TSS.docx and the Gaps workbook from the answers.
+
+    Args:
+        doc_data (list): "DOC" objects of the responses.
+        excel_data (list): "Excel" gap rows of the responses.
+        selected_sds (list): SD names whose templates are assembled.
+        cli_flags (iterable): Options such as --stream, --serial, --gaps-csv and --gaps-jsonl.
+        output_dir (str): Directory of the report; OUTPUT_DIR if None.
+        parallel (bool): Build the SD fragments in worker processes; if None, unless --serial is
+            given. Pass False from a process running other threads (the GUI, blitz_daemon.py).
+
+    Returns:
+        bool: False if no template could be loaded.
+    """
+    # Ensure output directory exists
+    output_dir = output_dir or OUTPUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+
+    # --stream writes word/document.xml straight into the output zip instead of building final_doc in memory
+    # --serial builds the SD fragments one after another in this process instead of in worker processes
+    # --gaps-csv / --gaps-jsonl additionally write the gaps as Gaps.csv / Gaps.jsonl
+    stream_output = "--stream" in cli_flags
+    if parallel is None:
+        parallel = "--serial" not in cli_flags
+
+    if stream_output:
+        print("Streaming output mode enabled.")
+
+    # Collect the template of each selected SD
+    sd_jobs = []
+    for sd in selected_sds:
+        path = os.path.join(TEMPLATE_DIR, f"{sd}-template.docx")
+        if os.path.exists(path):
+            sd_jobs.append((sd, path))
+        else:
+            print(f"Warning: Template file not found: {path}")
+
+    # Plans compiled earlier in this process (e.g. by template_answer_keys) save the style lookups
+    plans = [_template_plans.peek(path) for _, path in sd_jobs]
+
+    # The selected blocks of each fragment are spooled to a temporary file as soon as the fragment
+    # is merged, so only one SD's fragment is in memory at a time
+    spool = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    merger = SDFragmentMerger(lambda xml_string, template_path: spool.write(json.dumps([template_path, xml_string]) + "\n"))
+    loaded_templates = []
+
+    def merge(fragment):
+        print(fragment['log'], end="")
+        if fragment['loaded']:
+            print(f"\nMerging the fragment of {fragment['sd']}...")
+            merger.add(fragment)
+            loaded_templates.append(fragment['template_path'])
+
+    # Build each SD's fragment, in parallel worker processes when there are several
+    # (results come back in selected_sds order, so the merge is deterministic)
+    if parallel and len(sd_jobs) > 1:
+        workers = min(len(sd_jobs), os.cpu_count() or 1)
+        print(f"Assembling {len(sd_jobs)} SD(s) in {workers} worker process(es)...")
+        # TSS headings of the templates read earlier in this process: an SD skips the answers of the
+        # SFRs an earlier SD owns (the others are dropped by the merge)
+        known_bases = [set(_template_keys.peek(path) or ()) for _, path in sd_jobs]
+        owned_elsewhere = [set().union(*known_bases[:idx]) for idx in range(len(sd_jobs))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for fragment in pool.map(build_sd_fragment,
+                                     [sd for sd, _ in sd_jobs],
+                                     [path for _, path in sd_jobs],
+                                     [doc_data] * len(sd_jobs),
+                                     plans,
+                                     owned_elsewhere,
+                                     [True] * len(sd_jobs)):
+                merge(fragment)
+    else:
+        for (sd, path), plan in zip(sd_jobs, plans):
+            merge(build_sd_fragment(sd, path, doc_data, plan, set(merger.sfr_owner)))
+    sfr_owner = merger.sfr_owner
+
+    if not loaded_templates:
+        spool.close()
+        print("Error: No template documents were successfully loaded. Exiting.")
+        return False
+
+    for obj in doc_data:
+        sfr = obj.get("SFR")
+        if sfr and sfr not in sfr_owner:
+            print(f"Warning: SFR '{sfr}' from JSON not found as a TSS heading in templates.")
+
+    # Create the final AAR-TSS document
+    print("\nCreating final AAR-TSS document...")
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    final_doc_path = os.path.join(output_dir, "AAR-TSS.docx")
+    stream_tmp_path = final_doc_path + ".part"
+    final_doc = None
+
+    try:
+        if stream_output:
+            # Styles and the other package parts come from the first loaded template; the numbering
+            # and relationships used by the other templates' blocks are merged in
+            final_doc = StreamingDocxWriter(loaded_templates[0], stream_tmp_path).open()
+            print(f"Streaming document body using parts from {loaded_templates[0]}")
+        else:
+            final_doc = Document()
+
+        # Apply basic styles (or copy from template if needed)
+        # When streaming, the template's own styles are used as-is
+        if not stream_output:
+            try:
+                heading3_style = final_doc.styles['Heading 3']
+                # Apply formatting as needed
+                heading4_style = final_doc.styles['Heading 4']
+                # Apply formatting as needed
+                heading5_style = final_doc.styles['Heading 5']
+                # Apply formatting as needed
+                normal_style = final_doc.styles['Normal']
+                normal_style.font.name = 'Calibri'
+                normal_style.font.size = Pt(11)
+            except KeyError as e:
+                print(f"Warning: Style {e} not found in default document. Formatting may differ.")
+
+        # --- Add Content to Final Document ---
+        # The general requirements section first, then the spooled blocks of the fragments
+        general_req_template, general_req_blocks = merger.general_req_blocks()
+        for xml_string in general_req_blocks:
+            append_xml_to_doc(final_doc, xml_string, general_req_template)
+        print(f"\nCopying {merger.block_count} selected block(s) to the final document...")
+        spool.seek(0)
+        for line in spool:
+            template_path, xml_string = json.loads(line)
+            append_xml_to_doc(final_doc, xml_string, template_path)
+
+        # Save the final document
+        if stream_output:
+            final_doc.close()
+            os.replace(stream_tmp_path, final_doc_path)
+            print(f"\nStreamed {final_doc.block_count} block(s) into the final document.")
+        else:
+            final_doc.save(final_doc_path)
+        print(f"\nSuccessfully saved AAR-TSS document to {final_doc_path}")
+    except Exception as e:
+        print(f"\nError saving final document: {e}")
+        # Leave no partial .part file behind
+        if isinstance(final_doc, StreamingDocxWriter):
+            final_doc.abort()
+        if os.path.exists(stream_tmp_path):
+            os.remove(stream_tmp_path)
+    finally:
+        spool.close()
+
+    # Create the Gaps Excel workbook (one sheet per SD)
+    print("\nCreating Gaps Excel sheet...")
+    gap_fields = ["SFR", "TSS-requirement", "Missing information"]
+    unmapped_sheet = "Other"
+
+    # Group the gaps by the SD whose template holds the SFR's TSS heading
+    gaps_by_sd = {sd: [] for sd in selected_sds}
+    for obj in excel_data:
+        sfr = obj.get("SFR", "")
+        gap_sd = sfr_owner.get(sfr, unmapped_sheet)
+        gaps_by_sd.setdefault(gap_sd, []).append(obj)
+
+    # Write-only workbook: rows are streamed to disk as they are appended
+    wb = Workbook(write_only=True)
+    for gap_sd, gaps in gaps_by_sd.items():
+        if gap_sd == unmapped_sheet and not gaps:
+            continue
+        # Excel sheet titles are limited to 31 characters and cannot contain []:*?/\
+        ws = wb.create_sheet(title=re.sub(r'[\[\]:*?/\\]', '_', gap_sd)[:31])
+        header_cells = []
+        for field in gap_fields:
+            cell = WriteOnlyCell(ws, value=field)
+            cell.font = Font(bold=True)
+            header_cells.append(cell)
+        ws.append(header_cells)
+        for obj in gaps:
+            ws.append([obj.get(field, "") for field in gap_fields])
+        print(f"  {gap_sd}: {len(gaps)} gap(s)")
+
+    excel_path = os.path.join(output_dir, "Gaps.xlsx")
+    try:
+        wb.save(excel_path)
+        print(f"Successfully saved Gaps sheet to {excel_path}")
+    except Exception as e:
+        print(f"Error saving Gaps Excel sheet: {e}")
+
+    # Optional sidecars for downstream tooling (--gaps-csv / --gaps-jsonl)
+    if "--gaps-csv" in cli_flags:
+        csv_path = os.path.join(output_dir, "Gaps.csv")
+        try:
+            with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["SD"] + gap_fields)
+                for gap_sd, gaps in gaps_by_sd.items():
+                    for obj in gaps:
+                        writer.writerow([gap_sd] + [obj.get(field, "") for field in gap_fields])
+            print(f"Successfully saved Gaps CSV to {csv_path}")
+        except Exception as e:
+            print(f"Error saving Gaps CSV: {e}")
+
+    if "--gaps-jsonl" in cli_flags:
+        jsonl_path = os.path.join(output_dir, "Gaps.jsonl")
+        try:
+            with open(jsonl_path, 'w', encoding='utf-8') as f:
+                for gap_sd, gaps in gaps_by_sd.items():
+                    for obj in gaps:
+                        record = {"SD": gap_sd}
+                        record.update({field: obj.get(field, "") for field in gap_fields})
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            print(f"Successfully saved Gaps JSONL to {jsonl_path}")
+        except Exception as e:
+            print(f"Error saving Gaps JSONL: {e}")
+
+    return True
+
+
+def main():
+    # Optional flags (e.g. --stream) are separated from the SD names
+    cli_flags = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    cli_sds = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+
+    # Get selected SDs from command-line arguments or use default
+    selected_sds = cli_sds if cli_sds else ["NDcPP_v3.0"] # Example: ["NDcPP_v3.0", "PKG_SSH_v1.0"]
+    #selected_sds = ["NDcPP_v3.0"] # Default for testing
+
+    print(f"Processing SDs: {selected_sds}")
+
+    # A run started by Blitz.py (BLITZ_RUN_ID) reads and writes its own directories
+    run = RunContext.from_env()
+    json_path = run.path(AI_RESPONSES_FILE) if run else JSON_PATH
+    output_dir = run.output_dir if run else OUTPUT_DIR
+
+    # Load JSON input
+    try:
+        # Load from JSON file 
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # -------------------------
+        doc_data = data.get("DOC", [])
+        excel_data = data.get("Excel", [])
+        print(f"Loaded JSON data.")
+    except FileNotFoundError:
+        print(f"Error: JSON input file not found at {json_path}")
+        sys.exit(1)
+    except json.JSONDecodeError as e:
+        print(f"Error: Could not decode JSON: {e}")
+        sys.exit(1)
+
+    if not assemble_report(doc_data, excel_data, selected_sds, cli_flags, output_dir):
+        sys.exit(1)
+
+    print("\nScript finished.")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,18 @@ import threading
 import tkinter.ttk as ttk
 import sys # Added for console redirection
 import io  # Added for console redirection
-
-# Hardcoded paths for base and output files (for TOE type processing)
-BASE_TSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sys_inst/base_TSS.txt")
-OUTPUT_TSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),"sys_inst/System_inst-TSS.txt")
+import json
+import glob
+from local_rules import apply_local_rules, LOCAL_ANSWERS_FILE
+from quote_verification import TSS_TEXTS_FILE
+from chunk_recovery import split_sd_entries, entry_body
+from prompt_queue import PromptChunk, SfrRecord, CHUNK_FILE_PATTERN
+from tss_trimming import trim_tss_text
+from pipeline import pipeline_enabled, report_flags_from_env, run_pipeline
+from run_context import RunContext, build_system_message, BASE_SYSTEM_MESSAGE_PATH, SYSTEM_MESSAGE_FILE
+from warm_cache import FileCache
+from blitz_daemon import DaemonError, daemon_status, submit_run
+from dotenv import load_dotenv
 
 # Hardcoded paths for SD documents (scalable structure)
 SD_OPTIONS = {
@@ -30,12 +38,49 @@ SD_OPTIONS = {
 
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ephemeral")
 
+# Optional TSS passage trimming: TSS texts longer than this many (estimated) tokens are cut
+# down to the passages most relevant to their TSS-requirements (TSS_TOKEN_BUDGET in .env; 0 = off)
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+TSS_TOKEN_BUDGET = int(os.getenv("TSS_TOKEN_BUDGET", "0") or 0)
+
+# Parsed SD documents, kept between runs of a long-lived process (the GUI, blitz_daemon.py)
+_sd_indexes = FileCache()
+
+
+def sd_index(sd_path):
+    """
+    Sections of an SD document under its bold headings, parsed once while the file is unchanged.
+
+    Args:
+        sd_path (str): Path of the SD document.
+
+    Returns:
+        tuple: (heading_text, content_lines) tuples in document order.
+    """
+    def parse(path):
+        doc = docx.Document(path)
+        sections = []
+        for para in doc.paragraphs:
+            text = para.text.strip()
+            if not text:
+                continue
+            # A paragraph whose text is all bold is a heading
+            if all(run.bold for run in para.runs if run.text.strip()):
+                sections.append((text, []))
+            elif sections:
+                sections[-1][1].append(text)
+        return tuple((heading, tuple(lines)) for heading, lines in sections)
+    return _sd_indexes.get(sd_path, parse)
+
 ### Requirements Processor Class
 class RequirementsProcessor:
-    def __init__(self):
+    def __init__(self, work_dir=OUTPUT_DIR):
+        # Directory the hand-off files are written to (the run's working directory)
+        self.work_dir = work_dir
         self.st_data = {}
         self.sfr_data = {}
         self.sd_data = {}
+        self.local_answers = {"DOC": [], "Excel": []}
 
     def extract_st_data(self, doc_path):
         """Extract requirements and SFR content from ST document"""
@@ -205,8 +250,8 @@ class RequirementsProcessor:
             # messagebox.showerror("Error", str(e)) # Handled in calling function
             raise
         except Exception as e:
-            messagebox.showerror("Error", f"Error processing ST document: {str(e)}")
-            return {}, {} # Return empty dicts on failure
+            # Reported by the caller: the GUI shows it, the daemon sends it to its client
+            raise ValueError(f"Error processing ST document: {str(e)}") from e
 
 
     def extract_sd_data(self, sd_paths, st_requirements):
@@ -214,46 +259,42 @@ class RequirementsProcessor:
         sd_data = {req: [] for req in st_requirements}
         for sd_path in sd_paths:
             try:
-                doc = docx.Document(sd_path)
-                current_section = None
-                section_content = []
-                for para in doc.paragraphs:
-                    if para.text.strip():
-                        # Check if the paragraph is bold (heading)
-                        if all(run.bold for run in para.runs if run.text.strip()):
-                            # If we were in a section, save its content
-                            if current_section and section_content:
-                                sd_data[current_section].append("\n".join(section_content))
-                            # Check if this bold text matches any ST requirement
-                            for req in st_requirements:
-                                if re.search(rf'\b{re.escape(req)}\b', para.text.strip()):
-                                    current_section = req
-                                    section_content = []
-                                    break
-                            else:
-                                current_section = None  # Not a relevant heading
-                        elif current_section:
-                            # Collect content under the current section
-                            section_content.append(para.text.strip())
-                # Save the last section's content
-                if current_section and section_content:
-                    sd_data[current_section].append("\n".join(section_content))
+                for heading, content in sd_index(sd_path):
+                    # Check if this bold text matches any ST requirement
+                    for req in st_requirements:
+                        if re.search(rf'\b{re.escape(req)}\b', heading):
+                            if content:
+                                sd_data[req].append("\n".join(content))
+                            break
             except Exception as e:
-                messagebox.showerror("Error", f"Error processing SD document {sd_path}: {str(e)}")
+                # Reported by the caller (see extract_st_data)
+                raise ValueError(f"Error processing SD document {sd_path}: {str(e)}") from e
         for req in sd_data:
             sd_data[req] = "\n\n".join(sd_data[req]) if sd_data[req] else "No description found"
         return sd_data
 
 
-    def process_files(self, st_path, sd_paths):
-        """Process ST and SD files, saving results in chunks"""
+    def process_files(self, st_path, sd_paths, toe_type=None, prompt_queue=None):
+        """Process ST and SD files, saving results in chunks.
+
+        Requirements that local_rules can answer without the model (e.g. DISTRIBUTED-only
+        requirements for a STANDALONE TOE) are written to local_answers.json in the working
+        directory and left out of the prompts.
+
+        With a prompt_queue (PromptQueue) every chunk is put on the queue as soon as it is
+        assembled and nothing is written to disk unless the queue spills; without one the chunks,
+        local answers and TSS texts are written to the working directory for api_processing_deb.py.
+        """
         try:
             self.st_data, self.sfr_data = self.extract_st_data(st_path)
         except ValueError as e:
             return False, str(e)
         if not self.st_data:
             return False, "No valid data found in ST document"
-        self.sd_data = self.extract_sd_data(sd_paths, self.st_data.keys())
+        try:
+            self.sd_data = self.extract_sd_data(sd_paths, self.st_data.keys())
+        except ValueError as e:
+            return False, str(e)
         if not self.sd_data:
             return False, "No valid data found in SD documents"
         missing_requirements = [req for req in self.st_data if self.sd_data[req] == "No description found"]
@@ -261,7 +302,7 @@ class RequirementsProcessor:
             error_message = "Incorrect PP/MODS/PKGs selected. Please re-select the correct PP/MODS/PKGs for this evaluation.\nMissing requirements: " + ", ".join(missing_requirements) + ".\n\nPlease verify your PP/MODS/PKGs selection."
             return False, error_message
         if not self.st_data:
-            # This case might be hit if extract_st_data returns empty dicts due to non-ValueError exceptions handled within it
+            # This case might be hit if the ST document has no TSS/SFR sections
             return False, "No valid TSS/SFR data found in the uploaded document. Please verify the document and re-upload the correct ST document."
 
         print("ST data extracted successfully.")
@@ -282,74 +323,110 @@ class RequirementsProcessor:
            # return False, error_message # Comment/Uncomment this line to make it a hard stop
                        
         
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        print(f"Output directory: {OUTPUT_DIR}")
-
-        requirements = sorted(self.st_data.keys())
+        os.makedirs(self.work_dir, exist_ok=True)
+        print(f"Output directory: {self.work_dir}")
+
+        # Answer the deterministic requirements locally and strip them from the prompts
+        local_answers = {"DOC": [], "Excel": []}
+        prompt_sd_data = {}
+        for req in sorted(self.st_data.keys()):
+            remaining_sd_desc, answers, gaps = apply_local_rules(req, self.st_data[req], self.sd_data[req], toe_type)
+            if answers:
+                local_answers["DOC"].append({"SFR": req, **answers})
+            local_answers["Excel"].extend(gaps)
+            if remaining_sd_desc is not None:
+                prompt_sd_data[req] = remaining_sd_desc
+        self.local_answers = local_answers
+        # The hand-off files of the script-by-script run (also written when the prompt queue spills)
+        files_dir = self.work_dir if prompt_queue is None else prompt_queue.spill_dir
+        if files_dir:
+            local_answers_path = os.path.join(files_dir, LOCAL_ANSWERS_FILE)
+            try:
+                with open(local_answers_path, "w", encoding="utf-8") as f:
+                    json.dump(local_answers, f, indent=4)
+            except Exception as e:
+                error_msg = f"Error writing local answers to {local_answers_path}: {e}"
+                print(error_msg)
+                return False, error_msg
+            # Full TSS texts (before any trimming) that api_processing checks the quoted answers against
+            tss_texts_path = os.path.join(files_dir, TSS_TEXTS_FILE)
+            try:
+                with open(tss_texts_path, "w", encoding="utf-8") as f:
+                    json.dump(self.st_data, f, indent=4)
+            except Exception as e:
+                error_msg = f"Error writing TSS texts to {tss_texts_path}: {e}"
+                print(error_msg)
+                return False, error_msg
+        answered_locally = sum(len(obj) - 1 for obj in local_answers["DOC"])
+        print(f"Answered {answered_locally} requirement(s) locally; {len(self.st_data) - len(prompt_sd_data)} SFR(s) need no prompt.")
+
+        # Remove chunks of a previous run (there may now be fewer chunks)
+        if files_dir:
+            for stale_file in glob.glob(os.path.join(files_dir, CHUNK_FILE_PATTERN)):
+                os.remove(stale_file)
+
+        requirements = sorted(prompt_sd_data.keys())
         chunk_size = 3
-        num_chunks = (len(requirements) + chunk_size - 1) // chunk_size
-        print(f"Processing {len(requirements)} requirements in {num_chunks} chunk(s)...")
 
-
-        for i in range(0, len(requirements), chunk_size):
-            chunk = requirements[i:i + chunk_size]
-            chunk_num = i // chunk_size + 1
-            output_file = os.path.join(OUTPUT_DIR, f"user_prompt_TSS-{chunk_num}.txt")
+        # Trim long TSS texts to the passages relevant to the remaining TSS-requirements
+        # (once per distinct text, so SFRs sharing a text keep sharing it)
+        prompt_tss_data = {req: self.st_data[req] for req in requirements}
+        if TSS_TOKEN_BUDGET > 0:
+            sfrs_by_text = {}
+            for req in requirements:
+                sfrs_by_text.setdefault(self.st_data[req], []).append(req)
+            tokens_before = tokens_after = 0
+            for tss_text, sfrs in sfrs_by_text.items():
+                requirement_texts = [entry_body(text) for req in sfrs
+                                     for kind, _, text in split_sd_entries(prompt_sd_data[req])[1] if kind == "TSS-requirement"]
+                trimmed, original_tokens, trimmed_tokens = trim_tss_text(tss_text, requirement_texts, TSS_TOKEN_BUDGET)
+                tokens_before += original_tokens
+                tokens_after += trimmed_tokens
+                for req in sfrs:
+                    prompt_tss_data[req] = trimmed
+            print(f"TSS trimming (budget {TSS_TOKEN_BUDGET} tokens per text): ~{tokens_before} -> ~{tokens_after} tokens, saved ~{tokens_before - tokens_after}.")
+
+        # Group the SFRs that share the same TSS text (one "TSS description" table row lists
+        # several SFRs) so the text is sent once per chunk instead of once per SFR
+        tss_groups = {}
+        for req in requirements:
+            tss_key = prompt_tss_data[req].strip() or f"<empty:{req}>"
+            tss_groups.setdefault(tss_key, []).append(req)
+        chunks = []
+        for group in tss_groups.values():
+            for k in range(0, len(group), chunk_size):
+                piece = group[k:k + chunk_size]
+                if chunks and len(chunks[-1]) + len(piece) <= chunk_size:
+                    chunks[-1].extend(piece)
+                else:
+                    chunks.append(list(piece))
+        print(f"Processing {len(requirements)} requirements in {len(chunks)} chunk(s)...")
+
+
+        for chunk_num, chunk in enumerate(chunks, start=1):
+            prompt_chunk = PromptChunk(f"user_prompt_TSS-{chunk_num}.txt", [
+                SfrRecord(req,
+                          self.sfr_data.get(req, "No SFR content found in ST"), # Get SFR from stored data
+                          prompt_tss_data[req],
+                          prompt_sd_data[req]) # Already contains "No description found..." if applicable
+                for req in chunk])
+            if prompt_queue is not None:
+                prompt_queue.put(prompt_chunk)
+                continue
+            output_file = os.path.join(self.work_dir, prompt_chunk.name)
             print(f"Writing chunk {chunk_num} to {output_file}...")
             try:
-                with open(output_file, "w", encoding="utf-8") as f:
-                    for req in chunk:
-                        sfr_statement = self.sfr_data.get(req, "No SFR content found in ST") # Get SFR from stored data
-                        tss_text = self.st_data[req]
-                        sd_desc = self.sd_data[req] # Already contains "No description found..." if applicable
-
-                        #f.write(f"Requirement: {req}\n")
-                        #f.write("="*len(f"Requirement: {req}") + "\n\n")
-
-                        f.write(f"SFR statement for {req}:\n{sfr_statement}\n\n")
-                        f.write("-" * 20 + "\n\n")
-                        f.write(f"TSS text for {req}:\n{tss_text}\n\n")
-                        f.write("-" * 20 + "\n\n")
-                        f.write(f"{sd_desc}\n\n")
-                        f.write("=" * 80 + "\n\n")
+                prompt_chunk.write(self.work_dir)
             except Exception as e:
                  error_msg = f"Error writing chunk {chunk_num} to file {output_file}: {e}"
                  print(error_msg)
                  # Decide if one chunk error should stop everything
                  return False, error_msg # Stop processing if a chunk fails to write
 
-        print("Finished writing all chunks.")
+        print("Finished assembling all chunks." if prompt_queue is not None else "Finished writing all chunks.")
         return True, "TSS/SFR/SD data processing completed successfully" # Return success True
 
 
-### TOE Type File Processing Function
-def process_file(base_path, output_path, selection):
-    """
-    Process a base file, replace the placeholder with the user's selection, and save to the output file.
-    Args:
-        base_path (str): Path to the base file
-        output_path (str): Path to save the modified file
-        selection (str): User's selection ("STANDALONE" or "DISTRIBUTED")
-    """
-    try:
-        with open(base_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        placeholder = "## In this case the TOE is <STANDALONE/DISTRIBUTED>."
-        new_line = f"## In this case the TOE is {selection}."
-        modified_lines = [new_line + '\n' if line.strip() == placeholder.strip() else line for line in lines]
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.writelines(modified_lines)
-        print(f"Generated file: {output_path} with TOE type: {selection}") # Added print statement
-    except FileNotFoundError:
-        messagebox.showerror("Error", f"Base file not found: {base_path}")
-        print(f"Error: Base file not found at {base_path}")
-        raise # Re-raise error to be caught by caller if necessary
-    except Exception as e:
-        messagebox.showerror("Error", f"An error occurred during file generation: {str(e)}")
-        print(f"Error generating file {output_path}: {e}")
-        raise # Re-raise error
-
-
 ### Main Application Class
 class BlitzApp(tk.Tk):
     def __init__(self):
@@ -739,13 +816,10 @@ class ProcessingFrame(tk.Frame):
             messagebox.showerror("Error", "Please select a TOE type from the dropdown.")
             return
 
-        # Create sys_inst directory if it doesn't exist
-        sys_inst_dir = os.path.dirname(OUTPUT_TSS_PATH)
-        os.makedirs(sys_inst_dir, exist_ok=True)
-
-
+        # The system message is built for each run (in memory); here the base instructions are only checked
         try:
-            process_file(BASE_TSS_PATH, OUTPUT_TSS_PATH, selection)
+            build_system_message(selection)
+            print(f"System message ready for TOE type: {selection}")
              # No success message box, rely on print statement and enabling buttons
             self.st_button.config(state="normal")
             for cb in self.sd_checkbuttons:
@@ -754,10 +828,12 @@ class ProcessingFrame(tk.Frame):
             # Optionally disable the "Proceed" button itself after success?
             # self.other_buttons[2].config(state="disabled") # Index 2 is generate_button
         except FileNotFoundError:
-             # Error already shown by process_file
+             messagebox.showerror("Error", f"Base file not found: {BASE_SYSTEM_MESSAGE_PATH}")
+             print(f"Error: Base file not found at {BASE_SYSTEM_MESSAGE_PATH}")
              return
         except Exception as e:
-             # Error already shown by process_file
+             messagebox.showerror("Error", f"An error occurred while building the system message: {str(e)}")
+             print(f"Error building the system message: {e}")
              return
 
 
@@ -833,16 +909,60 @@ class ProcessingFrame(tk.Frame):
         print(f"Selected SDs: {', '.join(selected_sd.keys())}")
 
         # Run processing in a separate thread
-        thread = threading.Thread(target=self.run_processing, args=(st_path, selected_sd_paths), daemon=True)
+        thread = threading.Thread(target=self.run_processing, args=(st_path, selected_sd_paths, self.combo.get()), daemon=True)
         thread.start()
 
-    def run_processing(self, st_path, sd_paths):
+    def run_processing(self, st_path, sd_paths, toe_type=None):
         processing_success = False
         final_message = "An unexpected error occurred during processing."
         try:
-            processor = RequirementsProcessor()
+            # Selected SD names (the API script checks the answers against their templates, AARF assembles them)
+            selected_sd_names = [opt for category in SD_OPTIONS for opt in SD_OPTIONS[category] if opt in self.sd_vars and self.sd_vars[opt].get()]
+            # AARF options switched on in the .env file (STREAM_REPORT, GAPS_CSV, GAPS_JSONL)
+            report_flags = report_flags_from_env()
+            success_message = "Validation for TSS has been completed successfully!\nResults have been stored to the '{}' folder.\n\nNote: If TOE is distributed then please append the 'General Requirements for Distributed TOE' section to the AAR."
+
+            # A running blitz_daemon.py has the SD documents, templates and API client warm: hand it the run
+            if daemon_status():
+                print("\n--- Running on the BLITZ daemon ---")
+                try:
+                    success, message, output_dir = submit_run(st_path, selected_sd_names, toe_type, report_flags)
+                except DaemonError as e:
+                    success, message = False, str(e)
+                if not success:
+                    self.controller.after(0, lambda msg=message: messagebox.showerror("Processing Error", msg))
+                    final_message = message
+                    return
+                print(message)
+                processing_success = True
+                final_message = success_message.format(os.path.relpath(output_dir, os.path.dirname(os.path.abspath(__file__))))
+                self.controller.after(0, self.processing_done, final_message)
+                return
+
+            # Every run works in its own ID-stamped directories, so several evaluations can run at once
+            run = RunContext().create()
+            print(f"Run ID: {run.run_id}")
+            system_message = build_system_message(toe_type)
+            processor = RequirementsProcessor(run.work_dir)
+            success_message = success_message.format(os.path.relpath(run.output_dir, os.path.dirname(os.path.abspath(__file__))))
+
+            # Extraction, API processing and report assembly in this process, with the chunks
+            # sent to the model as they are assembled (PIPELINE=0 in .env runs the scripts as subprocesses)
+            if pipeline_enabled():
+                success, message = run_pipeline(processor, st_path, sd_paths, toe_type, selected_sd_names, run, system_message,
+                                               report_flags)
+                if not success:
+                    self.controller.after(0, lambda msg=message: messagebox.showerror("Processing Error", msg))
+                    final_message = message
+                    return
+                print(message)
+                processing_success = True
+                final_message = success_message
+                self.controller.after(0, self.processing_done, final_message)
+                return
+
             print("\n--- Running TSS/SFR/SD Extraction ---")
-            success, message = processor.process_files(st_path, sd_paths)
+            success, message = processor.process_files(st_path, sd_paths, toe_type)
 
             if not success:
                  # Error message already printed by process_files or extract_st_data
@@ -864,6 +984,9 @@ class ProcessingFrame(tk.Frame):
                  python_executable = sys.executable
                  print(f"\nWarning: Custom Python not found at {os.path.join(scripts_dir, 'python.exe')}. Falling back to system Python: {python_executable}")
 
+            # The subprocesses find the run's directories through BLITZ_RUN_ID and read its system message from disk
+            with open(run.path(SYSTEM_MESSAGE_FILE), "w", encoding="utf-8") as f:
+                f.write(system_message)
 
             try:
                 # --- Trigger the API processing subprocess ---
@@ -871,7 +994,7 @@ class ProcessingFrame(tk.Frame):
                 if os.path.exists(api_pros_path):
                     print(f"\n--- Running API Processing Subprocess ({os.path.basename(api_pros_path)}) ---")
                     # Use capture_output=True to get stdout/stderr from subprocess
-                    result_api = subprocess.run([python_executable, api_pros_path], check=True, capture_output=True, text=True, encoding='utf-8')
+                    result_api = subprocess.run([python_executable, api_pros_path] + selected_sd_names, check=True, capture_output=True, text=True, encoding='utf-8', env=run.env())
                     print("--- API Subprocess Output ---")
                     print(result_api.stdout)
                     if result_api.stderr:
@@ -882,12 +1005,11 @@ class ProcessingFrame(tk.Frame):
                     print(f"\nWarning: API processing script not found at {api_pros_path}. Skipping.")
 
                 # --- Call AARF.py with selected SD names ---
-                selected_sd_names = [opt for category in SD_OPTIONS for opt in SD_OPTIONS[category] if opt in self.sd_vars and self.sd_vars[opt].get()]
                 aarf_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AARF.py")
                 if os.path.exists(aarf_path):
                     print(f"\n--- Running AARF Subprocess ({os.path.basename(aarf_path)}) ---")
-                    print(f"Arguments: {selected_sd_names}")
-                    result_aarf = subprocess.run([python_executable, aarf_path] + selected_sd_names, check=True, capture_output=True, text=True, encoding='utf-8')
+                    print(f"Arguments: {selected_sd_names + report_flags}")
+                    result_aarf = subprocess.run([python_executable, aarf_path] + selected_sd_names + report_flags, check=True, capture_output=True, text=True, encoding='utf-8', env=run.env())
                     print("--- AARF Subprocess Output ---")
                     print(result_aarf.stdout)
                     if result_aarf.stderr:
@@ -898,7 +1020,7 @@ class ProcessingFrame(tk.Frame):
                     print(f"\nWarning: AARF script not found at {aarf_path}. Skipping.")
 
                 processing_success = True # Mark overall success
-                final_message = "Validation for TSS has been completed successfully!\nResults have been stored to the 'BLITZ-output' folder.\n\nNote: If TOE is distributed then please append the 'General Requirements for Distributed TOE' section to the AAR."
+                final_message = success_message
 
 
             except subprocess.CalledProcessError as e:
@@ -1,9 +1,32 @@
 import json
 import os
+import sys
 import glob
 import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, BadRequestError
+from json_repair import repair_json, JSONRepairError
+from response_schema import RESPONSE_FORMAT, COMPACT_RESPONSE_FORMAT
+from chunk_recovery import (build_chunk_prompt, missing_sections, drop_invalid_objects,
+                            normalize_sfr, merge_duplicate_doc_objects, find_missing_answers, build_gap_prompt,
+                            section_requirements)
+from AARF import TEMPLATE_DIR, template_answer_keys
+from local_rules import LOCAL_ANSWERS_FILE
+from compact_protocol import COMPACT_INSTRUCTIONS, expand_compact_response
+from rate_limiter import RateLimiter, BudgetExceededError
+from concurrency import AIMDController, failure_status, RUN_METRICS_FILE
+from hedging import Hedger
+from model_router import ModelRouter, is_upstream_failure
+from output_budget import estimate_max_tokens, next_max_tokens
+from prompt_queue import PromptChunk, CHUNK_FILE_PATTERN
+from scheduler import ARRIVAL, chunk_estimate, order_chunks, schedule_policy_from_env
+from tss_trimming import estimate_tokens
+from run_context import RunContext, AI_RESPONSES_FILE, SYSTEM_MESSAGE_FILE
+from quote_verification import (QuoteIndex, TSS_TEXTS_FILE, QUOTE_REASK_NOTE, find_unverified_quotes,
+                                load_tss_texts, quote_gap_row)
 import shutil 
 
 # Load environment variables from .env file
@@ -20,6 +43,30 @@ JSON_OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eph
 DEBUG_DIR = os.path.join(os.path.dirname(__file__), "ephemeral/debug_outputs")  # Directory for debug outputs [cite: 2]
 SYSTEM_MESSAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sys_inst/System_inst-TSS.txt")  # Path to system message file [cite: 2]
 
+# System message of the run, built in memory by the pipeline (read from SYSTEM_MESSAGE_PATH if None)
+system_message = None
+
+def use_run(run, message=None):
+    """
+    Point the file paths at a run's working directory.
+    Args:
+        run (RunContext): The run.
+        message (str): System message built in memory (instead of the run's System_inst-TSS.txt).
+    """
+    global OUTPUT_DIR, JSON_OUTPUT_PATH, DEBUG_DIR, SYSTEM_MESSAGE_PATH, system_message
+    OUTPUT_DIR = run.work_dir
+    JSON_OUTPUT_PATH = run.path(AI_RESPONSES_FILE)
+    DEBUG_DIR = run.debug_dir
+    SYSTEM_MESSAGE_PATH = run.path(SYSTEM_MESSAGE_FILE)
+    system_message = message
+    os.makedirs(DEBUG_DIR, exist_ok=True)
+
+# A run started by Blitz.py (BLITZ_RUN_ID) works in its own directory; on its own the script
+# uses the shared ephemeral/ directory
+run = RunContext.from_env()
+if run:
+    use_run(run)
+
 # Create debug directory if it doesn't exist
 os.makedirs(DEBUG_DIR, exist_ok=True)  
 
@@ -29,13 +76,62 @@ client = OpenAI(
     api_key=token,
 )
 
+# Requests/tokens per minute and monthly token cap, shared with other BLITZ processes
+# (RATE_LIMIT_RPM, RATE_LIMIT_TPM and MONTHLY_TOKEN_CAP in the .env file; 0 disables a limit)
+rate_limiter = RateLimiter.from_env()
+
+# Adaptive number of requests in flight (API_INITIAL_CONCURRENCY, API_MAX_CONCURRENCY in the .env file)
+concurrency = AIMDController.from_env()
+
+# Models in order of preference; each request goes to the healthiest model whose circuit is
+# closed (override with MODEL_ROUTES=model-a,model-b in the .env file)
+router = ModelRouter.from_env(["deepseek/deepseek-r1-distill-qwen-14b", "qwen/qwen3-32b"])
+
+# Hedged chunk requests: a chunk still unanswered after the HEDGE_PERCENTILE latency of the
+# previous chunks is sent again (to HEDGE_FALLBACK_MODEL if set) and the first valid JSON answer
+# is kept (enable with --hedge or HEDGE_REQUESTS=1 in the .env file)
+hedge_requests = "--hedge" in sys.argv[1:] or os.getenv("HEDGE_REQUESTS", "").strip().lower() in ("1", "true", "yes")
+hedger = Hedger.from_env() if hedge_requests else None
+
+# Order in which the chunks are dispatched (CHUNK_SCHEDULE=lpt, fifo or affinity in the .env file)
+chunk_schedule = schedule_policy_from_env()
+HEDGE_FALLBACK_MODEL = os.getenv("HEDGE_FALLBACK_MODEL", "").strip() or None
+
+# Structured output mode: send the DOC/Excel JSON schema through response_format
+# (enable with --structured or STRUCTURED_OUTPUT=1 in the .env file)
+structured_output = "--structured" in sys.argv[1:] or os.getenv("STRUCTURED_OUTPUT", "").strip().lower() in ("1", "true", "yes")
+# Held by the worker thread that turns structured_output off
+structured_output_lock = threading.Lock()
+
+# Compact response protocol: the model answers with status codes and quoted spans, which
+# compact_protocol expands locally (enable with --compact or COMPACT_RESPONSES=1 in the .env file)
+compact_responses = "--compact" in sys.argv[1:] or os.getenv("COMPACT_RESPONSES", "").strip().lower() in ("1", "true", "yes")
+
+# Re-ask satisfied answers whose quote is not found verbatim in the TSS text before flagging them
+# (enable with --requery-quotes or REQUERY_UNVERIFIED_QUOTES=1 in the .env file)
+requery_quotes = "--requery-quotes" in sys.argv[1:] or os.getenv("REQUERY_UNVERIFIED_QUOTES", "").strip().lower() in ("1", "true", "yes")
+
+# Rounds of re-asking for the SFRs of a chunk that are missing from its response
+MAX_REASK_ROUNDS = 2
+
+
+class QueryError(Exception):
+    """An AI request failed (on every model tried); there is no response to parse."""
+
+# SDs whose templates the answers are checked against: SD names on the command line
+# (as passed to AARF.py), otherwise every template in TEMPLATE_DIR
+selected_sds = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or sorted(
+    name[:-len("-template.docx")] for name in os.listdir(TEMPLATE_DIR) if name.endswith("-template.docx"))
+
 def get_system_message():
     """
-    Read system message from file.
+    Read system message from file (or use the one built in memory for the run).
     
     Returns:
         str: System message content or default message if file not found.
     """
+    if system_message is not None:
+        return system_message.strip()
     try:
         if os.path.exists(SYSTEM_MESSAGE_PATH):  
             with open(SYSTEM_MESSAGE_PATH, 'r', encoding='utf-8') as f:  
@@ -49,72 +145,169 @@ def get_system_message():
         # Default message in case of error
         return "You are a helpful assistant. Always respond with valid JSON only. Do not include any explanatory text, markdown formatting, or comments."  # [cite: 4, 5]
 
-def process_file_with_ai(file_path):
+def rejects_response_format(error):
+    """True if a 400 error is the API rejecting response_format (and not e.g. a too long prompt)."""
+    text = f"{error} {getattr(error, 'body', '') or ''}".lower()
+    return "response_format" in text or "json_schema" in text or "structured output" in text
+
+def query_chunk(content, label, system_message=None, compact=None):
     """
-    Send the content of a single file to the AI model and return the response. 
+    Send a chunk to the AI model and return the response (hedged if hedging is enabled).
     Args:
-        file_path (str): Path to the text file to process. 
+        content (str): The chunk's user prompt.
+        label (str): Name used in messages.
+        system_message (str), compact (bool): Settings of the chunk's run (see query_ai).
     Returns:
-        str: The AI's response or an error message. 
+        tuple: (response_text, parsed_data, success_flag), see query_ai.
+    Raises:
+        QueryError: The request failed.
+        BudgetExceededError: The monthly token cap is reached.
     """
+    if hedger is None:
+        return query_ai(content, label, system_message=system_message, compact=compact)
+    return hedged_query(content, label, system_message, compact)
+
+def hedged_query(content, label, system_message=None, compact=None):
+    """
+    Query the AI with a hedge: a duplicate request is sent when the first one is slow.
+    Args:
+        content (str): The user prompt.
+        label (str): Name used in messages.
+        system_message (str), compact (bool): Settings of the prompt's run (see query_ai).
+    Returns:
+        tuple: The first (response_text, parsed_data, success_flag) that parses as JSON (or the last one if none does).
+    Raises:
+        QueryError, BudgetExceededError: The request kept was an error.
+    """
+    def attempt(model):
+        # Each attempt runs in its own thread, so the thread's recorded tokens are its own.
+        # An error is returned, not raised: the hedger waits for every attempt to report back
+        before = rate_limiter.thread_tokens()
+        try:
+            response = query_ai(content, label, model, system_message, compact)
+        except (QueryError, BudgetExceededError) as e:
+            response = e
+        return response, rate_limiter.thread_tokens() - before
+
+    response = hedger.run(lambda: attempt(None),
+                          lambda: attempt(HEDGE_FALLBACK_MODEL),
+                          lambda response: isinstance(response, tuple) and response[2])
+    if isinstance(response, Exception):
+        raise response
+    return response
+
+def create_completion(request_args, **extra_args):
+    """
+    Send a chat completion request through the shared rate limiter and the concurrency controller.
+    Args:
+        request_args (dict): Arguments of client.chat.completions.create.
+        **extra_args: Additional arguments (e.g. response_format).
+    Returns:
+        tuple: (completion_response, latency_seconds)
+    """
+    estimated = estimate_tokens("".join(message["content"] for message in request_args["messages"]))
+    # The slot comes first: the shared rate-limit budget is only taken for a request sent right away
+    concurrency.acquire()
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:  
-            content = f.read()  
-        
-        # Get system message from file
-        system_message = get_system_message()  
-        
-        response = client.chat.completions.create(  
-            messages=[
-                {"role": "system", "content": system_message},  
-                {"role": "user", "content": content},  
-            ],
-            model="deepseek/deepseek-r1-distill-qwen-14b",  
-            temperature=1,  
-            max_tokens=8000,  
-            top_p=1  
-        )
-        
-        return response.choices[0].message.content  
+        rate_limiter.acquire(estimated)
+    except BaseException:
+        concurrency.cancel()
+        raise
+    started = time.monotonic()
+    try:
+        response = client.chat.completions.create(**request_args, **extra_args)
     except Exception as e:
-        return f"Error processing {file_path}: {str(e)}"  
-
-def fix_json_quotes(json_text):
+        concurrency.release(time.monotonic() - started, failure_status(e))
+        if is_upstream_failure(e):
+            router.record(request_args["model"], time.monotonic() - started, failed=True)
+        # A rejected request still counts against the request limit, but used no tokens
+        rate_limiter.record(estimated, 0, 0)
+        raise
+    latency = time.monotonic() - started
+    concurrency.release(latency)
+    usage = getattr(response, "usage", None)
+    rate_limiter.record(estimated, getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
+    return response, latency
+
+def query_ai(content, label, model=None, system_message=None, compact=None):
     """
-    Fix improperly terminated quotes in JSON strings that could cause parsing errors. [cite: 10]
-    This function specifically addresses:
-    1. Double quotes with no content between them ("")
-    2. String values ending with a quote character without proper escaping
-    
+    Send a user prompt to the AI model and return the response, parsed once with
+    parse_json_safely (whose result also goes into the model's health in the router).
     Args:
-        json_text (str): The JSON text to fix
-        
+        content (str): The user prompt (a chunk file or a part of one).
+        label (str): Name used in the error message.
+        model (str): Model to use instead of the router's choice (no failover to other models).
+        system_message (str): System message of the prompt's run; get_system_message() if None.
+        compact (bool): Ask for the compact protocol; compact_responses if None.
     Returns:
-        str: Fixed JSON text [cite: 11]
+        tuple: (response_text, parsed_data, success_flag)
+    Raises:
+        QueryError: The request failed on every model tried (or a non-upstream error).
+        BudgetExceededError: The monthly token cap is reached.
     """
-    # Check and fix empty quotes that might cause issues
-    json_text = re.sub(r'""', '".\"', json_text)  
-    
-    # Pattern to find improperly escaped quotes within string values
-    # Look for patterns where a string value has an unescaped quote before closing quotes
-    def fix_quote_endings(match):  
-        content = match.group(1)  
-        # If content ends with an unescaped quote, add a period before it
-        if content.endswith('"') and not content.endswith('\\"'):  
-            return '"' + content[:-1] + '."'  
-        return match.group(0)  
-    
-    # Apply fixes to string values that might end with a quote
-    json_text = re.sub(r'"([^"\\]*(?:\\.[^"\\]*)*)"', fix_quote_endings, json_text)  
-    
-    # Handle specific case where the JSON might be truncated with a hanging quote
-    if json_text.endswith('"') and not json_text.endswith('\\"'):  
-        json_text = json_text[:-1] + '."'  
-    
-    # Fix common JSON structural issues
-    json_text = json_text.replace('}{', '},{')  
-    
-    return json_text  
+    global structured_output
+    if compact is None:
+        compact = compact_responses
+    try:
+        # Get system message from file (unless the run's message is passed in, e.g. by a worker)
+        system_message = get_system_message() if system_message is None else system_message.strip()
+        if compact:
+            system_message += "\n" + COMPACT_INSTRUCTIONS
+    except Exception as e:
+        raise QueryError(f"Error processing {label}: {str(e)}") from e
+
+    # Size max_tokens to the SFRs and answers asked for; a truncated response is retried larger
+    max_tokens = estimate_max_tokens(content, compact)
+    tried = []
+    while True:
+        request_args = {
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": content},
+            ],
+            "model": model or router.choose(exclude=tried),
+            "temperature": 1,
+            "max_tokens": max_tokens,
+            "top_p": 1,
+        }
+        try:
+            response = None
+            if structured_output:
+                try:
+                    response, latency = create_completion(request_args, response_format=COMPACT_RESPONSE_FORMAT if compact else RESPONSE_FORMAT)
+                except BadRequestError as e:
+                    if not rejects_response_format(e):
+                        raise
+                    # The backend/model does not support json_schema: use plain JSON prompting for the rest of the run
+                    with structured_output_lock:
+                        if structured_output:
+                            print(f"Warning: Structured output rejected by the API ({e}). Falling back to plain requests.")
+                            structured_output = False
+
+            if response is None:
+                response, latency = create_completion(request_args)
+
+            choice = response.choices[0]
+            # A response cut off at max_tokens says nothing about the model's JSON (it is retried larger)
+            truncated = choice.finish_reason == "length"
+            larger = truncated and next_max_tokens(max_tokens)
+            if larger:
+                router.record(request_args["model"], latency, parsed=True)
+                print(f"Warning: Response for {label} was cut off at max_tokens={max_tokens}; retrying with {larger}.")
+                max_tokens = larger
+                continue
+            text = choice.message.content or ""
+            json_data, success = parse_json_safely(text)
+            router.record(request_args["model"], latency, parsed=success or truncated)
+            return text, json_data, success
+        except BudgetExceededError:
+            raise
+        except Exception as e:
+            # Fail over to the next healthiest model when the provider fails this one
+            tried.append(request_args["model"])
+            if model or not is_upstream_failure(e) or len(tried) >= len(router.models):
+                raise QueryError(f"Error processing {label}: {str(e)}") from e
+            print(f"Warning: {request_args['model']} failed for {label} ({e}); trying another model.")
 
 def extract_json(text):
     """
@@ -153,15 +346,18 @@ def extract_json(text):
 
 def parse_json_safely(text):
     """
-    Try multiple approaches to parse JSON from text, handling invalid escapes robustly. [cite: 18, 19]
+    Parse JSON from the AI response, repairing malformed output in a single pass.
+
+    Well-formed responses are parsed directly with json.loads. Anything else is read once
+    by the tolerant parser in json_repair, which fixes stray backslashes, unescaped inner
+    quotes, trailing commas, '}{' joins and truncated tails as it goes.
 
     Args:
-        text (str): Text to parse as JSON. [cite: 19]
+        text (str): Text to parse as JSON.
 
     Returns:
-        tuple: (parsed_data, success_flag) [cite: 20]
+        tuple: (parsed_data, success_flag)
     """
-    # --- Start Modification ---
     # Clean potential markdown fences and whitespace first from the raw input
     cleaned_text = text.strip()
     if cleaned_text.startswith("```json"):
@@ -176,128 +372,107 @@ def parse_json_safely(text):
         # Remove ``` suffix if present
         if cleaned_text.endswith("```"):
             cleaned_text = cleaned_text[:-3].strip()
-    # Ensure it's stripped again after potential fence removal
-    cleaned_text = cleaned_text.strip()
 
-    # Use the cleaned text directly, bypassing the original extract_json call
-    # json_text, extracted = extract_json(text) # Commented out original line [cite: 55]
-    json_text = cleaned_text # Use the potentially cleaned raw text
+    # Fast path: the response is already valid JSON
+    try:
+        return json.loads(cleaned_text), True
+    except json.JSONDecodeError as e:
+        print(f"Warning: Response is not valid JSON ({e}). Repairing it in a single pass.")
 
-    # Apply the JSON quote fix before parsing
-    # Pass the cleaned text (which should be the full JSON object) to the fixer
-    fixed_json_text = fix_json_quotes(json_text) 
-    # --- End Modification ---
+    try:
+        parsed, parser = repair_json(cleaned_text)
+    except JSONRepairError as e:
+        print(f"Error: Could not parse JSON from response: {e}")
+        return None, False
 
-    # Save the fixed JSON for debugging (this now reflects fixing the cleaned text)
-    debug_fixed_path = os.path.join(DEBUG_DIR, f"fixed_json_{os.urandom(4).hex()}.txt") 
+    # Save the repaired JSON for debugging
+    debug_fixed_path = os.path.join(DEBUG_DIR, f"fixed_json_{os.urandom(4).hex()}.txt")
     try:
-        with open(debug_fixed_path, 'w', encoding='utf-8') as f: 
-            f.write(fixed_json_text) 
+        with open(debug_fixed_path, 'w', encoding='utf-8') as f:
+            json.dump(parsed, f, indent=4)
     except Exception as e:
         print(f"Warning: Could not write debug file {debug_fixed_path}: {str(e)}")
 
-    # Attempt 1: Parse directly with fixed JSON, fixing invalid escapes iteratively
-    max_attempts = 10
-    current_json_to_parse = fixed_json_text # Start with the fixed text
-    for attempt in range(max_attempts):
-        try:
-            # Attempt to load the JSON
-            return json.loads(current_json_to_parse), True 
-        except json.JSONDecodeError as e:
-            if "Invalid \\escape" in str(e):
-                pos = e.pos
-                # Check bounds carefully before attempting fix
-                if pos < len(current_json_to_parse):
-                     # Try adding a backslash BEFORE the problematic character at e.pos
-                     # This handles cases like \", \n etc. needing to become \\", \\n
-                     if current_json_to_parse[pos] == '\\' and pos + 1 < len(current_json_to_parse):
-                         # If it's already an escape sequence like \n, \t, don't double escape
-                         # Check if the character AFTER the backslash is one that forms a valid escape
-                         if current_json_to_parse[pos+1] not in ['"', '\\', '/', 'b', 'f', 'n', 'r', 't', 'u']:
-                             # It's likely a stray backslash, escape it
-                             current_json_to_parse = current_json_to_parse[:pos] + '\\' + current_json_to_parse[pos:]
-                             print(f"Attempt {attempt + 1}: Fixed potentially stray backslash at position {pos}")
-                         else:
-                             # It looks like a valid escape that json.loads just disliked. Stop trying.
-                             print(f"Attempt {attempt + 1}: Encountered potentially valid but problematic escape sequence at {pos}. Stopping fix attempts.")
-                             break # Exit loop, will proceed to other methods or fail
-                     elif current_json_to_parse[pos] != '\\':
-                         # If the error is at a character that's NOT a backslash, but is part of an invalid escape
-                         # (e.g. "\ ' "), we might not be able to fix it reliably here. Stop trying.
-                          print(f"Attempt {attempt + 1}: Encountered invalid escape sequence not starting with '\\' at {pos}. Stopping fix attempts.")
-                          break # Exit loop
-                     else: # pos is at the end of the string or other edge case
-                          break # Exit loop
-                else:
-                    # Error position is out of bounds, cannot fix
-                     print(f"Attempt {attempt + 1}: Invalid escape error position ({pos}) is out of bounds. Stopping fix attempts.")
-                     break # Exit loop
-            else:
-                # Other JSON errors, break the loop and proceed to alternative methods/failure
-                print(f"Attempt {attempt + 1}: Encountered non-escape JSONDecodeError: {e}. Stopping iterative fixing.")
-                break
-        except Exception as general_error: # Catch other potential errors during parsing/fixing
-             print(f"Attempt {attempt + 1}: Unexpected error during iterative parsing: {general_error}. Stopping.")
-             break # Exit loop
-
-    # If parsing still fails after iterative fixes, log and try alternative methods (if any remain uncommented)
-    print(f"Warning: Failed to parse JSON directly after {max_attempts} attempts at fixing invalid escapes. Trying alternative methods if available.") #
-
-    # Attempt 2: Fix common formatting issues (e.g., single object not in array)
-    # This attempt uses the *last state* of current_json_to_parse from the loop above
-    try:
-        if current_json_to_parse.strip().startswith('{') and current_json_to_parse.strip().endswith('}'): # [cite: 61]
-            # Try parsing as a single object
-            parsed_obj = json.loads(current_json_to_parse) # Try parsing the potentially fixed string
-            # Return as a list containing the single object for consistency
-            return [parsed_obj], True 
-    except json.JSONDecodeError:
-         # This method didn't work either
-        pass # [cite: 62]
-    except Exception as e: # Catch other errors during this attempt
-        print(f"Warning: Error during single object parsing attempt: {e}")
-        pass
-
-   # Attempt 3: Try to extract individual JSON objects if parsing fails
-    """try:
-        objects = []  # [cite: 22]
-        # Match all top-level JSON objects in the text
-        # Use non-recursive regex to find well-formed objects {}
-        for match in re.finditer(r'\{(?:[^{}"\']+|\'[^\']*\'|"[^"\\]*(?:\\.[^"\\]*)*")*\}', fixed_json_text):  # [cite: 22]
-            try:
-                # Apply fix to each potential JSON object
-                fixed_obj_text = fix_json_quotes(match.group(0))  
-                obj = json.loads(fixed_obj_text)  
-                objects.append(obj)  
-            except json.JSONDecodeError:
-                # Ignore parts that cannot be parsed as individual objects
-                continue  
-        
-        if objects:
-            return objects, True  
-    except Exception as e:
-        # Catch potential regex errors or other issues
-        print(f"Warning: Error during individual object extraction: {str(e)}")
-        pass  """
+    print(f"Repaired JSON with {len(parser.repairs)} fix(es){' (response was truncated)' if parser.truncated else ''}.")
+    return parsed, True
+    
 
+def report_invalid_objects(label, invalid):
+    """Print the DOC objects and Excel rows removed or normalized by drop_invalid_objects."""
+    if invalid:
+        print(f"Warning: {len(invalid)} object(s) of the response for {label} do not match the schema:")
+        for problem in invalid:
+            print(f"  - {problem}")
 
-    # Failed to parse JSON using any available method
-    print(f"Error: Could not parse JSON from response even after cleaning and fixing attempts.") # More specific error
-    return None, False # [cite: 65, 24] # Adjusted citation reference if needed
-    
+def reask_missing_sfrs(file_name, sections, items, system_message=None, compact=None):
+    """
+    Re-query only the SFRs of a chunk that have no "DOC" object in the parsed response.
 
-def process_and_parse_file(file_path):
+    In the first round the missing SFRs are asked together (or one per request if nothing
+    of the chunk was recovered); SFRs still missing after that are asked one per request.
+    A failed request ends the re-asking: an API error is not a missing answer.
+    Args:
+        file_name (str): Name of the chunk file.
+        sections (list): (sfr_name, section_text) tuples of the chunk.
+        items (list): Response objects already recovered for the chunk.
+        system_message (str), compact (bool): Settings of the chunk's run (see query_ai).
+    Returns:
+        tuple: (recovered_items, still_missing_sfrs)
+    """
+    recovered = []
+    missing = missing_sections(sections, items)
+    for round_num in range(1, MAX_REASK_ROUNDS + 1):
+        if not missing:
+            break
+        if round_num == 1 and len(missing) < len(sections):
+            batches = [missing]
+        else:
+            batches = [[section] for section in missing]
+        for batch_num, batch in enumerate(batches, start=1):
+            sfr_names = ", ".join(sfr for sfr, _ in batch)
+            print(f"Re-asking for {sfr_names} from {file_name} (round {round_num})...")
+            try:
+                response, json_data, success = query_ai(build_chunk_prompt(batch), f"{file_name} [{sfr_names}]",
+                                                        system_message=system_message, compact=compact)
+            except (QueryError, BudgetExceededError) as e:
+                print(f"Warning: {e}; no more re-asks for {file_name}")
+                return recovered, [sfr for sfr, _ in missing_sections(sections, items + recovered)]
+            # Save raw re-ask response for debugging
+            debug_file = os.path.join(DEBUG_DIR, f"raw_{file_name}_reask-{round_num}-{batch_num}.txt")
+            try:
+                with open(debug_file, 'w', encoding='utf-8') as f:
+                    f.write(response)
+            except Exception as e:
+                print(f"Warning: Could not write debug file {debug_file}: {str(e)}")
+            if success:
+                json_data = expand_compact_response(json_data, batch)
+                batch_items = json_data if isinstance(json_data, list) else [json_data]
+                report_invalid_objects(f"{file_name} [{sfr_names}]", drop_invalid_objects(batch_items))
+                recovered.extend(batch_items)
+        missing = missing_sections(sections, items + recovered)
+    return recovered, [sfr for sfr, _ in missing]
+
+
+def process_and_parse_chunk(chunk, system_message=None, compact=None):
     """
-    Process a file with AI and parse the JSON response
+    Process a chunk with AI and parse the JSON response
     Args:
-        file_path (str): Path to file to process. 
+        chunk (PromptChunk): The chunk's requirement records.
+        system_message (str), compact (bool): Settings of the chunk's run, e.g. a job's (see query_ai).
     Returns:
         tuple: (parsed_data, error_message) 
     """
-    file_name = os.path.basename(file_path)  
-    
-    # Get the AI response
-    response = process_file_with_ai(file_path)  
+    file_name = chunk.name
+
+    # Get the AI response; a failed request is retried once before the chunk fails (no re-asks)
+    try:
+        try:
+            response, json_data, success = query_chunk(chunk.prompt(), file_name, system_message, compact)
+        except QueryError as e:
+            print(f"Warning: {e}; retrying {file_name}")
+            response, json_data, success = query_chunk(chunk.prompt(), file_name, system_message, compact)
+    except (QueryError, BudgetExceededError) as e:
+        return None, str(e)
     
     # Save raw response for debugging
     debug_file = os.path.join(DEBUG_DIR, f"raw_{file_name}.txt")  
@@ -307,13 +482,14 @@ def process_and_parse_file(file_path):
     except Exception as e:
         print(f"Warning: Could not write debug file {debug_file}: {str(e)}")
         
-    # Try to parse JSON
-    json_data, success = parse_json_safely(response)  
-    
+    # Requirement sections of the chunk (for expanding compact responses and re-asking missing SFRs)
+    sections = chunk.sections()
+
     if success:
-        return json_data, None  
+        json_data = expand_compact_response(json_data, sections)
+        items = json_data if isinstance(json_data, list) else [json_data]
     else:
-        error_msg = f"Failed to parse valid JSON from response for {file_name}"  
+        print(f"Warning: Failed to parse valid JSON from response for {file_name}")
         # Save the problematic response that failed parsing
         failed_parse_file = os.path.join(DEBUG_DIR, f"failed_parse_{file_name}.txt")
         try:
@@ -321,44 +497,213 @@ def process_and_parse_file(file_path):
                  f.write(response)
         except Exception as e:
             print(f"Warning: Could not write failed parse file {failed_parse_file}: {str(e)}")
-        return None, error_msg  
+        items = []
 
-def main():
+    # Keep the DOC objects that follow the schema (the SFRs of the others are re-asked below) and fix the Excel rows
+    report_invalid_objects(file_name, drop_invalid_objects(items))
+
+    # Re-ask only the SFRs of this chunk that are missing from the response
+    still_missing = []
+    if missing_sections(sections, items):
+        recovered, still_missing = reask_missing_sfrs(file_name, sections, items, system_message, compact)
+        items.extend(recovered)
+
+    if not items:
+        return None, f"Failed to parse valid JSON from response for {file_name}"
+    if still_missing:
+        return items, f"No response for {', '.join(still_missing)} from {file_name} after re-asking"
+    return items, None
+
+
+def requery_answers(aggregated_responses, gaps, sections, replace=False, note=None):
     """
-    Process all user_prompt_TSS-*.txt files and save aggregated AI responses 
-    to a single JSON file with "DOC" and "Excel" keys. 
+    Re-ask the given Ans# keys of each SFR (one request per SFR).
+
+    Only the TSS-requirement/Ans entries of the keys are sent; the returned answers are merged
+    into the SFR's DOC object and its gaps into "Excel".
+    Args:
+        aggregated_responses (dict): Aggregated {"DOC": [...], "Excel": [...]}; updated in place.
+        gaps (dict): SFR name -> answer keys to ask for.
+        sections (dict): Normalized SFR name -> section text of the chunks.
+        replace (bool): Replace answers the DOC object already has instead of only filling missing ones.
+        note (str): Optional instruction appended to the prompt.
+    Returns:
+        dict: SFR name -> answer keys the response did not return.
+    """
+    doc_by_sfr = {obj["SFR"]: obj for obj in aggregated_responses["DOC"] if isinstance(obj, dict) and obj.get("SFR")}
+
+    not_returned = {}
+    for sfr, answer_keys in gaps.items():
+        section_text = sections.get(normalize_sfr(sfr))
+        if section_text is None:
+            print(f"Warning: No requirement section found for {sfr}; cannot re-ask {', '.join(answer_keys)}")
+            not_returned[sfr] = answer_keys
+            continue
+        key_names = ", ".join(answer_keys)
+        print(f"Re-asking for {key_names} of {sfr}...")
+        prompt = build_gap_prompt(section_text, answer_keys)
+        if note:
+            prompt = f"{prompt}{note}\n"
+        try:
+            response, json_data, success = query_ai(prompt, f"{sfr} [{key_names}]")
+        except (QueryError, BudgetExceededError) as e:
+            print(f"Warning: {e}")
+            not_returned[sfr] = answer_keys
+            continue
+        # Save raw gap response for debugging
+        safe_name = re.sub(r'[^\w.-]', '_', sfr)
+        debug_file = os.path.join(DEBUG_DIR, f"raw_gap_{safe_name}.txt")
+        try:
+            with open(debug_file, 'w', encoding='utf-8') as f:
+                f.write(response)
+        except Exception as e:
+            print(f"Warning: Could not write debug file {debug_file}: {str(e)}")
+        returned = set()
+        if success:
+            json_data = expand_compact_response(json_data, [(sfr, section_text)])
+            items = json_data if isinstance(json_data, list) else [json_data]
+            # Answers of a DOC object that does not match the schema stay not returned
+            report_invalid_objects(f"{sfr} [{key_names}]", drop_invalid_objects(items))
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+                for obj in item.get("DOC") or []:
+                    if isinstance(obj, dict) and normalize_sfr(obj.get("SFR", "")) == normalize_sfr(sfr):
+                        for key in answer_keys:
+                            if key not in obj:
+                                continue
+                            returned.add(key)
+                            if replace:
+                                doc_by_sfr[sfr][key] = obj[key]
+                            else:
+                                doc_by_sfr[sfr].setdefault(key, obj[key])
+                if isinstance(item.get("Excel"), list):
+                    aggregated_responses["Excel"].extend(item["Excel"])
+        remaining = [key for key in answer_keys if key not in returned]
+        if remaining:
+            not_returned[sfr] = remaining
+    return not_returned
+
+def requery_missing_answers(aggregated_responses, expected_keys, sections):
+    """
+    Re-query the Ans# keys that the template expects for an SFR but the responses did not return.
+
+    Args:
+        aggregated_responses (dict): Aggregated {"DOC": [...], "Excel": [...]}; updated in place.
+        expected_keys (dict): Base SFR name -> answer keys of its TSS section in the template.
+        sections (dict): Normalized SFR name -> section text of the chunks.
+    Returns:
+        dict: SFR name -> answer keys still missing afterwards.
+    """
+    gaps = find_missing_answers(aggregated_responses["DOC"], expected_keys)
+    if not gaps:
+        return {}
+    print(f"\nFound {len(gaps)} SFR(s) with answers missing for template placeholders.")
+    return requery_answers(aggregated_responses, gaps, sections)
+
+def verify_quotes(aggregated_responses, sections, files_with_issues, tss_texts=None):
+    """
+    Check the quotes of satisfied answers against the TSS text of their SFR.
+
+    Answers whose quote is reworded or not found in the TSS text are re-asked first when
+    requery_quotes is set; those still unverified are added to "Excel" (the Gaps sheet)
+    and to files_with_issues.
+    Args:
+        aggregated_responses (dict): Aggregated {"DOC": [...], "Excel": [...]}; updated in place.
+        sections (dict): Normalized SFR name -> section text of the chunks.
+        files_with_issues (list): Issue list of the run; updated in place.
+        tss_texts (dict): SFR name -> full TSS text; read from tss_texts.json if None.
+    """
+    quote_index = QuoteIndex(load_tss_texts(os.path.join(OUTPUT_DIR, TSS_TEXTS_FILE), sections, tss_texts))
+    unverified = find_unverified_quotes(aggregated_responses["DOC"], quote_index)
+    if unverified and requery_quotes:
+        print(f"\nRe-asking {sum(len(results) for results in unverified.values())} answer(s) with unverified quotes.")
+        requery_answers(aggregated_responses, {sfr: list(results) for sfr, results in unverified.items()},
+                        sections, replace=True, note=QUOTE_REASK_NOTE)
+        unverified = find_unverified_quotes(aggregated_responses["DOC"], quote_index)
+
+    for sfr, results in unverified.items():
+        requirements = section_requirements(sections.get(normalize_sfr(sfr), ""))
+        for key, (status, coverage, spans) in results.items():
+            number = key.split("#", 1)[1]
+            requirement = requirements.get(number, f"TSS-requirement#{number}")
+            aggregated_responses["Excel"].append(quote_gap_row(sfr, requirement, status, spans))
+            files_with_issues.append({"file": sfr, "warning": f"Quote of {key} {status} in the TSS text ({coverage:.0%} matched)"})
+    flagged = sum(len(results) for results in unverified.values())
+    print(f"Quote check: {flagged} answer(s) with unverified quotes." if flagged else "Quote check: all quotes found in the TSS text.")
+
+def run_api_stage(chunks, aggregated_responses, on_result=None, expected_keys=None, tss_texts=None, process_chunk=None):
+    """
+    Send batches to the AI as they arrive and aggregate the parsed responses.
+
+    A list of batches is dispatched in the chunk_schedule order; any other iterable (e.g. a
+    generator fed by the extraction stage) is dispatched in arrival order, each batch as soon
+    as it is produced.
+    Args:
+        chunks (iterable): PromptChunk objects (e.g. a PromptQueue).
+        aggregated_responses (dict): {"DOC": [...], "Excel": [...]} to aggregate into (e.g. seeded
+                                     with the local answers); updated in place.
+        on_result (callable): Called with (chunk_name, parsed_data, error_message) as soon as a
+                              batch's response is parsed (from a worker thread).
+        expected_keys (dict or Future): template_answer_keys() of the selected SDs, or a Future
+                                        of it; read from the templates if None.
+        tss_texts (dict): Full TSS text of each SFR for the quote check; read from
+                          tss_texts.json if None.
+        process_chunk (callable): Returns (parsed_data, error_message) for a PromptChunk;
+                                  process_and_parse_chunk if None (e.g. the job queue's
+                                  results instead, see blitz_worker.py).
+    Returns:
+        tuple: (error_files, files_with_issues, schedule) with schedule {"policy", "order"}.
     """
-    # Check if the output directory exists
-    if not os.path.exists(OUTPUT_DIR):  
-        print(f"Error: Output directory not found: {OUTPUT_DIR}")  
-        return  
-    
-    # Find all user_prompt_TSS-*.txt files
-    file_pattern = os.path.join(OUTPUT_DIR, "user_prompt_TSS-*.txt")  
-    files = glob.glob(file_pattern)  
-    if not files:
-        print(f"Error: No user_prompt_TSS-*.txt files found in {OUTPUT_DIR}")  
-        return  
-    
-    # Initialize the dictionary to hold aggregated responses
-    aggregated_responses = {"DOC": [], "Excel": []}  # Changed from list 
     error_files = []    # List to track files with errors 
     files_with_issues = []  # Track files with missing keys or errors
-    
-    # Process each file
-    for file_path in files:  
-        file_name = os.path.basename(file_path)  
-        print(f"Processing batch: {file_name}...")  
-        
-        # Process file and get parsed JSON
-        json_data, error = process_and_parse_file(file_path)  
+    sections = {}  # Normalized SFR name -> section text of every batch
+    dispatched = []  # Cost estimates in dispatch order
+
+    # The module outlives a run in the GUI and the daemon: the metrics count this run only
+    rate_limiter.start_run()
+    concurrency.start_run()
+    router.start_run()
+    if hedger:
+        hedger.start_run()
+
+    # Estimate each batch's cost (input plus expected output tokens) to order the dispatch
+    estimates = {}
+    file_order = None
+    if isinstance(chunks, list):
+        policy = chunk_schedule
+        file_order = [chunk.name for chunk in chunks]
+        estimates = {chunk.name: chunk_estimate(chunk.name, chunk.prompt(), compact_responses) for chunk in chunks}
+        by_name = {chunk.name: chunk for chunk in chunks}
+        chunks = [by_name[estimate["chunk"]] for estimate in order_chunks(list(estimates.values()), policy)]
+    else:
+        policy = ARRIVAL
+
+    # Send the batches concurrently; the AIMD controller decides how many requests are in flight
+    print(f"Processing batches with up to {concurrency.maximum} concurrent request(s), {policy} order...")
+    futures = {}
+    with ThreadPoolExecutor(max_workers=concurrency.maximum) as pool:
+        for chunk in chunks:
+            dispatched.append(estimates.get(chunk.name) or chunk_estimate(chunk.name, chunk.prompt(), compact_responses))
+            for sfr, section_text in chunk.sections():
+                sections[normalize_sfr(sfr)] = section_text
+            future = pool.submit(process_chunk or process_and_parse_chunk, chunk)
+            if on_result:
+                future.add_done_callback(lambda done, name=chunk.name: on_result(name, *done.result()))
+            futures[chunk.name] = future
+
+    # Aggregate the results in batch order
+    for file_name in file_order or list(futures):  
+        json_data, error = futures[file_name].result()
+        print(f"Aggregating batch: {file_name}...")  
         
         if error:
             # Handle parsing errors
             print(f"Error: {error}")  # [cite: 31]
             error_files.append(file_name)  # [cite: 31]
             files_with_issues.append({"file": file_name, "error": error})  # Add detailed error info
-            continue  # Skip aggregation for this file
+            if not json_data:
+                continue  # Nothing recovered for this file, skip aggregation
 
         if json_data:
             # Ensure json_data is always a list for consistent processing
@@ -413,6 +758,30 @@ def main():
              error_files.append(file_name)  # [cite: 31]
              files_with_issues.append({"file": file_name, "error": "Unknown processing issue"})  # [cite: 32]
     
+    # Check every SFR's Ans# keys against the placeholders of its template section
+    # and re-ask only the missing answers (AARF drops blocks whose answer is missing)
+    aggregated_responses["DOC"] = merge_duplicate_doc_objects(aggregated_responses["DOC"])
+    if expected_keys is None:
+        expected_keys = template_answer_keys(selected_sds)
+    elif isinstance(expected_keys, Future):
+        expected_keys = expected_keys.result()
+    incomplete_sfrs = requery_missing_answers(aggregated_responses, expected_keys, sections)
+    for sfr, missing_keys in incomplete_sfrs.items():
+        files_with_issues.append({"file": sfr, "warning": f"Answers still missing for {', '.join(missing_keys)}"})
+
+    # Flag satisfied answers whose quote does not match the TSS text
+    verify_quotes(aggregated_responses, sections, files_with_issues, tss_texts)
+    return error_files, files_with_issues, {"policy": policy, "order": dispatched}
+
+def save_results(aggregated_responses, error_files, files_with_issues, schedule):
+    """
+    Save the aggregated responses, print the issue and budget summaries and write the run metrics.
+    Args:
+        aggregated_responses (dict): Aggregated {"DOC": [...], "Excel": [...]}.
+        error_files (list): Batches whose response could not be used.
+        files_with_issues (list): Issues of the run.
+        schedule (dict): Dispatch policy and order (from run_api_stage).
+    """
     # Save the aggregated responses to the JSON file
     try:
         with open(JSON_OUTPUT_PATH, 'w', encoding='utf-8') as f:  # [cite: 32]
@@ -445,10 +814,95 @@ def main():
     except Exception as e:
         print(f"Error saving aggregated JSON file: {str(e)}")  # [cite: 35]
 
+    print("\n--- API Budget Usage ---")
+    print(rate_limiter.report())
+
+    # Record the run metrics (concurrency over time and API usage)
+    controller_metrics = concurrency.summary()
+    print(f"Concurrency: peak {controller_metrics['peak_limit']}, final {controller_metrics['final_limit']}, "
+          f"{controller_metrics['congestion_events']} congestion event(s)")
+    for model_name, health in router.summary().items():
+        print(f"Model {model_name}: {health['requests']} request(s), p50 {health['p50_latency_seconds']}s, "
+              f"p95 {health['p95_latency_seconds']}s, {health['error_rate']:.0%} errors, "
+              f"{health['json_parse_rate']:.0%} parsed, circuit {health['circuit']}")
+    if hedger:
+        hedge_metrics = hedger.summary()
+        print(f"Hedging: {hedge_metrics['hedges_sent']} duplicate request(s) sent, {hedge_metrics['hedges_won']} won, "
+              f"{hedge_metrics['extra_tokens']} extra token(s)")
+    run_metrics = {
+        "schedule": schedule,
+        "concurrency": controller_metrics,
+        "models": router.summary(),
+        "hedging": hedger.summary() if hedger else None,
+        "api_usage": {
+            "requests": rate_limiter.run_requests,
+            "prompt_tokens": rate_limiter.run_prompt_tokens,
+            "completion_tokens": rate_limiter.run_completion_tokens,
+            "rate_limit_wait_seconds": round(rate_limiter.run_wait_seconds, 2),
+        },
+    }
+    run_metrics_path = os.path.join(OUTPUT_DIR, RUN_METRICS_FILE)
+    try:
+        with open(run_metrics_path, 'w', encoding='utf-8') as f:
+            json.dump(run_metrics, f, indent=4)
+        print(f"Run metrics saved to {run_metrics_path}")
+    except Exception as e:
+        print(f"Warning: Could not write run metrics to {run_metrics_path}: {str(e)}")
+
+def main():
+    """
+    Process all user_prompt_TSS-*.txt files and save aggregated AI responses 
+    to a single JSON file with "DOC" and "Excel" keys. 
+    """
+    # Check if the output directory exists
+    if not os.path.exists(OUTPUT_DIR):  
+        print(f"Error: Output directory not found: {OUTPUT_DIR}")  
+        return  
+    
+    # Find all user_prompt_TSS-*.txt files
+    file_pattern = os.path.join(OUTPUT_DIR, CHUNK_FILE_PATTERN)  
+    files = glob.glob(file_pattern)  
+    
+    # Initialize the dictionary to hold aggregated responses
+    aggregated_responses = {"DOC": [], "Excel": []}  # Changed from list 
+
+    # Start from the answers process_files produced without the model (local_rules)
+    local_answers_path = os.path.join(OUTPUT_DIR, LOCAL_ANSWERS_FILE)
+    if os.path.exists(local_answers_path):
+        try:
+            with open(local_answers_path, 'r', encoding='utf-8') as f:
+                local_answers = json.load(f)
+            aggregated_responses["DOC"].extend(local_answers.get("DOC", []))
+            aggregated_responses["Excel"].extend(local_answers.get("Excel", []))
+            print(f"Loaded {len(local_answers.get('DOC', []))} locally answered SFR(s) from {local_answers_path}")
+        except Exception as e:
+            print(f"Warning: Could not read local answers from {local_answers_path}: {str(e)}")
+
+    if not files and not aggregated_responses["DOC"]:
+        print(f"Error: No user_prompt_TSS-*.txt files found in {OUTPUT_DIR}")  
+        return  
+    
+    # Read the batches
+    chunks = []
+    unreadable = []
+    for file_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                chunks.append(PromptChunk.from_prompt(os.path.basename(file_path), f.read()))
+        except Exception as e:
+            print(f"Error: Could not read {file_path}: {str(e)}")
+            unreadable.append(os.path.basename(file_path))
+
+    error_files, files_with_issues, schedule = run_api_stage(chunks, aggregated_responses)
+    for file_name in unreadable:
+        error_files.append(file_name)
+        files_with_issues.append({"file": file_name, "error": "Could not read the batch file"})
+    save_results(aggregated_responses, error_files, files_with_issues, schedule)
+
 """
 def cleanup_files():
     
-    # Delete user prompt files and system message file after successful processing. [cite: 35]
+    # Delete user prompt files (and the run's copy of the system message) after successful processing. [cite: 35]
     
     try:
         # Delete all user prompt files
@@ -458,8 +912,8 @@ def cleanup_files():
             os.remove(file_path)  # [cite: 36]
             print(f"Deleted: {file_path}")  # [cite: 36]
         
-        # Delete system message file
-        if os.path.exists(SYSTEM_MESSAGE_PATH):  # [cite: 36]
+        # Delete the run's system message file (the one in sys_inst/ is shared by every run)
+        if run and os.path.exists(SYSTEM_MESSAGE_PATH):  # [cite: 36]
             os.remove(SYSTEM_MESSAGE_PATH)  # [cite: 37]
             print(f"Deleted: {SYSTEM_MESSAGE_PATH}")  # [cite: 37]
             
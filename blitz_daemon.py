@@ -0,0 +1,348 @@
+"""
+BLITZ daemon: keeps the parsed SD documents, the compiled template plans and the API client
+warm between runs, so a run submitted by the GUI or from the command line skips the start-up work.
+
+Usage:
+    python blitz_daemon.py start
+    python blitz_daemon.py status
+    python blitz_daemon.py stop
+    python blitz_daemon.py run --st=<ST.docx> [--toe=STANDALONE] NDcPP_v3.0 [...] [--stream --gaps-csv ...]
+
+"start" serves in the foreground (run it in the background, e.g. with pythonw on Windows). The
+daemon listens on 127.0.0.1 (BLITZ_DAEMON_PORT in the .env file, any free port by default) and
+writes its port and a secret to ephemeral/daemon.json; only clients that can read that file can
+use it. Runs are processed one at a time and their console output is streamed back. The .env
+settings are read when the daemon starts (except TOKEN, which is read for every run), so restart
+it after changing them.
+"""
+import os
+import sys
+import json
+import time
+import hmac
+import socket
+import threading
+import contextlib
+import socketserver
+from dotenv import load_dotenv
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENV_PATH = os.path.join(BASE_DIR, ".env")
+# Port and secret of the running daemon
+DAEMON_FILE = os.path.join(BASE_DIR, "ephemeral", "daemon.json")
+# Seconds a client waits for the daemon to answer a status request
+CONNECT_TIMEOUT = 2.0
+
+
+class DaemonError(Exception):
+    """The daemon is not running or did not answer."""
+
+
+def daemon_info():
+    """Port and secret of the running daemon (from DAEMON_FILE), or None."""
+    try:
+        with open(DAEMON_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _request(action, timeout=None, **fields):
+    """Send a request to the daemon and yield the events it answers with."""
+    info = daemon_info()
+    if not info:
+        raise DaemonError("The BLITZ daemon is not running")
+    try:
+        conn = socket.create_connection(("127.0.0.1", info["port"]), timeout=CONNECT_TIMEOUT)
+    except OSError as e:
+        raise DaemonError(f"Could not connect to the BLITZ daemon: {str(e)}")
+    with conn:
+        conn.settimeout(timeout)
+        conn.sendall((json.dumps(dict(fields, action=action, secret=info["secret"])) + "\n").encode("utf-8"))
+        with conn.makefile("r", encoding="utf-8") as answers:
+            for line in answers:
+                yield json.loads(line)
+
+
+def daemon_status():
+    """Status of the running daemon (warm caches, runs served), or None if none is running."""
+    try:
+        for event in _request("status", timeout=CONNECT_TIMEOUT):
+            return event
+    except (DaemonError, OSError, ValueError):
+        return None
+
+
+def submit_run(st_path, sd_names, toe_type=None, report_flags=(), on_output=None):
+    """
+    Have the daemon run an evaluation, streaming its console output.
+
+    Args:
+        st_path (str): Path of the ST document.
+        sd_names (list): Selected SD names (keys of Blitz.SD_OPTIONS).
+        toe_type (str): TOE type (STANDALONE or DISTRIBUTED).
+        report_flags (iterable): AARF options (e.g. --stream, --gaps-csv).
+        on_output (callable): Called with each piece of console output; written to stdout if None.
+
+    Returns:
+        tuple: (success, message, output_dir)
+
+    Raises:
+        DaemonError: The daemon is not running or the connection was lost.
+    """
+    on_output = on_output or (lambda text: print(text, end=""))
+    try:
+        for event in _request("run", st_path=os.path.abspath(st_path), sd_names=list(sd_names), toe_type=toe_type,
+                              report_flags=list(report_flags)):
+            if event["event"] == "output":
+                on_output(event["text"])
+            elif event["event"] == "done":
+                return event["success"], event["message"], event.get("output_dir")
+    except (OSError, ValueError) as e:
+        raise DaemonError(f"Lost the connection to the BLITZ daemon: {str(e)}")
+    raise DaemonError("The BLITZ daemon closed the connection before the run finished")
+
+
+class _EventWriter:
+    """File-like object sending what is written to it to a client as "output" events."""
+
+    def __init__(self, send):
+        self._send = send
+
+    def write(self, text):
+        if text:
+            self._send({"event": "output", "text": text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class _RunOutput:
+    """
+    Stream installed once as sys.stdout or sys.stderr of the daemon: what a run's threads write
+    goes to its client, the rest to the daemon's console.
+
+    The threads that were running when a run started (the server and the other clients'
+    handlers) are not the run's; every thread started since (the run's extraction, API and
+    hedge threads) is, as runs are processed one at a time. The stream itself is never
+    swapped, unlike with contextlib.redirect_stdout in a handler thread.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._writer = None
+        self._outside = frozenset()
+
+    @contextlib.contextmanager
+    def capture(self, writer):
+        """Send the output of the calling thread and the threads it starts to writer."""
+        self._outside = frozenset(threading.enumerate()) - {threading.current_thread()}
+        self._writer = writer
+        try:
+            yield
+        finally:
+            self._writer = None
+
+    def _target(self):
+        writer = self._writer
+        return writer if writer is not None and threading.current_thread() not in self._outside else self._stream
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        # encoding, isatty, fileno, ... of the console stream
+        return getattr(self._stream, name)
+
+
+class BlitzDaemon:
+    """Warm state of the daemon: the API module (with its pooled HTTP client), the SD indexes and the template plans."""
+
+    def __init__(self):
+        from pipeline import load_api_module
+        import AARF
+        import Blitz
+        self.AARF = AARF
+        self.Blitz = Blitz
+        self.api = load_api_module()
+        self.started = time.time()
+        self.runs = 0
+        self._run_lock = threading.Lock()
+        self.stdout = sys.stdout = _RunOutput(sys.stdout)
+        self.stderr = sys.stderr = _RunOutput(sys.stderr)
+
+    def sd_paths(self):
+        """SD name -> document path of every SD the GUI offers."""
+        return {name: path for options in self.Blitz.SD_OPTIONS.values() if isinstance(options, dict)
+                for name, path in options.items()}
+
+    def warm(self):
+        """Parse every SD document and template once, so the first run does not pay for it."""
+        started = time.monotonic()
+        for name, path in self.sd_paths().items():
+            try:
+                self.Blitz.sd_index(path)
+            except Exception as e:
+                print(f"Warning: Could not parse SD {name}: {str(e)}")
+        templates = sorted(name[:-len("-template.docx")] for name in os.listdir(self.AARF.TEMPLATE_DIR)
+                           if name.endswith("-template.docx"))
+        self.AARF.template_answer_keys(templates)
+        print(f"Warmed {len(self.sd_paths())} SD document(s) and {len(templates)} template(s) in {time.monotonic() - started:.1f}s")
+
+    def status(self):
+        return {"event": "status", "pid": os.getpid(), "uptime_seconds": round(time.time() - self.started),
+                "runs": self.runs, "busy": self._run_lock.locked(),
+                "cache_hits": self.Blitz._sd_indexes.hits + self.AARF._template_plans.hits + self.AARF._template_keys.hits}
+
+    def run(self, request, send):
+        """Run one evaluation with its console output sent to the client; returns the "done" event."""
+        if self._run_lock.locked():
+            send({"event": "output", "text": "Waiting for the current run to finish...\n"})
+        with self._run_lock:
+            writer = _EventWriter(send)
+            with self.stdout.capture(writer), self.stderr.capture(writer):
+                try:
+                    return self._run(request)
+                except Exception as e:
+                    import traceback
+                    print(traceback.format_exc())
+                    return {"event": "done", "success": False, "message": f"An unexpected error occurred: {str(e)}"}
+                finally:
+                    self.runs += 1
+
+    def _run(self, request):
+        from pipeline import run_pipeline
+        from run_context import RunContext, build_system_message
+        sd_paths = self.sd_paths()
+        unknown = [name for name in request.get("sd_names", []) if name not in sd_paths]
+        if unknown or not request.get("sd_names"):
+            return {"event": "done", "success": False, "message": f"Unknown or no SD selected: {', '.join(unknown)}"}
+        st_path = request.get("st_path", "")
+        if not os.path.exists(st_path):
+            return {"event": "done", "success": False, "message": f"ST document not found: {st_path}"}
+
+        run = RunContext().create()
+        print(f"Run ID: {run.run_id}")
+        toe_type = request.get("toe_type")
+        processor = self.Blitz.RequirementsProcessor(run.work_dir)
+        success, message = run_pipeline(processor, st_path, [sd_paths[name] for name in request["sd_names"]], toe_type,
+                                         request["sd_names"], run, build_system_message(toe_type),
+                                         request.get("report_flags", ()))
+        return {"event": "done", "success": success, "message": message, "run_id": run.run_id, "output_dir": run.output_dir}
+
+
+class _DaemonServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        send_lock = threading.Lock()
+        connected = [True]
+
+        def send(event):
+            # Output of a run whose client went away is dropped; the run goes on
+            with send_lock:
+                if not connected[0]:
+                    return
+                try:
+                    self.wfile.write((json.dumps(event) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                except OSError:
+                    connected[0] = False
+
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        if not hmac.compare_digest(str(request.get("secret", "")), server.secret):
+            send({"event": "error", "message": "Wrong secret"})
+            return
+        action = request.get("action")
+        if action == "status":
+            send(server.blitz.status())
+        elif action == "stop":
+            send({"event": "stopping"})
+            threading.Thread(target=server.shutdown, daemon=True).start()
+        elif action == "run":
+            send(server.blitz.run(request, send))
+        else:
+            send({"event": "error", "message": f"Unknown action '{action}'"})
+
+
+def serve():
+    """Warm the caches and serve requests until stopped."""
+    load_dotenv(ENV_PATH)
+    if daemon_status():
+        print("Error: A BLITZ daemon is already running")
+        sys.exit(1)
+    blitz = BlitzDaemon()
+    blitz.warm()
+    try:
+        port = int(os.getenv("BLITZ_DAEMON_PORT", "0").strip() or 0)
+    except ValueError:
+        print("Warning: BLITZ_DAEMON_PORT is not a number; using any free port")
+        port = 0
+    server = _DaemonServer(("127.0.0.1", port), _RequestHandler)
+    server.blitz = blitz
+    server.secret = os.urandom(16).hex()
+
+    os.makedirs(os.path.dirname(DAEMON_FILE), exist_ok=True)
+    with open(DAEMON_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"port": server.server_address[1], "secret": server.secret, "pid": os.getpid()}, f)
+    print(f"BLITZ daemon listening on 127.0.0.1:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # Leave the file of a daemon started since (e.g. after this one was stopped)
+        info = daemon_info()
+        if info and info.get("pid") == os.getpid():
+            os.remove(DAEMON_FILE)
+        print("BLITZ daemon stopped")
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "start":
+        serve()
+    elif command == "status":
+        status = daemon_status()
+        print(json.dumps(status, indent=4) if status else "The BLITZ daemon is not running")
+    elif command == "stop":
+        try:
+            for event in _request("stop", timeout=CONNECT_TIMEOUT):
+                print("BLITZ daemon stopping")
+        except (DaemonError, OSError) as e:
+            print(f"Error: {str(e)}")
+            sys.exit(1)
+    elif command == "run":
+        args = sys.argv[2:]
+        options = dict(arg[2:].split("=", 1) for arg in args if arg.startswith("--") and "=" in arg)
+        if not options.get("st"):
+            print("Error: Pass the ST document with --st=<path>")
+            sys.exit(1)
+        try:
+            success, message, output_dir = submit_run(options["st"], [arg for arg in args if not arg.startswith("--")],
+                                                      options.get("toe", "STANDALONE"),
+                                                      [arg for arg in args if arg.startswith("--") and "=" not in arg])
+        except DaemonError as e:
+            print(f"Error: {str(e)}")
+            sys.exit(1)
+        print(f"\n{message}" + (f"\nResults: {output_dir}" if success else ""))
+        sys.exit(0 if success else 1)
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+BLITZ worker: leases chunk jobs from the shared job queue, sends them to the model and stores
+the parsed responses for the run that enqueued them.
+
+Usage:
+    python blitz_worker.py [--queue=sqlite:/shared/blitz/jobs.db] [--processes=N] [--exit-when-idle]
+
+The queue defaults to JOB_QUEUE in the .env file. Start any number of workers on any number of
+hosts that can reach the queue; each host uses its own TOKEN and rate limits. The API options
+(--hedge, --structured, ...) apply as for api_processing_deb.py.
+"""
+import os
+import sys
+import time
+import socket
+import threading
+import multiprocessing
+from dotenv import load_dotenv
+from job_queue import DONE, LEASE_SECONDS, job_queue_spec, open_job_queue
+from prompt_queue import PromptChunk
+
+# Seconds between looks at an empty queue
+POLL_SECONDS = 1.0
+
+
+def worker_id():
+    """ID of this worker process in the queue (host and process ID)."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def process_job(api, job_queue, job, worker):
+    """
+    Process one leased job and store its result.
+
+    The lease is renewed while the model is answering; an exception gives the job back to the queue.
+
+    Args:
+        api (module): api_processing_deb, with the client of this host.
+        job_queue (JobQueue): The shared queue.
+        job (Job): The leased job.
+        worker (str): ID the job is leased to.
+    """
+    info = job_queue.run_info(job.run_id)
+    if info is None:
+        job_queue.fail(job, f"Run {job.run_id} is not registered", worker)
+        return
+
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(LEASE_SECONDS / 3):
+            if not job_queue.renew(job, worker):
+                print(f"Warning: Lost the lease of {job.name} ({job.run_id})")
+                return
+    renewer = threading.Thread(target=heartbeat, daemon=True)
+    renewer.start()
+    try:
+        # The run's settings are passed with the job; the module settings belong to this process
+        items, error = api.process_and_parse_chunk(PromptChunk.from_dict(job.payload), info.get("system_message"),
+                                                   info.get("compact_responses"))
+    except Exception as e:
+        print(f"Error: {job.name} ({job.run_id}) failed on attempt {job.attempts}: {str(e)}")
+        job_queue.fail(job, str(e), worker)
+        return
+    finally:
+        stop.set()
+        renewer.join()
+    job_queue.complete(job, {"items": items, "error": error})
+
+
+def job_results(api, job_queue, run_id, poll_seconds=POLL_SECONDS):
+    """
+    process_chunk for run_api_stage that collects a chunk's result from the job queue.
+
+    While its chunk is pending, the calling thread works on the run's other queued jobs itself,
+    so a run finishes even when no worker is running.
+
+    Args:
+        api (module): api_processing_deb of the coordinating process.
+        job_queue (JobQueue): The shared queue.
+        run_id (str): Run whose chunks were enqueued.
+        poll_seconds (float): Seconds between looks while other workers hold the run's jobs.
+
+    Returns:
+        callable: PromptChunk -> (parsed_data, error_message)
+    """
+    def collect(chunk):
+        worker = f"{worker_id()}-{threading.get_ident()}"
+        while True:
+            outcome = job_queue.outcome(run_id, chunk.name)
+            if outcome is not None:
+                state, value = outcome
+                if state == DONE:
+                    return value["items"], value["error"]
+                return None, f"Job for {chunk.name} failed: {value}"
+            job = job_queue.lease(worker, run_id=run_id)
+            if job is not None:
+                process_job(api, job_queue, job, worker)
+            else:
+                time.sleep(poll_seconds)
+    return collect
+
+
+def run_worker(spec, exit_when_idle=False):
+    """
+    Lease and process jobs until stopped.
+
+    Args:
+        spec (str): Job queue (see open_job_queue).
+        exit_when_idle (bool): Return once the queue has no free job.
+    """
+    from pipeline import load_api_module
+    api = load_api_module()
+    job_queue = open_job_queue(spec)
+    worker = worker_id()
+    print(f"Worker {worker} waiting for jobs on {spec}")
+    processed = 0
+    while True:
+        job = job_queue.lease(worker)
+        if job is None:
+            if exit_when_idle:
+                print(f"Worker {worker} finished ({processed} job(s))")
+                return
+            time.sleep(POLL_SECONDS)
+            continue
+        print(f"Worker {worker} processing {job.name} ({job.run_id}, attempt {job.attempts})")
+        process_job(api, job_queue, job, worker)
+        processed += 1
+
+
+def main():
+    from pipeline import ENV_PATH
+    load_dotenv(ENV_PATH)
+    options = dict(arg[2:].split("=", 1) for arg in sys.argv[1:] if arg.startswith("--") and "=" in arg)
+    spec = options.get("queue") or job_queue_spec()
+    if not spec:
+        print("Error: No job queue (set JOB_QUEUE in the .env file or pass --queue=<path>)")
+        sys.exit(1)
+    exit_when_idle = "--exit-when-idle" in sys.argv[1:]
+    try:
+        processes = int(options.get("processes", 1))
+    except ValueError:
+        print("Error: --processes must be a number")
+        sys.exit(1)
+
+    if processes <= 1:
+        run_worker(spec, exit_when_idle)
+        return
+    workers = [multiprocessing.Process(target=run_worker, args=(spec, exit_when_idle)) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
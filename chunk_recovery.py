@@ -0,0 +1,288 @@
+import re
+import json
+
+from response_schema import EXCEL_FIELDS, doc_object_problems, excel_row_problems
+
+# Line written by RequirementsProcessor.process_files (Blitz.py) after each requirement of a chunk
+SECTION_SEPARATOR = "=" * 80
+_SECTION_HEADER = re.compile(r"^SFR statement for (.+?):\s*$", re.MULTILINE)
+# TSS text shared by several SFRs of a chunk is written once, in a block before their sections,
+# and each section refers to it (see RequirementsProcessor.process_files)
+_SHARED_TSS_HEADER = re.compile(r"^Shared TSS text \[(T\d+)\] for [^\n]*:\n", re.MULTILINE)
+_SHARED_TSS_REFERENCE = re.compile(r"See the shared TSS text \[(T\d+)\] above\.")
+# Divider between the SFR statement, the TSS text and the SD description of a section
+PART_DIVIDER = "-" * 20
+# Start of an SD entry in a section, e.g. "TSS-requirement#2 for FAU_GEN.1 ..." or "Ans#2 for FAU_GEN.1 ..."
+_REQUIREMENT_ENTRY = re.compile(r"^\s*(TSS-requirement|Ans)#(\d+)\b", re.MULTILINE)
+
+
+def shared_tss_block(tag, sfrs, tss_text):
+    """Chunk text holding a TSS text shared by several SFRs (written before their sections)."""
+    return (f"Shared TSS text [{tag}] for {', '.join(sfrs)} (this is the TSS text of each of these SFRs):\n"
+            f"{tss_text}\n\n{SECTION_SEPARATOR}\n\n")
+
+
+def shared_tss_reference(tag):
+    """Placeholder written as the TSS text of an SFR whose text is in a shared block."""
+    return f"See the shared TSS text [{tag}] above."
+
+
+def split_chunk_sections(content):
+    """
+    Split the content of a user_prompt_TSS-N.txt chunk into its requirement sections.
+
+    References to a shared TSS text block are replaced by the shared text, so every section
+    is a self-contained prompt.
+
+    Args:
+        content (str): Content of the chunk file.
+
+    Returns:
+        list: (sfr_name, section_text) tuples in chunk order. Each section_text keeps its
+              separator, so sections can be joined back into a valid prompt.
+    """
+    parts = re.split(rf"^{SECTION_SEPARATOR}\s*$", content, flags=re.MULTILINE)
+    shared_texts = {}
+    for part in parts:
+        match = _SHARED_TSS_HEADER.search(part)
+        if match:
+            shared_texts[match.group(1)] = part[match.end():].strip()
+
+    sections = []
+    for part in parts:
+        match = _SECTION_HEADER.search(part)
+        if match:
+            part = _SHARED_TSS_REFERENCE.sub(lambda ref: shared_texts.get(ref.group(1), ref.group(0)), part)
+            sections.append((match.group(1).strip(), f"{part.strip()}\n\n{SECTION_SEPARATOR}\n\n"))
+    return sections
+
+
+def build_chunk_prompt(sections):
+    """Join requirement sections (from split_chunk_sections) into a user prompt."""
+    return "".join(section_text for _, section_text in sections)
+
+
+def normalize_sfr(sfr):
+    """Normalize an SFR name for comparisons (the model may change case or add spaces)."""
+    return str(sfr).strip().upper()
+
+
+def answered_sfrs(items):
+    """
+    Collect the SFRs that have a "DOC" object in the parsed response items.
+
+    Args:
+        items (list): Parsed response objects ({"DOC": [...], "Excel": [...]}).
+
+    Returns:
+        set: Normalized (stripped, upper-case) SFR names.
+    """
+    answered = set()
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("DOC"), list):
+            continue
+        for obj in item["DOC"]:
+            if isinstance(obj, dict) and obj.get("SFR"):
+                answered.add(normalize_sfr(obj["SFR"]))
+    return answered
+
+
+def missing_sections(sections, items):
+    """Return the sections whose SFR has no "DOC" object in the parsed response items."""
+    answered = answered_sfrs(items)
+    return [(sfr, section_text) for sfr, section_text in sections if normalize_sfr(sfr) not in answered]
+
+
+def _cell_text(value):
+    """Text of an Excel field the model did not answer with a string (a list is joined)."""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "; ".join(_cell_text(part) for part in value)
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def drop_invalid_objects(items):
+    """
+    Apply the DOC/Excel response schema to parsed response objects.
+
+    "DOC" entries that break the schema (e.g. the cut-off last object of a truncated
+    response, or an answer that is not a string) are removed, keeping the valid objects of
+    a partial response; their SFRs are then missing and get re-asked. "Excel" rows that are
+    not objects are removed and the others normalized (EXCEL_FIELDS made strings, other keys
+    dropped), so the Gaps workbook can be written.
+
+    Args:
+        items (list): Parsed response objects; modified in place.
+
+    Returns:
+        list: Descriptions of the removed or normalized entries and their schema violations.
+    """
+    invalid = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        if isinstance(item.get("DOC"), list):
+            kept = []
+            for obj in item["DOC"]:
+                problems = doc_object_problems(obj)
+                if not problems:
+                    kept.append(obj)
+                    continue
+                sfr = obj.get("SFR") if isinstance(obj, dict) else None
+                invalid.append(f"{sfr if isinstance(sfr, str) and sfr.strip() else 'DOC object'} {', '.join(problems)}")
+            item["DOC"] = kept
+        if isinstance(item.get("Excel"), list):
+            rows = []
+            for row in item["Excel"]:
+                problems = excel_row_problems(row)
+                if not problems:
+                    rows.append(row)
+                elif isinstance(row, dict):
+                    invalid.append(f"Excel row (normalized) {', '.join(problems)}")
+                    rows.append({field: _cell_text(row.get(field)) for field in EXCEL_FIELDS})
+                else:
+                    invalid.append(f"Excel row (removed) {', '.join(problems)}")
+            item["Excel"] = rows
+    return invalid
+
+
+def merge_duplicate_doc_objects(doc_objects):
+    """
+    Merge "DOC" objects that share an SFR name (compared with normalize_sfr) into the first one.
+
+    AARF gates the template blocks on the keys of an SFR's last DOC object, so answers
+    spread over several objects (e.g. after a re-ask) would otherwise hide sections. The
+    first answer for a key wins, as it does when AARF fills the placeholders.
+
+    Args:
+        doc_objects (list): Aggregated "DOC" objects.
+
+    Returns:
+        list: DOC objects with one object per SFR, in first-seen order.
+    """
+    merged = []
+    by_sfr = {}
+    for obj in doc_objects:
+        if not isinstance(obj, dict) or not obj.get("SFR"):
+            merged.append(obj)
+            continue
+        first = by_sfr.get(normalize_sfr(obj["SFR"]))
+        if first is None:
+            by_sfr[normalize_sfr(obj["SFR"])] = obj
+            merged.append(obj)
+            continue
+        for key, value in obj.items():
+            first.setdefault(key, value)
+    return merged
+
+
+def find_missing_answers(doc_objects, expected_keys):
+    """
+    Compare the Ans# keys returned for each SFR with the placeholders of its template section.
+
+    Args:
+        doc_objects (list): Aggregated "DOC" objects (one per SFR, see merge_duplicate_doc_objects).
+        expected_keys (dict): Base SFR name -> answer keys of its TSS section in the template.
+
+    Returns:
+        dict: SFR name (as the DOC object has it) -> missing answer keys (in template order), for SFRs with gaps.
+    """
+    expected_by_sfr = {normalize_sfr(sfr): keys for sfr, keys in expected_keys.items()}
+    missing = {}
+    for obj in doc_objects:
+        if not isinstance(obj, dict) or not obj.get("SFR") or normalize_sfr(obj["SFR"]) not in expected_by_sfr:
+            continue
+        gaps = [key for key in expected_by_sfr[normalize_sfr(obj["SFR"])] if key not in obj]
+        if gaps:
+            missing[obj["SFR"]] = gaps
+    return missing
+
+
+def split_sd_entries(sd_desc):
+    """
+    Split the SD description of a requirement into its numbered entries.
+
+    Args:
+        sd_desc (str): SD description as written by process_files.
+
+    Returns:
+        tuple: (preamble, entries) where preamble is the text before the first entry and
+               entries is a list of (kind, number, text) with kind "TSS-requirement" or "Ans"
+               and number a string (e.g. "2").
+    """
+    matches = list(_REQUIREMENT_ENTRY.finditer(sd_desc))
+    if not matches:
+        return sd_desc.strip(), []
+    entries = []
+    for idx, match in enumerate(matches):
+        end = matches[idx + 1].start() if idx + 1 < len(matches) else len(sd_desc)
+        entries.append((match.group(1), match.group(2), sd_desc[match.start():end].strip()))
+    return sd_desc[:matches[0].start()].strip(), entries
+
+
+def entry_body(text):
+    """Text of an SD entry after its heading (e.g. after "TSS-requirement#2 for FAU_GEN.1:")."""
+    return text.split(":", 1)[1].strip() if ":" in text else text.strip()
+
+
+def section_requirements(section_text):
+    """
+    Map the requirement numbers of a chunk section to their TSS-requirement text.
+
+    Args:
+        section_text (str): Section from split_chunk_sections.
+
+    Returns:
+        dict: Requirement number (str) -> TSS-requirement text without its heading.
+    """
+    parts = section_text.split(f"\n{PART_DIVIDER}\n", 2)
+    if len(parts) < 3:
+        return {}
+    _, entries = split_sd_entries(parts[2].replace(SECTION_SEPARATOR, ""))
+    requirements = {}
+    for kind, number, text in entries:
+        if kind == "TSS-requirement":
+            requirements.setdefault(number, entry_body(text))
+    return requirements
+
+
+def join_sd_entries(preamble, entries):
+    """Inverse of split_sd_entries for a (possibly filtered) list of entries."""
+    return "\n".join(part for part in [preamble] + [text for _, _, text in entries] if part)
+
+
+def build_gap_prompt(section_text, answer_keys):
+    """
+    Reduce a requirement section to the TSS-requirement/Ans entries of the given keys.
+
+    The SFR statement and TSS text are kept in full; of the SD description only the entries
+    numbered like answer_keys (plus any text before the first entry) are kept.
+
+    Args:
+        section_text (str): Section from split_chunk_sections.
+        answer_keys (list): Keys to ask for, e.g. ['Ans#2', 'Ans#5'].
+
+    Returns:
+        str: User prompt for the missing answers (the whole section if its SD description
+             has no numbered entries).
+    """
+    parts = section_text.split(f"\n{PART_DIVIDER}\n", 2)
+    if len(parts) < 3:
+        return section_text
+    preamble, entries = split_sd_entries(parts[2].replace(SECTION_SEPARATOR, ""))
+    if not entries:
+        return section_text
+
+    wanted = {key.split("#", 1)[1] for key in answer_keys}
+    narrowed = join_sd_entries(preamble, [entry for entry in entries if entry[1] in wanted])
+    return f"{parts[0]}\n{PART_DIVIDER}\n{parts[1]}\n{PART_DIVIDER}\n\n{narrowed}\n\n{SECTION_SEPARATOR}\n\n"
+
+
+def section_tss_text(section_text):
+    """TSS text of a requirement section (shared text already substituted by split_chunk_sections)."""
+    parts = section_text.split(f"\n{PART_DIVIDER}\n", 2)
+    if len(parts) < 3:
+        return ""
+    header, _, text = parts[1].strip().partition("\n")
+    return text.strip() if header.startswith("TSS text for") else parts[1].strip()
@@ -0,0 +1,113 @@
+from chunk_recovery import normalize_sfr, section_requirements
+from local_rules import NOT_DISTRIBUTED_ANSWER, UNSATISFIED_PHRASE
+
+# Opening that base_TSS.txt requires for every satisfied Ans statement
+SATISFIED_PREFIX = "Upon investigation, the evaluator found that the TSS states that:"
+
+# Status codes of the compact protocol
+CODE_QUOTED = "Q"           # satisfied: exact spans quoted from the TSS text
+CODE_MISSING = "M"          # not satisfied: what is missing from the TSS text
+CODE_NOT_SELECTED = "NS"    # depends on a selection that is not made in the SFR
+CODE_NOT_DISTRIBUTED = "ND" # DISTRIBUTED-only requirement, STANDALONE TOE
+CODE_TEXT = "X"             # any other Ans statement, given in full
+
+# Appended to the system message in compact mode; replaces the DOC/Excel output format
+COMPACT_INSTRUCTIONS = f"""
+## RESPONSE FORMAT: IGNORE THE "DOC"/"Excel" OUTPUT FORMAT DESCRIBED ABOVE AND USE THIS COMPACT FORMAT INSTEAD.
+## Respond with ONE JSON object {{"R": [...]}} holding one entry per SFR: {{"S": "<SFR name>", "A": [[<answer number>, "<code>", <value>], ...]}}, with one item for every Ans#<answer number> of that SFR.
+## Codes and values:
+## "{CODE_QUOTED}": the requirement is satisfied. <value> is an array of the exact spans copied from the TSS text that satisfy it. Do not add "{SATISFIED_PREFIX}".
+## "{CODE_MISSING}": the requirement is NOT satisfied. <value> is the information that is to be included in the TSS text. Do not add "{UNSATISFIED_PHRASE}" and do not repeat the TSS-requirement; the answer number refers to it.
+## "{CODE_NOT_SELECTED}": the assurance activity depends on a selection that is not made in the SFR statement. <value> is that selection.
+## "{CODE_NOT_DISTRIBUTED}": the TOE is STANDALONE and the requirement is for DISTRIBUTED TOEs. <value> is "".
+## "{CODE_TEXT}": any other Ans statement. <value> is the complete Ans statement.
+## Example: {{"R": [{{"S": "FAU_GEN.1", "A": [[1, "{CODE_QUOTED}", ["Administrative tasks of generating, importing and deleting cryptographic keys identify the keys unique name."]], [2, "{CODE_NOT_DISTRIBUTED}", ""]]}}]}}
+"""
+
+
+def is_compact_response(data):
+    """True if a parsed response (or any object of a list of them) uses the compact protocol."""
+    items = data if isinstance(data, list) else [data]
+    return any(isinstance(item, dict) and "R" in item for item in items)
+
+
+def _value_text(value):
+    if isinstance(value, list):
+        return " ".join(str(span).strip() for span in value if str(span).strip())
+    return "" if value is None else str(value).strip()
+
+
+def expand_answer(sfr, code, value):
+    """
+    Rebuild the full Ans statement for one compact answer.
+
+    Args:
+        sfr (str): SFR name.
+        code (str): Status code (see COMPACT_INSTRUCTIONS).
+        value: Quoted spans (list) or text of the answer.
+
+    Returns:
+        str: The Ans statement in the wording base_TSS.txt prescribes.
+    """
+    text = _value_text(value)
+    if code == CODE_QUOTED:
+        return f"{SATISFIED_PREFIX} {text}"
+    if code == CODE_MISSING:
+        return f"{UNSATISFIED_PHRASE} {sfr}: {text}"
+    if code == CODE_NOT_SELECTED:
+        return f"{text} is not selected for {sfr} in the ST; hence this assurance activity is not applicable."
+    if code == CODE_NOT_DISTRIBUTED:
+        return NOT_DISTRIBUTED_ANSWER
+    return text
+
+
+def expand_compact_response(data, sections):
+    """
+    Expand a compact-protocol response into the {"DOC": [...], "Excel": [...]} structure.
+
+    Responses that are not compact are returned unchanged, so this can be applied to every
+    parsed response.
+
+    Args:
+        data: Parsed response (an object or a list of objects).
+        sections (list): (sfr_name, section_text) tuples the response answers; used to look
+                         up the TSS-requirement text of the Excel rows.
+
+    Returns:
+        The expanded response (a list of objects if data was a list).
+    """
+    if not is_compact_response(data):
+        return data
+    requirements_by_sfr = {normalize_sfr(sfr): section_requirements(section_text) for sfr, section_text in sections}
+
+    expanded_items = []
+    for item in (data if isinstance(data, list) else [data]):
+        if not isinstance(item, dict) or "R" not in item:
+            expanded_items.append(item)
+            continue
+        expanded = {"DOC": [], "Excel": []}
+        for entry in item.get("R") or []:
+            if not isinstance(entry, dict) or not entry.get("S"):
+                continue
+            sfr = str(entry["S"]).strip()
+            requirements = requirements_by_sfr.get(normalize_sfr(sfr), {})
+            doc_obj = {"SFR": sfr}
+            for answer in entry.get("A") or []:
+                if not isinstance(answer, list) or len(answer) < 2:
+                    continue
+                number = str(answer[0]).strip().lstrip("#")
+                code = str(answer[1]).strip().upper()
+                value = answer[2] if len(answer) > 2 else ""
+                if code != CODE_NOT_DISTRIBUTED and not _value_text(value):
+                    # Cut off (truncated response) or empty: leave it to the completeness check
+                    continue
+                doc_obj[f"Ans#{number}"] = expand_answer(sfr, code, value)
+                if code == CODE_MISSING:
+                    expanded["Excel"].append({
+                        "SFR": sfr,
+                        "TSS-requirement": requirements.get(number, f"TSS-requirement#{number}"),
+                        "Missing information": _value_text(value),
+                    })
+            expanded["DOC"].append(doc_obj)
+        expanded_items.append(expanded)
+    return expanded_items if isinstance(data, list) else expanded_items[0]
@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+
+# Run metrics (concurrency over time, API usage) written next to ai_responses.json
+RUN_METRICS_FILE = "run_metrics.json"
+
+
+def _env_number(name, default, cast=int):
+    try:
+        return cast(os.getenv(name, "").strip() or default)
+    except ValueError:
+        print(f"Warning: {name} is not a number; using {default}")
+        return default
+
+
+def failure_status(exc):
+    """HTTP status of a failed API call (0 for connection errors and timeouts)."""
+    status = getattr(exc, "status_code", None)
+    return status if isinstance(status, int) else 0
+
+
+class AIMDController:
+    """Adaptive limit on the number of API requests in flight (additive increase, multiplicative decrease).
+
+    Every healthy response while all slots are in use raises the limit by 1/limit (about +1 per
+    round of requests); a 429, a 5xx, a connection error or a latency above latency_spike times
+    the running average cuts it by the backoff factor, at most once per average latency (the
+    requests in flight at that moment report the same congestion).
+
+    Args:
+        initial (int): Limit to start with.
+        minimum (int): Lowest limit.
+        maximum (int): Highest limit (also the number of worker threads worth starting).
+        backoff (float): Factor applied to the limit on congestion.
+        latency_spike (float): Latency, relative to the running average, treated as congestion.
+    """
+
+    def __init__(self, initial=2, minimum=1, maximum=8, backoff=0.5, latency_spike=2.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.backoff = backoff
+        self.latency_spike = latency_spike
+        self.in_flight = 0
+        self.average_latency = None
+        self.successes = 0
+        self.congestion_events = 0
+        self.errors = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._started = time.monotonic()
+        self.history = []
+        self._record()
+
+    @classmethod
+    def from_env(cls):
+        """Controller configured by API_INITIAL_CONCURRENCY and API_MAX_CONCURRENCY."""
+        return cls(initial=_env_number("API_INITIAL_CONCURRENCY", 2), maximum=_env_number("API_MAX_CONCURRENCY", 8))
+
+    def _record(self):
+        self.history.append({
+            "seconds": round(time.monotonic() - self._started, 2),
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+        })
+
+    def start_run(self):
+        """Reset the run metrics; the learned limit and average latency carry over to the new run."""
+        with self._cond:
+            self.successes = 0
+            self.congestion_events = 0
+            self.errors = 0
+            self._started = time.monotonic()
+            self.history = []
+            self._record()
+
+    def acquire(self):
+        """Wait for a free request slot."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def cancel(self):
+        """Free a request slot whose request was not sent (the limit is left as it is)."""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, latency, status=None):
+        """
+        Free a request slot and adapt the limit to its outcome.
+
+        Args:
+            latency (float): Seconds the request took.
+            status (int): None for a successful request, else the HTTP status of the failure
+                          (0 for connection errors, see failure_status).
+        """
+        with self._cond:
+            # Only a limit that is actually used is raised (idle slots prove nothing about capacity)
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            previous = int(self.limit)
+            now = time.monotonic()
+            congested = status is not None and (status == 429 or status >= 500 or status == 0)
+            if status is None:
+                self.successes += 1
+                spike = self.average_latency is not None and latency > self.latency_spike * self.average_latency
+                self.average_latency = latency if self.average_latency is None else 0.8 * self.average_latency + 0.2 * latency
+                congested = spike
+            elif not congested:
+                # Client errors (e.g. 400) say nothing about the provider's capacity
+                self.errors += 1
+
+            if congested:
+                self.congestion_events += 1
+                if now - self._last_decrease >= (self.average_latency or latency):
+                    self.limit = max(float(self.minimum), self.limit * self.backoff)
+                    self._last_decrease = now
+            elif status is None and saturated:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+            if int(self.limit) != previous:
+                self._record()
+            self._cond.notify_all()
+
+    def summary(self):
+        """Run metrics of the controller."""
+        limits = [entry["limit"] for entry in self.history]
+        return {
+            "final_limit": int(self.limit),
+            "peak_limit": max(limits),
+            "successful_requests": self.successes,
+            "congestion_events": self.congestion_events,
+            "other_errors": self.errors,
+            "average_latency_seconds": round(self.average_latency or 0.0, 2),
+            "history": self.history,
+        }
@@ -0,0 +1,157 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+# Chunk requests observed before a hedge delay is derived from their latency
+MIN_LATENCY_SAMPLES = 5
+# Latencies kept for the percentile
+LATENCY_WINDOW = 200
+
+
+class LatencyTracker:
+    """Latencies of recent requests.
+
+    Args:
+        window (int): Number of latencies kept.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def percentile(self, fraction):
+        """Latency below which the given fraction of the samples lies (None without samples)."""
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Hedger:
+    """Send a duplicate of a request that is slower than most and keep the first valid result.
+
+    The synchronous client cannot abort a request in flight, so the slower request is
+    abandoned: its result is discarded and its tokens are counted as extra spend when it
+    finishes.
+
+    Args:
+        percentile (float): Fraction of the observed latencies after which a duplicate is sent.
+        min_samples (int): Latencies needed before hedging starts.
+    """
+
+    def __init__(self, percentile=0.9, min_samples=MIN_LATENCY_SAMPLES):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latencies = LatencyTracker()
+        self.requests = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.extra_tokens = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Hedger configured by HEDGE_PERCENTILE (e.g. 90 for the 90th percentile)."""
+        try:
+            percentile = float(os.getenv("HEDGE_PERCENTILE", "").strip() or 90) / 100
+        except ValueError:
+            print("Warning: HEDGE_PERCENTILE is not a number; using 90")
+            percentile = 0.9
+        return cls(percentile=min(max(percentile, 0.5), 0.99))
+
+    def hedge_delay(self):
+        """Seconds after which a duplicate is sent (None while too few latencies are known)."""
+        if len(self.latencies) < self.min_samples:
+            return None
+        return self.latencies.percentile(self.percentile)
+
+    def run(self, primary, duplicate, accept):
+        """
+        Run a request, sending a duplicate if it takes longer than the hedge delay.
+
+        Args:
+            primary (callable): Sends the request; returns (result, tokens_used).
+            duplicate (callable): Sends the duplicate (possibly to another model); same return.
+            accept (callable): True if a result is usable (e.g. parses as JSON).
+
+        Returns:
+            The first accepted result, or the last result if none is accepted.
+        """
+        results = queue.Queue()
+        taken = {}  # set once a result is taken; requests finishing later are extra spend
+
+        def attempt(name, call):
+            started = time.monotonic()
+            result, tokens = call()
+            # Every usable answer counts, including abandoned ones (they make up the latency tail)
+            if accept(result):
+                self.latencies.add(time.monotonic() - started)
+            with self._lock:
+                if taken:
+                    self.extra_tokens += tokens
+                else:
+                    results.put((name, result, tokens, time.monotonic() - started))
+
+        started = time.monotonic()
+        threading.Thread(target=attempt, args=("primary", primary), daemon=True).start()
+        delay = self.hedge_delay()
+        running = 1
+        hedged = False
+        finished = []
+        while running:
+            timeout = None if hedged or delay is None else max(0.0, delay - (time.monotonic() - started))
+            try:
+                outcome = results.get(timeout=timeout)
+            except queue.Empty:
+                hedged = True
+                running += 1
+                with self._lock:
+                    self.hedges_sent += 1
+                threading.Thread(target=attempt, args=("duplicate", duplicate), daemon=True).start()
+                continue
+            running -= 1
+            finished.append(outcome)
+            # A request that fails before the hedge delay is not hedged (retries are handled elsewhere)
+            if accept(outcome[1]) or not hedged:
+                break
+
+        accepted = [outcome for outcome in finished if accept(outcome[1])]
+        name, result, _, _ = accepted[0] if accepted else finished[-1]
+        with self._lock:
+            taken["name"] = name
+            self.requests += 1
+            if name == "duplicate":
+                self.hedges_won += 1
+            self.extra_tokens += sum(outcome[2] for outcome in finished if outcome[0] != name)
+            while not results.empty():
+                self.extra_tokens += results.get()[2]
+        return result
+
+    def start_run(self):
+        """Reset the run metrics; the observed latencies (and so the hedge delay) carry over."""
+        with self._lock:
+            self.requests = 0
+            self.hedges_sent = 0
+            self.hedges_won = 0
+            self.extra_tokens = 0
+
+    def summary(self):
+        """Run metrics of the hedger."""
+        return {
+            "percentile": self.percentile,
+            "hedge_delay_seconds": round(self.hedge_delay() or 0.0, 2),
+            "requests": self.requests,
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            "extra_tokens": self.extra_tokens,
+        }
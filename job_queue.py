@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import closing
+from prompt_queue import PromptQueue
+
+# Default queue; point JOB_QUEUE at a path every worker host can reach (e.g. a network share)
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ephemeral", "job_queue.db")
+# Seconds a leased job stays with its worker without a renewal; then another worker may take it
+LEASE_SECONDS = 120
+# Leases a job gets before it is marked failed (a worker crashing on every attempt)
+MAX_ATTEMPTS = 3
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def job_queue_spec():
+    """Queue set by JOB_QUEUE in the .env file ("sqlite:<path>", a plain path, or "1" for the default), or None."""
+    spec = os.getenv("JOB_QUEUE", "").strip()
+    if spec.lower() in ("", "0", "false", "no"):
+        return None
+    if spec.lower() in ("1", "true", "yes"):
+        return f"sqlite:{DEFAULT_DB_PATH}"
+    return spec
+
+
+class Job:
+    """A chunk job leased by a worker.
+
+    Args:
+        job_id (int): ID of the job in the queue.
+        run_id (str): Run the chunk belongs to.
+        name (str): Chunk name.
+        payload (dict): PromptChunk.to_dict() of the chunk.
+        attempts (int): Leases the job has had (including this one).
+    """
+
+    def __init__(self, job_id, run_id, name, payload, attempts):
+        self.job_id = job_id
+        self.run_id = run_id
+        self.name = name
+        self.payload = payload
+        self.attempts = attempts
+
+
+class JobQueue(ABC):
+    """Interface of a work-queue backend.
+
+    Jobs are leased rather than taken: a job whose worker does not renew its lease in time
+    (e.g. because the worker crashed) goes back to the queue. Backends are registered with
+    register_backend() and opened by open_job_queue().
+    """
+
+    @abstractmethod
+    def register_run(self, run_id, info):
+        """Store the settings the workers need for a run's jobs (e.g. its system message)."""
+
+    @abstractmethod
+    def run_info(self, run_id):
+        """Settings stored by register_run(), or None."""
+
+    @abstractmethod
+    def enqueue(self, run_id, name, payload):
+        """Add a chunk job; a job of the same run and name is replaced."""
+
+    @abstractmethod
+    def lease(self, worker_id, run_id=None, lease_seconds=LEASE_SECONDS):
+        """Lease the oldest free job (of run_id only, if given); returns a Job or None."""
+
+    @abstractmethod
+    def renew(self, job, worker_id, lease_seconds=LEASE_SECONDS):
+        """Extend a lease; returns False if the job is no longer leased to the worker."""
+
+    @abstractmethod
+    def complete(self, job, result):
+        """Store the result of a job; returns False if the job already has one."""
+
+    @abstractmethod
+    def fail(self, job, error, worker_id):
+        """Give a job leased to the worker back after an error; it is marked failed once it has had MAX_ATTEMPTS leases."""
+
+    @abstractmethod
+    def outcome(self, run_id, name):
+        """(state, result or error) of a finished job (DONE or FAILED), or None while it is pending."""
+
+    @abstractmethod
+    def purge_run(self, run_id):
+        """Remove a run and its jobs once the results are collected."""
+
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue in a SQLite database shared by the coordinator and the workers.
+
+    Every lease and state change is one BEGIN IMMEDIATE transaction, so any number of worker
+    processes (on any host that can lock the database file) can use the same queue.
+
+    Args:
+        db_path (str): SQLite database holding the queue.
+        max_attempts (int): Leases a job gets before it is marked failed.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_attempts=MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, info TEXT, created REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT, name TEXT, "
+                         "payload TEXT, state TEXT, worker TEXT, lease_until REAL, attempts INTEGER, result TEXT, "
+                         "error TEXT, updated REAL, UNIQUE (run_id, name))")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)")
+
+    def _connect(self):
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _write(self, statement, params):
+        """Run one statement in its own write transaction; returns the number of changed rows."""
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            changed = conn.execute(statement, params).rowcount
+            conn.execute("COMMIT")
+        return changed
+
+    def register_run(self, run_id, info):
+        self._write("INSERT OR REPLACE INTO runs (run_id, info, created) VALUES (?, ?, ?)",
+                    (run_id, json.dumps(info), time.time()))
+
+    def run_info(self, run_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT info FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def enqueue(self, run_id, name, payload):
+        self._write("INSERT OR REPLACE INTO jobs (run_id, name, payload, state, attempts, updated) VALUES (?, ?, ?, ?, 0, ?)",
+                    (run_id, name, json.dumps(payload), QUEUED, time.time()))
+
+    def lease(self, worker_id, run_id=None, lease_seconds=LEASE_SECONDS):
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                # Leases that ran out have exhausted their attempts: the job will not be retried
+                conn.execute("UPDATE jobs SET state = ?, error = ?, updated = ? WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                             (FAILED, "Lease expired (worker lost)", now, LEASED, now, self.max_attempts))
+                query = "SELECT id, run_id, name, payload, attempts FROM jobs WHERE (state = ? OR (state = ? AND lease_until < ?))"
+                params = [QUEUED, LEASED, now]
+                if run_id is not None:
+                    query += " AND run_id = ?"
+                    params.append(run_id)
+                row = conn.execute(query + " ORDER BY id LIMIT 1", params).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute("UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                             (LEASED, worker_id, now + lease_seconds, now, row[0]))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return Job(row[0], row[1], row[2], json.loads(row[3]), row[4] + 1)
+
+    def renew(self, job, worker_id, lease_seconds=LEASE_SECONDS):
+        return self._write("UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND state = ? AND worker = ?",
+                           (time.time() + lease_seconds, time.time(), job.job_id, LEASED, worker_id)) > 0
+
+    def complete(self, job, result):
+        # A worker whose lease expired may still finish; the first result is kept
+        return self._write("UPDATE jobs SET state = ?, result = ?, error = NULL, updated = ? WHERE id = ? AND state != ?",
+                           (DONE, json.dumps(result), time.time(), job.job_id, DONE)) > 0
+
+    def fail(self, job, error, worker_id):
+        # A worker whose lease expired must not give back the job another worker holds now
+        state = FAILED if job.attempts >= self.max_attempts else QUEUED
+        self._write("UPDATE jobs SET state = ?, error = ?, worker = NULL, updated = ? WHERE id = ? AND state = ? AND worker = ?",
+                    (state, error, time.time(), job.job_id, LEASED, worker_id))
+
+    def outcome(self, run_id, name):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT state, result, error, lease_until, attempts FROM jobs WHERE run_id = ? AND name = ?",
+                               (run_id, name)).fetchone()
+        if row is None:
+            return FAILED, f"No job for {name}"
+        state, result, error, lease_until, attempts = row
+        if state == DONE:
+            return DONE, json.loads(result)
+        if state == FAILED:
+            return FAILED, error
+        if state == LEASED and attempts >= self.max_attempts and lease_until < time.time():
+            return FAILED, "Lease expired (worker lost)"
+        return None
+
+    def purge_run(self, run_id):
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM jobs WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            conn.execute("COMMIT")
+
+
+# Queue backends by scheme ("sqlite:/shared/blitz/jobs.db")
+BACKENDS = {"sqlite": SQLiteJobQueue}
+
+
+def register_backend(scheme, factory):
+    """Make a JobQueue backend available to open_job_queue(); factory is called with the location."""
+    BACKENDS[scheme] = factory
+
+
+def open_job_queue(spec):
+    """
+    Open a job queue.
+
+    Args:
+        spec (str): "<scheme>:<location>" of a registered backend; a plain path is a SQLite database.
+
+    Returns:
+        JobQueue: The queue.
+    """
+    scheme, _, location = spec.partition(":")
+    if location and scheme in BACKENDS:
+        return BACKENDS[scheme](location)
+    if len(scheme) > 1 and location and not os.path.isabs(spec):
+        raise ValueError(f"Unknown job queue backend '{scheme}' (known: {', '.join(sorted(BACKENDS))})")
+    return SQLiteJobQueue(spec)
+
+
+class JobPromptQueue(PromptQueue):
+    """Prompt queue that also enqueues each chunk as a job for the BLITZ workers.
+
+    Args:
+        job_queue (JobQueue): The shared queue.
+        run_id (str): Run the chunks belong to.
+        spill_dir (str): Directory the chunks are also written to (debug/spill mode), or None.
+    """
+
+    def __init__(self, job_queue, run_id, spill_dir=None):
+        super().__init__(spill_dir)
+        self.job_queue = job_queue
+        self.run_id = run_id
+
+    def put(self, chunk):
+        self.job_queue.enqueue(self.run_id, chunk.name, chunk.to_dict())
+        super().put(chunk)
@@ -0,0 +1,355 @@
+import re
+
+# Runs of ordinary string characters (everything except quotes, backslashes and control characters)
+_PLAIN_STRING_CHARS = re.compile(r'[^"\\\x00-\x1f]+')
+_WHITESPACE = re.compile(r'\s*')
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_HEX4 = re.compile(r'[0-9a-fA-F]{4}')
+# A complete string followed by a colon, i.e. the next object key
+_NEXT_KEY = re.compile(r'"(?:[^"\\]|\\.)*"\s*:')
+# The next key written with the colon inside the quotes ('"Ans#1: "value"' or '"Ans#1:" "value"')
+_NEXT_KEY_WITH_COLON = re.compile(r'"[^"\\\n]{1,40}:\s*"')
+# A complete number or true/false/null literal ending at a comma, a closing bracket or the end of the text
+_SCALAR_MEMBER = re.compile(r'(?:-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null|True|False|None)\s*(?:[,}\]]|$)')
+# A string running to the end of the text (a member cut off by truncation)
+_UNTERMINATED_STRING = re.compile(r'"(?:[^"\\]|\\.)*\\?$')
+# Keys ending with a colon, e.g. the model copying '"Ans#1: "' from the prompt's example
+_KEY_WITH_COLON = re.compile(r'^(.*?)\s*:\s*$', re.DOTALL)
+
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_LITERALS = {'true': True, 'false': False, 'null': None, 'True': True, 'False': False, 'None': None}
+
+
+class JSONRepairError(ValueError):
+    """Raised when no JSON value at all can be recovered from the text."""
+
+
+class TolerantJSONParser:
+    """Single-pass, error-tolerant JSON reader for LLM responses.
+
+    The text is read once, left to right, building the Python values directly. The
+    following defects are repaired as they are encountered instead of re-parsing the
+    whole text after each fix:
+        - stray backslashes (e.g. '\\s', '\\_') are kept as literal backslashes
+        - unescaped quotes inside strings (a quote only closes a value when it is
+          followed by '}', ']', the end of the text, the next key, or a comma and
+          the next member: a key in an object; a string, container, number or
+          true/false/null in an array)
+        - raw newlines/tabs inside strings
+        - trailing and duplicated commas
+        - missing commas, including '}{' joins between objects
+        - keys written as "Ans#1: " (colon inside the quotes)
+        - truncated tails: open containers are closed and an unterminated trailing
+          member is dropped, so every object that was completed is kept
+        - markdown fences or prose before/after the JSON
+
+    Attributes:
+        repairs (list): Short descriptions of the fixes that were applied.
+        truncated (bool): True if the text ended before the JSON was complete.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.n = len(text)
+        self.pos = 0
+        self.repairs = []
+        self.truncated = False
+        self._key_had_colon = False
+        # '{' or '[' of each container being read, innermost last
+        self._containers = []
+
+    def parse(self):
+        """Parse the text and return the recovered value.
+
+        If several top-level values follow each other (e.g. '{...}{...}') they are
+        returned as a list.
+
+        Raises:
+            JSONRepairError: If the text contains no JSON object or array.
+        """
+        values = []
+        start = self._find_container_start(0)
+        while start is not None:
+            self.pos = start
+            if values:
+                try:
+                    values.append(self._value())
+                except JSONRepairError as e:
+                    # Keep what was already recovered, ignore trailing garbage
+                    self.repairs.append(f"ignored trailing text: {e}")
+                    break
+            else:
+                values.append(self._value())
+            if self.truncated:
+                break
+            # Another object/array right after this one (only whitespace/commas in between)
+            self._skip_whitespace_and_commas()
+            if self.pos < self.n and self.text[self.pos] in '{[':
+                self.repairs.append(f"joined top-level values at {self.pos}")
+                start = self.pos
+            else:
+                start = None
+        if not values:
+            raise JSONRepairError("No JSON object or array found in text")
+        return values[0] if len(values) == 1 else values
+
+    # --- scanning helpers ---
+
+    def _find_container_start(self, pos):
+        brace = self.text.find('{', pos)
+        bracket = self.text.find('[', pos)
+        candidates = [i for i in (brace, bracket) if i != -1]
+        return min(candidates) if candidates else None
+
+    def _skip_whitespace(self):
+        self.pos = _WHITESPACE.match(self.text, self.pos).end()
+
+    def _skip_whitespace_and_commas(self):
+        while True:
+            self._skip_whitespace()
+            if self.pos < self.n and self.text[self.pos] == ',':
+                self.pos += 1
+            else:
+                return
+
+    def _peek_after_whitespace(self, pos):
+        pos = _WHITESPACE.match(self.text, pos).end()
+        return pos, (self.text[pos] if pos < self.n else '')
+
+    # --- values ---
+
+    def _value(self):
+        self._skip_whitespace()
+        if self.pos >= self.n:
+            self.truncated = True
+            return None
+        c = self.text[self.pos]
+        if c in '{[':
+            self._containers.append(c)
+            try:
+                return self._object() if c == '{' else self._array()
+            finally:
+                self._containers.pop()
+        if c == '"':
+            return self._string(is_key=False)
+        if c == '-' or c.isdigit():
+            return self._number()
+        for literal, value in _LITERALS.items():
+            if self.text.startswith(literal, self.pos):
+                self.pos += len(literal)
+                return value
+        raise JSONRepairError(f"Unexpected character {c!r} at position {self.pos}")
+
+    def _number(self):
+        match = _NUMBER.match(self.text, self.pos)
+        if match is None:
+            raise JSONRepairError(f"Invalid number at position {self.pos}")
+        self.pos = match.end()
+        token = match.group(0)
+        return float(token) if any(ch in token for ch in '.eE') else int(token)
+
+    def _object(self):
+        self.pos += 1 # '{'
+        obj = {}
+        while True:
+            self._skip_whitespace()
+            if self.pos >= self.n:
+                self.truncated = True
+                return obj
+            c = self.text[self.pos]
+            if c == ',':
+                self.repairs.append(f"dropped extra comma at {self.pos}")
+                self.pos += 1
+                continue
+            if c == '}':
+                self.pos += 1
+                return obj
+            if c == ']':
+                self.repairs.append(f"treated ']' as '}}' at {self.pos}")
+                self.pos += 1
+                return obj
+            if c != '"':
+                raise JSONRepairError(f"Expected an object key at position {self.pos}")
+
+            key = self._string(is_key=True)
+            if self.truncated:
+                return obj # Unterminated key: drop it
+            self._skip_whitespace()
+            if self.pos < self.n and self.text[self.pos] == ':':
+                self.pos += 1
+            elif self._key_had_colon:
+                self._key_had_colon = False
+            elif self.pos >= self.n:
+                self.truncated = True
+                return obj
+            else:
+                self.repairs.append(f"inserted missing ':' at {self.pos}")
+
+            self._skip_whitespace()
+            if self.pos >= self.n:
+                self.truncated = True
+                return obj
+            value_is_string = self.text[self.pos] == '"'
+            value = self._value()
+            if self.truncated:
+                # Keep partially read containers, drop a cut-off string or a missing value
+                if not value_is_string and value is not None:
+                    obj[key] = value
+                return obj
+            obj[key] = value
+
+            self._skip_whitespace()
+            if self.pos >= self.n:
+                self.truncated = True
+                return obj
+            c = self.text[self.pos]
+            if c == ',':
+                self.pos += 1
+            elif c not in '}]':
+                self.repairs.append(f"inserted missing ',' at {self.pos}")
+
+    def _array(self):
+        self.pos += 1 # '['
+        arr = []
+        while True:
+            self._skip_whitespace()
+            if self.pos >= self.n:
+                self.truncated = True
+                return arr
+            c = self.text[self.pos]
+            if c == ',':
+                self.repairs.append(f"dropped extra comma at {self.pos}")
+                self.pos += 1
+                continue
+            if c == ']':
+                self.pos += 1
+                return arr
+            if c == '}':
+                self.repairs.append(f"treated '}}' as ']' at {self.pos}")
+                self.pos += 1
+                return arr
+
+            value_is_string = c == '"'
+            value = self._value()
+            if self.truncated:
+                if not value_is_string and value is not None:
+                    arr.append(value)
+                return arr
+            arr.append(value)
+
+            self._skip_whitespace()
+            if self.pos >= self.n:
+                self.truncated = True
+                return arr
+            c = self.text[self.pos]
+            if c == ',':
+                self.pos += 1
+            elif c not in ']}':
+                # e.g. '}{' or '} {' between array elements
+                self.repairs.append(f"inserted missing ',' at {self.pos}")
+
+    def _string(self, is_key):
+        self.pos += 1 # opening quote
+        parts = []
+        has_surrogates = False
+        text = self.text
+        while True:
+            match = _PLAIN_STRING_CHARS.match(text, self.pos)
+            if match:
+                parts.append(match.group(0))
+                self.pos = match.end()
+            if self.pos >= self.n:
+                self.truncated = True
+                return ''.join(parts)
+            c = text[self.pos]
+            if c == '\\':
+                nxt = text[self.pos + 1] if self.pos + 1 < self.n else ''
+                if nxt in _SIMPLE_ESCAPES and nxt:
+                    parts.append(_SIMPLE_ESCAPES[nxt])
+                    self.pos += 2
+                elif nxt == 'u' and _HEX4.match(text, self.pos + 2):
+                    code = int(text[self.pos + 2:self.pos + 6], 16)
+                    has_surrogates = has_surrogates or 0xD800 <= code <= 0xDFFF
+                    parts.append(chr(code))
+                    self.pos += 6
+                elif not nxt:
+                    self.truncated = True
+                    return ''.join(parts)
+                else:
+                    # Stray backslash (e.g. a Windows path or '\_'): keep it literally
+                    self.repairs.append(f"kept stray backslash at {self.pos}")
+                    parts.append('\\')
+                    self.pos += 1
+            elif c == '"':
+                if self._closes_string(is_key, parts):
+                    self.pos += 1
+                    break
+                if is_key and self._key_had_colon:
+                    # '"Ans#1: "value"': the key ended at the colon, this quote opens the value
+                    break
+                self.repairs.append(f"escaped inner quote at {self.pos}")
+                parts.append('"')
+                self.pos += 1
+            else:
+                # Raw control character (newline, tab, ...) inside the string
+                parts.append(c)
+                self.pos += 1
+
+        value = ''.join(parts)
+        if has_surrogates:
+            value = value.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+        return value
+
+    def _closes_string(self, is_key, parts):
+        """Decide whether the quote at self.pos terminates the current string."""
+        after, c = self._peek_after_whitespace(self.pos + 1)
+        if not c:
+            return True
+        if is_key:
+            match = _KEY_WITH_COLON.match(''.join(parts))
+            if match and c != ':':
+                # '"Ans#1: "value"' or '"Ans#1:" "value"': the colon was written inside the key
+                self.repairs.append(f"split key with embedded colon at {self.pos}")
+                parts[:] = [match.group(1)]
+                self._key_had_colon = True
+                return c == '"'
+            return c in ':,}]"'
+        if c in '}]':
+            return True
+        if c == ',':
+            # Only close if the text after the comma is the next member; otherwise the quote
+            # and comma are part of the text (e.g. '"He said "no", then left"')
+            following_pos, following = self._peek_after_whitespace(after + 1)
+            while following == ',':
+                # Duplicated comma
+                following_pos, following = self._peek_after_whitespace(following_pos + 1)
+            if not following or following in '}]':
+                return True
+            in_object = bool(self._containers) and self._containers[-1] == '{'
+            if following == '"':
+                return (not in_object or bool(_NEXT_KEY.match(self.text, following_pos))
+                        or bool(_NEXT_KEY_WITH_COLON.match(self.text, following_pos))
+                        or bool(_UNTERMINATED_STRING.match(self.text, following_pos)))
+            if in_object:
+                return False
+            return following in '{[' or bool(_SCALAR_MEMBER.match(self.text, following_pos))
+        if c == '"':
+            # Missing comma before the next key
+            return bool(_NEXT_KEY.match(self.text, after))
+        return False
+
+
+def repair_json(text):
+    """Parse possibly malformed JSON in a single pass.
+
+    Args:
+        text (str): Text containing (possibly broken) JSON.
+
+    Returns:
+        tuple: (parsed_data, parser) where parser exposes .repairs and .truncated.
+
+    Raises:
+        JSONRepairError: If no JSON object or array can be recovered.
+    """
+    parser = TolerantJSONParser(text)
+    return parser.parse(), parser
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+from json_repair import repair_json, JSONRepairError
+
+# Default corpus: anonymized malformed model responses with their expected results (the raw and
+# failed responses api_processing_deb.py dumps to ephemeral/debug_outputs can be checked the same way)
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "json_repair_corpus")
+CORPUS_PATTERNS = ["raw_*.txt", "failed_parse_*.txt"]
+EXPECTATIONS_FILE = "expected_results.json"
+
+
+def strip_fences(text):
+    """Remove markdown code fences the same way parse_json_safely does."""
+    cleaned_text = text.strip()
+    for prefix in ("```json", "```"):
+        if cleaned_text.startswith(prefix):
+            cleaned_text = cleaned_text[len(prefix):].strip()
+            if cleaned_text.endswith("```"):
+                cleaned_text = cleaned_text[:-3].strip()
+            break
+    return cleaned_text
+
+
+def summarize(parsed):
+    """Collect the SFR names and counts of answers/gaps from a parsed response."""
+    items = parsed if isinstance(parsed, list) else [parsed]
+    sfrs, answers, gaps = [], 0, 0
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        for obj in item.get("DOC") or []:
+            if isinstance(obj, dict):
+                sfrs.append(obj.get("SFR"))
+                answers += sum(1 for key in obj if str(key).startswith("Ans#"))
+        gaps += len(item.get("Excel") or [])
+    return {"sfrs": sorted(str(sfr) for sfr in sfrs), "answers": answers, "gaps": gaps}
+
+
+def run_file(path, repeat):
+    """Parse one corpus file with json.loads and with the tolerant parser.
+
+    Returns:
+        dict: Result record with timings, success flags and a summary of recovered data.
+    """
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        text = strip_fences(f.read())
+
+    strict_ok = True
+    try:
+        json.loads(text)
+    except json.JSONDecodeError:
+        strict_ok = False
+
+    best = None
+    parsed, parser, error = None, None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            parsed, parser = repair_json(text)
+        except JSONRepairError as e:
+            error = str(e)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    record = {
+        "file": os.path.basename(path),
+        "chars": len(text),
+        "strict_ok": strict_ok,
+        "repaired_ok": error is None,
+        "seconds": best,
+    }
+    if error is None:
+        record.update(summarize(parsed))
+        record["repairs"] = len(parser.repairs)
+        record["truncated"] = parser.truncated
+        record["parsed"] = parsed
+    else:
+        record["error"] = error
+    return record
+
+
+def check_regressions(records, expected):
+    """Compare results with recorded expectations and return a list of regression messages.
+
+    A file without a recorded expectation, or whose recovered value differs from it, counts
+    as a regression (re-record with --record after checking the new results).
+    """
+    regressions = []
+    for record in records:
+        exp = expected.get(record["file"])
+        if exp is None:
+            regressions.append(f"{record['file']}: no expected result recorded")
+            continue
+        if exp["repaired_ok"] and not record["repaired_ok"]:
+            regressions.append(f"{record['file']}: no longer parses ({record.get('error')})")
+            continue
+        if not record["repaired_ok"]:
+            continue
+        if not exp["repaired_ok"]:
+            regressions.append(f"{record['file']}: now parses although a JSONRepairError was expected")
+            continue
+        if record["truncated"] and not exp.get("truncated", False):
+            regressions.append(f"{record['file']}: now reported as truncated")
+        if "parsed" in exp and record["parsed"] != exp["parsed"]:
+            regressions.append(f"{record['file']}: recovered value differs from the expected one")
+        missing_sfrs = sorted(set(exp.get("sfrs", [])) - set(record["sfrs"]))
+        if missing_sfrs:
+            regressions.append(f"{record['file']}: SFRs no longer recovered: {', '.join(missing_sfrs)}")
+        if record["answers"] < exp.get("answers", 0):
+            regressions.append(f"{record['file']}: answers dropped from {exp['answers']} to {record['answers']}")
+        if record["gaps"] < exp.get("gaps", 0):
+            regressions.append(f"{record['file']}: gaps dropped from {exp['gaps']} to {record['gaps']}")
+    return regressions
+
+
+def main():
+    """
+    Benchmark and regression check for the tolerant JSON parser over a corpus of model
+    responses (by default tests/json_repair_corpus; the files api_processing_deb.py writes
+    to ephemeral/debug_outputs can be checked the same way).
+
+    --record stores the current results as the expected baseline in the corpus directory;
+    without it the results are checked against that baseline and the exit code is 1 if
+    any response is recovered differently than recorded (or has no recorded result).
+    """
+    arg_parser = argparse.ArgumentParser(description="Benchmark/regression suite for json_repair")
+    arg_parser.add_argument("corpus_dir", nargs="?", default=DEFAULT_CORPUS_DIR, help="Directory with raw model responses")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions per file (best is reported)")
+    arg_parser.add_argument("--record", action="store_true", help=f"Write {EXPECTATIONS_FILE} from the current results")
+    args = arg_parser.parse_args()
+
+    files = sorted({path for pattern in CORPUS_PATTERNS for path in glob.glob(os.path.join(args.corpus_dir, pattern))})
+    if not files:
+        print(f"Error: No corpus files ({', '.join(CORPUS_PATTERNS)}) found in {args.corpus_dir}")
+        return 1
+
+    records = [run_file(path, args.repeat) for path in files]
+
+    print(f"{'file':<50} {'chars':>8} {'strict':>6} {'repair':>6} {'fixes':>5} {'SFRs':>5} {'ms':>8}")
+    for record in records:
+        print(f"{record['file'][:50]:<50} {record['chars']:>8} {str(record['strict_ok']):>6} "
+              f"{str(record['repaired_ok']):>6} {record.get('repairs', '-'):>5} "
+              f"{len(record.get('sfrs', [])):>5} {record['seconds'] * 1000:>8.2f}")
+
+    total_chars = sum(record["chars"] for record in records)
+    total_seconds = sum(record["seconds"] for record in records)
+    print(f"\nFiles: {len(records)}")
+    print(f"Valid JSON as returned: {sum(record['strict_ok'] for record in records)}")
+    print(f"Recovered by tolerant parser: {sum(record['repaired_ok'] for record in records)}")
+    print(f"Truncated responses: {sum(bool(record.get('truncated')) for record in records)}")
+    if total_seconds:
+        print(f"Throughput: {total_chars / total_seconds / 1e6:.2f} M chars/s")
+
+    expectations_path = os.path.join(args.corpus_dir, EXPECTATIONS_FILE)
+    if args.record:
+        expected = {record["file"]: {key: record[key] for key in ("repaired_ok", "truncated", "sfrs", "answers", "gaps", "parsed")
+                                     if key in record}
+                    for record in records}
+        with open(expectations_path, 'w', encoding='utf-8') as f:
+            json.dump(expected, f, indent=4)
+        print(f"Recorded expectations for {len(expected)} file(s) to {expectations_path}")
+        return 0
+
+    if not os.path.exists(expectations_path):
+        print(f"Error: No {EXPECTATIONS_FILE} in the corpus; run with --record to create the regression baseline.")
+        return 1
+    with open(expectations_path, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    regressions = check_regressions(records, expected)
+    if regressions:
+        print(f"\n--- Regressions ({len(regressions)}) ---")
+        for message in regressions:
+            print(f"  - {message}")
+        return 1
+    print("\nNo regressions against recorded expectations.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
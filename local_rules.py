@@ -0,0 +1,76 @@
+import re
+from chunk_recovery import split_sd_entries, join_sd_entries, entry_body
+
+# File (in the ephemeral directory) holding the answers produced without the model;
+# api_processing merges it into ai_responses.json
+LOCAL_ANSWERS_FILE = "local_answers.json"
+
+# Fixed answer that sys_inst/base_TSS.txt prescribes for DISTRIBUTED-only requirements of a STANDALONE TOE
+NOT_DISTRIBUTED_ANSWER = "The TOE is not a distributed TOE; hence this assurance activity is not applicable."
+UNSATISFIED_PHRASE = "This requirement is not being satisfied."
+
+# "(for DISTRIBUTED TOE)" in the heading of an SD entry (tolerates "TOEs" and the base_TSS.txt spelling)
+_DISTRIBUTED_ONLY = re.compile(r"\(\s*for\s+DISTRIBU[A-Z]*\s+TOEs?\s*\)", re.IGNORECASE)
+
+
+def _entry_heading(text):
+    """First part of an entry ("TSS-requirement#2 for FAU_GEN.1 (for DISTRIBUTED TOE)")."""
+    return text.split(":", 1)[0]
+
+
+def apply_local_rules(sfr, tss_text, sd_desc, toe_type):
+    """
+    Answer the requirements of one SFR that do not need the model.
+
+    Rules (applied per requirement number, in this order):
+        - STANDALONE TOE and a "(for DISTRIBUTED TOE)" requirement: the fixed
+          not-applicable sentence from base_TSS.txt (not a gap).
+        - Empty TSS text: the requirement is not satisfied, and a gap row is recorded.
+        - An Ans statement without a TSS-requirement or any <placeholder>: the
+          statement itself (e.g. "... already covered by ... FAU_GEN.1").
+
+    Args:
+        sfr (str): SFR name.
+        tss_text (str): TSS text of the SFR from the ST.
+        sd_desc (str): SD description with the TSS-requirement#N/Ans#N entries.
+        toe_type (str): "STANDALONE" or "DISTRIBUTED" (None disables the TOE type rule).
+
+    Returns:
+        tuple: (remaining_sd_desc, answers, gaps). remaining_sd_desc keeps the entries that
+               still need the model and is None if none are left; answers maps "Ans#N" to
+               the local answer; gaps is a list of Excel rows.
+    """
+    preamble, entries = split_sd_entries(sd_desc)
+    if not entries:
+        return sd_desc, {}, []
+
+    # Group the entries by requirement number
+    groups = {}
+    for kind, number, text in entries:
+        groups.setdefault(number, {}).setdefault(kind, text)
+
+    standalone = (toe_type or "").strip().upper() == "STANDALONE"
+    tss_empty = not (tss_text or "").strip()
+    answers = {}
+    gaps = []
+    for number, group in groups.items():
+        requirement = group.get("TSS-requirement")
+        answer = group.get("Ans")
+        headings = " ".join(_entry_heading(text) for text in group.values())
+        if standalone and _DISTRIBUTED_ONLY.search(headings):
+            answers[f"Ans#{number}"] = NOT_DISTRIBUTED_ANSWER
+        elif tss_empty and requirement:
+            answers[f"Ans#{number}"] = (f"{UNSATISFIED_PHRASE} {sfr}: The TSS does not provide any text for {sfr}; "
+                                        f"it must describe the following: {entry_body(requirement)}")
+            gaps.append({
+                "SFR": sfr,
+                "TSS-requirement": entry_body(requirement),
+                "Missing information": f"No TSS text is provided for {sfr}.",
+            })
+        elif answer and not requirement and "<" not in answer:
+            answers[f"Ans#{number}"] = entry_body(answer)
+
+    answered_numbers = {key.split("#", 1)[1] for key in answers}
+    remaining = [entry for entry in entries if entry[1] not in answered_numbers]
+    remaining_sd_desc = join_sd_entries(preamble, remaining) if remaining else None
+    return remaining_sd_desc, answers, gaps
@@ -0,0 +1,198 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrency import failure_status
+
+# Outcomes per model kept for the health statistics
+HEALTH_WINDOW = 50
+# Outcomes a model needs before it is compared by its statistics
+MIN_SAMPLES = 3
+# Consecutive failures (upstream errors or unparsable responses) that open a model's circuit
+FAILURE_THRESHOLD = 3
+# Seconds an open circuit stays open; doubled on every trip in a row, up to MAX_COOLDOWN
+COOLDOWN = 60.0
+MAX_COOLDOWN = 600.0
+# Score penalty per position in the model list (later models are preferred less)
+ORDER_PENALTY = 0.25
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+def is_upstream_failure(exc):
+    """True for failures of the provider (429, 5xx, connection errors) rather than of the request."""
+    status = failure_status(exc)
+    return status == 429 or status >= 500 or status == 0
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else None
+
+
+class ModelHealth:
+    """Recent latency, error rate and JSON-parse rate of one model, with its circuit breaker."""
+
+    def __init__(self, window=HEALTH_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.errors = deque(maxlen=window)   # True for a failed request
+        self.parsed = deque(maxlen=window)   # True for a response that parsed as JSON
+        self.requests = 0
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.cooldown = COOLDOWN
+        self.open_until = 0.0
+        self.probe_in_flight = False
+
+    def error_rate(self):
+        return sum(self.errors) / len(self.errors) if self.errors else 0.0
+
+    def parse_rate(self):
+        return sum(self.parsed) / len(self.parsed) if self.parsed else 1.0
+
+    def score(self):
+        """Expected seconds per usable response (lower is healthier)."""
+        usable = (1.0 - self.error_rate()) * self.parse_rate()
+        return (_percentile(self.latencies, 0.5) or 0.0) / max(usable, 0.05)
+
+    def allows_request(self, now):
+        """True if the breaker lets a request through (a single probe when half-open)."""
+        if self.state == OPEN and now >= self.open_until:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == HALF_OPEN:
+            return not self.probe_in_flight
+        return self.state == CLOSED
+
+    def record(self, now, latency, failed, parsed):
+        self.requests += 1
+        self.errors.append(failed)
+        if not failed:
+            self.latencies.append(latency)
+            self.parsed.append(parsed)
+        if failed or not parsed:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= FAILURE_THRESHOLD:
+                if self.state == HALF_OPEN:
+                    self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN)
+                self.state = OPEN
+                self.open_until = now + self.cooldown
+                self.trips += 1
+                self.consecutive_failures = 0
+        else:
+            self.consecutive_failures = 0
+            if self.state == HALF_OPEN:
+                self.cooldown = COOLDOWN
+            self.state = CLOSED
+        self.probe_in_flight = False
+
+    def start_run(self):
+        """Reset the run counters; the recent statistics and the circuit state are kept."""
+        self.requests = 0
+        self.trips = 0
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "p50_latency_seconds": round(_percentile(self.latencies, 0.5) or 0.0, 2),
+            "p95_latency_seconds": round(_percentile(self.latencies, 0.95) or 0.0, 2),
+            "error_rate": round(self.error_rate(), 3),
+            "json_parse_rate": round(self.parse_rate(), 3),
+            "circuit": self.state,
+            "circuit_trips": self.trips,
+        }
+
+
+class ModelRouter:
+    """Send each request to the healthiest of an ordered list of models.
+
+    A model that has not answered enough requests yet is used if no earlier model is
+    measured, so the list order is the preference while the statistics are gathered. Models
+    whose circuit is open are skipped until their cooldown has passed; then one probe request
+    decides whether the circuit closes again.
+
+    Args:
+        models (list): Model names in order of preference.
+    """
+
+    def __init__(self, models):
+        self.models = list(dict.fromkeys(models))
+        self.health = {model: ModelHealth() for model in self.models}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_models):
+        """Router over MODEL_ROUTES (comma-separated model names) or the given defaults."""
+        models = [model.strip() for model in os.getenv("MODEL_ROUTES", "").split(",") if model.strip()]
+        return cls(models or default_models)
+
+    def choose(self, exclude=()):
+        """
+        Pick the model for the next request.
+
+        Args:
+            exclude (iterable): Models not to use (e.g. ones that already failed this request).
+
+        Returns:
+            str: Model name.
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = [model for model in self.models if model not in exclude]
+            if not candidates:
+                candidates = list(self.models)
+            open_models = []
+            best, best_score = None, None
+            for index, model in enumerate(candidates):
+                health = self.health[model]
+                if not health.allows_request(now):
+                    open_models.append(model)
+                    continue
+                if len(health.errors) < MIN_SAMPLES:
+                    if best is None:
+                        best = model
+                        break
+                    continue
+                score = health.score() * (1 + ORDER_PENALTY * index)
+                if best_score is None or score < best_score:
+                    best, best_score = model, score
+            if best is None:
+                # Every circuit is open: use the one that reopens first rather than stalling
+                best = min(open_models, key=lambda model: self.health[model].open_until)
+            if self.health[best].state == HALF_OPEN:
+                self.health[best].probe_in_flight = True
+            return best
+
+    def record(self, model, latency, failed=False, parsed=True):
+        """
+        Record the outcome of a request.
+
+        Args:
+            model (str): Model the request went to.
+            latency (float): Seconds the request took.
+            failed (bool): The provider failed the request (see is_upstream_failure).
+            parsed (bool): The response parsed as JSON.
+        """
+        with self._lock:
+            health = self.health.get(model)
+            if health is None:
+                # A model outside the list (e.g. a pinned hedge model) is tracked as well
+                health = self.health[model] = ModelHealth()
+            previous = health.state
+            health.record(time.monotonic(), latency, failed, parsed)
+            if health.state != previous:
+                print(f"Model {model}: circuit {health.state}")
+
+    def start_run(self):
+        """Reset the run counters of every model (the health used for routing carries over)."""
+        with self._lock:
+            for health in self.health.values():
+                health.start_run()
+
+    def summary(self):
+        """Health statistics of every model."""
+        with self._lock:
+            return {model: health.summary() for model, health in self.health.items()}
@@ -0,0 +1,65 @@
+import re
+from chunk_recovery import split_chunk_sections
+
+# Estimated output tokens of a response (see estimate_max_tokens)
+BASE_TOKENS = 200              # {"DOC": [...], "Excel": [...]} structure
+TOKENS_PER_SFR = 40            # DOC object of an SFR
+TOKENS_PER_ANSWER = 250        # Ans statement with its quoted TSS text, or a gap and its Excel row
+COMPACT_TOKENS_PER_ANSWER = 130
+# Models that reason before answering spend part of max_tokens on that
+REASONING_TOKENS = 1500
+SAFETY_MARGIN = 1.5
+
+MIN_OUTPUT_TOKENS = 1000
+# Cap when the prompt cannot be sized (the former fixed max_tokens)
+DEFAULT_OUTPUT_TOKENS = 8000
+# Largest cap a truncated response is retried with
+MAX_OUTPUT_TOKENS = 16000
+
+_ANSWER_ENTRY = re.compile(r"^\s*Ans#\d+\b", re.MULTILINE)
+
+
+def estimate_output_tokens(content, compact=False):
+    """
+    Expected output tokens of a prompt, from the number of SFRs and Ans# entries it asks for.
+
+    Args:
+        content (str): User prompt (a chunk file, or a part of one).
+        compact (bool): The compact response protocol is used.
+
+    Returns:
+        int: Expected tokens of the answer (without reasoning), or None if the prompt has no
+             requirement sections.
+    """
+    sections = split_chunk_sections(content)
+    if not sections:
+        return None
+    answers = sum(max(1, len(_ANSWER_ENTRY.findall(section_text))) for _, section_text in sections)
+    per_answer = COMPACT_TOKENS_PER_ANSWER if compact else TOKENS_PER_ANSWER
+    return BASE_TOKENS + TOKENS_PER_SFR * len(sections) + per_answer * answers
+
+
+def estimate_max_tokens(content, compact=False):
+    """
+    max_tokens for a prompt: its expected output (see estimate_output_tokens) plus the
+    reasoning allowance and the safety margin.
+
+    Args:
+        content (str): User prompt (a chunk file, or a part of one).
+        compact (bool): The compact response protocol is used.
+
+    Returns:
+        int: Token cap, or DEFAULT_OUTPUT_TOKENS if the prompt has no requirement sections.
+    """
+    expected = estimate_output_tokens(content, compact)
+    if expected is None:
+        return DEFAULT_OUTPUT_TOKENS
+    budget = int((expected + REASONING_TOKENS) * SAFETY_MARGIN)
+    return min(max(budget, MIN_OUTPUT_TOKENS), MAX_OUTPUT_TOKENS)
+
+
+def next_max_tokens(max_tokens):
+    """Larger cap for a response cut off at max_tokens (None if the cap is already the largest)."""
+    if max_tokens >= MAX_OUTPUT_TOKENS:
+        return None
+    return min(max_tokens * 2, MAX_OUTPUT_TOKENS)
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from concurrency import RUN_METRICS_FILE
+from prompt_queue import PromptQueue, spill_enabled
+from job_queue import JobPromptQueue, job_queue_spec, open_job_queue
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+
+class PipelineError(Exception):
+    """A pipeline stage failed; the message is shown to the user."""
+
+
+def pipeline_enabled():
+    """True unless PIPELINE=0 in the .env file (then the API script and AARF run as subprocesses)."""
+    return os.getenv("PIPELINE", "").strip().lower() not in ("0", "false", "no")
+
+
+# .env settings that switch on AARF options for the runs started from the GUI
+REPORT_FLAG_SETTINGS = {"STREAM_REPORT": "--stream", "GAPS_CSV": "--gaps-csv", "GAPS_JSONL": "--gaps-jsonl"}
+
+
+def report_flags_from_env():
+    """AARF options switched on in the .env file (e.g. STREAM_REPORT=1 for --stream, GAPS_CSV=1 for --gaps-csv)."""
+    return [flag for setting, flag in REPORT_FLAG_SETTINGS.items()
+            if os.getenv(setting, "").strip().lower() in ("1", "true", "yes")]
+
+
+def load_api_module():
+    """
+    Import api_processing_deb with the TOKEN currently in the .env file.
+
+    The module reads TOKEN once, at import; a key set in the GUI afterwards is handed to its client.
+    """
+    load_dotenv(ENV_PATH, override=True)
+    import api_processing_deb as api
+    token = os.getenv("TOKEN")
+    if token and token != api.token:
+        api.token = api.client.api_key = token
+    return api
+
+
+def _save_stage_times(output_dir, stage_times, wall_seconds):
+    """Print the stage times and add them to the run metrics written by the API stage."""
+    busy = sum(end - start for start, end in stage_times.values())
+    print("\n--- Pipeline Stage Times ---")
+    for stage, (start, end) in stage_times.items():
+        print(f"  {stage}: {end - start:.1f}s (from {start:.1f}s to {end:.1f}s)")
+    print(f"  Wall time {wall_seconds:.1f}s for {busy:.1f}s of stage time")
+
+    run_metrics_path = os.path.join(output_dir, RUN_METRICS_FILE)
+    try:
+        with open(run_metrics_path, 'r', encoding='utf-8') as f:
+            run_metrics = json.load(f)
+        run_metrics["pipeline"] = {
+            "stages": {stage: {"start_seconds": round(start, 2), "end_seconds": round(end, 2)}
+                       for stage, (start, end) in stage_times.items()},
+            "wall_seconds": round(wall_seconds, 2),
+        }
+        with open(run_metrics_path, 'w', encoding='utf-8') as f:
+            json.dump(run_metrics, f, indent=4)
+    except Exception as e:
+        print(f"Warning: Could not add the stage times to {run_metrics_path}: {str(e)}")
+
+
+def run_pipeline(processor, st_path, sd_paths, toe_type, selected_sds, run, system_message, report_flags=()):
+    """
+    Run extraction, the API stage and report assembly in one process with overlapping stages.
+
+    Each chunk goes to the model as soon as process_files has put it on the prompt queue, the
+    template placeholders the answers are checked against are read while the requests are in
+    flight, and AAR-TSS.docx and the Gaps workbook are built from the answers in memory. The
+    prompts are written to the run's working directory only with SPILL_PROMPTS=1;
+    ai_responses.json and run_metrics.json are still written there, for inspection and for
+    running AARF.py on its own.
+
+    With JOB_QUEUE set, each chunk is enqueued as a job for the BLITZ workers (blitz_worker.py)
+    and the API stage collects the workers' results, working on the run's queued jobs itself
+    while it waits.
+
+    Args:
+        processor (RequirementsProcessor): Extracts the ST/SD data and assembles the chunks.
+        st_path (str): Path of the ST document.
+        sd_paths (list): Paths of the selected SD documents.
+        toe_type (str): TOE type selected in the GUI.
+        selected_sds (list): SD names whose templates the answers are checked against and assembled.
+        run (RunContext): Working and output directories of the run.
+        system_message (str): System message for the TOE type.
+        report_flags (iterable): AARF options (e.g. --stream, --gaps-csv).
+
+    Returns:
+        tuple: (success, message)
+    """
+    try:
+        api = load_api_module()
+    except ValueError as e:
+        return False, str(e)
+    import AARF
+    api.use_run(run, system_message)
+
+    started = time.monotonic()
+    stage_times = {}
+    spill_dir = run.work_dir if spill_enabled() else None
+    process_chunk = None
+    job_queue = None
+    spec = job_queue_spec()
+    if spec:
+        try:
+            job_queue = open_job_queue(spec)
+            job_queue.register_run(run.run_id, {"system_message": system_message,
+                                                "compact_responses": api.compact_responses})
+        except Exception as e:
+            return False, f"Could not open the job queue {spec}: {str(e)}"
+        from blitz_worker import job_results
+        prompts = JobPromptQueue(job_queue, run.run_id, spill_dir)
+        process_chunk = job_results(api, job_queue, run.run_id)
+        print(f"Distributing the chunks through the job queue {spec}")
+    else:
+        prompts = PromptQueue(spill_dir)
+
+    def extract():
+        stage_start = time.monotonic() - started
+        outcome = (False, "Extraction did not finish")
+        try:
+            outcome = processor.process_files(st_path, sd_paths, toe_type, prompt_queue=prompts)
+        except Exception as e:
+            outcome = (False, f"Extraction failed: {str(e)}")
+        finally:
+            stage_times["extraction"] = (stage_start, time.monotonic() - started)
+            prompts.close(*outcome)
+
+    aggregated_responses = {"DOC": [], "Excel": []}
+    tss_texts = {}
+    first_chunk = []
+
+    def arriving_chunks():
+        for chunk in prompts:
+            if not first_chunk:
+                first_chunk.append(time.monotonic() - started)
+            yield chunk
+        if not prompts.success:
+            raise PipelineError(prompts.message)
+        print(f"\n--- Extraction Finished ---\n{prompts.message}")
+        # The local answers and full TSS texts are known once extraction has finished (before any
+        # response is aggregated or any quote is checked)
+        aggregated_responses["DOC"].extend(processor.local_answers["DOC"])
+        aggregated_responses["Excel"].extend(processor.local_answers["Excel"])
+        tss_texts.update(processor.st_data)
+
+    answered = []
+    answered_lock = threading.Lock()
+
+    def on_result(chunk_name, items, error):
+        with answered_lock:
+            answered.append(chunk_name)
+            count = len(answered)
+        print(f"Response {count} received: {chunk_name}{' (' + error + ')' if error else ''}")
+
+    print("\n--- Running Extraction, API Processing and Report Assembly (pipelined) ---")
+    extractor = threading.Thread(target=extract, daemon=True)
+    extractor.start()
+    with ThreadPoolExecutor(max_workers=1) as background:
+        # Read the template placeholders while the chunks are extracted and answered
+        def read_templates():
+            stage_start = time.monotonic() - started
+            try:
+                return AARF.template_answer_keys(selected_sds)
+            finally:
+                stage_times["templates"] = (stage_start, time.monotonic() - started)
+        expected_keys = background.submit(read_templates)
+
+        try:
+            error_files, files_with_issues, schedule = api.run_api_stage(
+                arriving_chunks(), aggregated_responses, on_result=on_result, expected_keys=expected_keys,
+                tss_texts=tss_texts, process_chunk=process_chunk)
+        except PipelineError as e:
+            return False, str(e)
+        finally:
+            extractor.join()
+            if job_queue:
+                job_queue.purge_run(run.run_id)
+        api.save_results(aggregated_responses, error_files, files_with_issues, schedule)
+        # The API stage starts with the first chunk (before that it only waits for extraction)
+        stage_times["api"] = (first_chunk[0] if first_chunk else stage_times["extraction"][1], time.monotonic() - started)
+
+    print("\n--- Assembling AAR-TSS Report ---")
+    report_start = time.monotonic() - started
+    # The pipeline runs in the GUI's or the daemon's process, which must not fork worker processes
+    assembled = AARF.assemble_report(aggregated_responses["DOC"], aggregated_responses["Excel"], selected_sds,
+                                     report_flags, run.output_dir, parallel=False)
+    stage_times["report"] = (report_start, time.monotonic() - started)
+    _save_stage_times(run.work_dir, stage_times, time.monotonic() - started)
+    if not assembled:
+        return False, "No template documents were successfully loaded."
+    return True, "Pipeline completed successfully"
@@ -0,0 +1,147 @@
+import os
+import queue
+from chunk_recovery import (SECTION_SEPARATOR, PART_DIVIDER, shared_tss_block, shared_tss_reference,
+                            split_chunk_sections)
+
+# Chunk files of the spill (debug) mode and of the script-by-script runs
+CHUNK_FILE_PATTERN = "user_prompt_TSS-*.txt"
+
+# Put on the queue by PromptQueue.close()
+_END_OF_CHUNKS = object()
+
+
+def spill_enabled():
+    """True if SPILL_PROMPTS=1 in the .env file (the prompts are also written to disk)."""
+    return os.getenv("SPILL_PROMPTS", "").strip().lower() in ("1", "true", "yes")
+
+
+class SfrRecord:
+    """One requirement of a prompt.
+
+    Args:
+        sfr (str): SFR name.
+        statement (str): SFR statement from the ST.
+        tss (str): TSS text of the SFR (possibly trimmed).
+        sd_text (str): SD description with its TSS-requirement/Ans entries.
+    """
+
+    def __init__(self, sfr, statement, tss, sd_text):
+        self.sfr = sfr
+        self.statement = statement
+        self.tss = tss
+        self.sd_text = sd_text
+
+    def section_text(self, tss_text=None):
+        """Prompt section of the requirement (tss_text replaces the TSS text, e.g. by a shared-text reference)."""
+        tss = self.tss if tss_text is None else tss_text
+        return (f"SFR statement for {self.sfr}:\n{self.statement}\n\n{PART_DIVIDER}\n\n"
+                f"TSS text for {self.sfr}:\n{tss}\n\n{PART_DIVIDER}\n\n"
+                f"{self.sd_text}\n\n{SECTION_SEPARATOR}\n\n")
+
+    @classmethod
+    def from_section(cls, sfr, section_text):
+        """Record of a section from split_chunk_sections (e.g. of a chunk file)."""
+        body = section_text.strip()
+        if body.endswith(SECTION_SEPARATOR):
+            body = body[:-len(SECTION_SEPARATOR)]
+        parts = body.split(f"\n{PART_DIVIDER}\n", 2)
+        parts += [""] * (3 - len(parts))
+        statement = parts[0].strip().split("\n", 1)
+        tss = parts[1].strip().split("\n", 1)
+        return cls(sfr,
+                   statement[1].strip() if len(statement) > 1 else "",
+                   tss[1].strip() if len(tss) > 1 else "",
+                   parts[2].strip())
+
+
+class PromptChunk:
+    """Requirements sent to the model in one request.
+
+    Args:
+        name (str): Chunk name (also the file name when the chunk is written to disk).
+        records (list): SfrRecord objects of the chunk.
+    """
+
+    def __init__(self, name, records):
+        self.name = name
+        self.records = list(records)
+        self._prompt = None
+
+    @classmethod
+    def from_prompt(cls, name, content):
+        """Chunk of a user prompt in the chunk file format."""
+        return cls(name, [SfrRecord.from_section(sfr, section_text) for sfr, section_text in split_chunk_sections(content)])
+
+    @classmethod
+    def from_dict(cls, data):
+        """Chunk of a to_dict() result (e.g. a job payload)."""
+        return cls(data["name"], [SfrRecord(r["sfr"], r["statement"], r["tss"], r["sd_text"]) for r in data["records"]])
+
+    def to_dict(self):
+        """JSON-serialisable form of the chunk (for the job queue)."""
+        return {"name": self.name,
+                "records": [{"sfr": r.sfr, "statement": r.statement, "tss": r.tss, "sd_text": r.sd_text} for r in self.records]}
+
+    def prompt(self):
+        """User prompt of the chunk; a TSS text shared by several SFRs is written once, up front."""
+        if self._prompt is None:
+            shared_tags = {}
+            blocks = []
+            for record in self.records:
+                sharing = [other.sfr for other in self.records if record.tss.strip() and other.tss == record.tss]
+                if len(sharing) > 1 and record.tss not in shared_tags:
+                    shared_tags[record.tss] = f"T{len(shared_tags) + 1}"
+                    blocks.append(shared_tss_block(shared_tags[record.tss], sharing, record.tss))
+            for record in self.records:
+                tag = shared_tags.get(record.tss)
+                blocks.append(record.section_text(shared_tss_reference(tag) if tag else None))
+            self._prompt = "".join(blocks)
+        return self._prompt
+
+    def sections(self):
+        """(sfr_name, section_text) tuples with the TSS text written out, as split_chunk_sections returns them."""
+        return [(record.sfr, record.section_text()) for record in self.records]
+
+    def write(self, directory):
+        """Write the prompt to directory/<name>; returns the path."""
+        path = os.path.join(directory, self.name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.prompt())
+        return path
+
+
+class PromptQueue:
+    """Chunks handed from the extraction stage to the API stage in memory.
+
+    Iterating the queue yields the chunks as they are put, until close() is called.
+
+    Args:
+        spill_dir (str): Directory the chunks are also written to (debug/spill mode), or None.
+    """
+
+    def __init__(self, spill_dir=None):
+        self.spill_dir = spill_dir
+        self.success = None
+        self.message = ""
+        self._queue = queue.Queue()
+
+    def put(self, chunk):
+        if self.spill_dir:
+            try:
+                chunk.write(self.spill_dir)
+            except Exception as e:
+                print(f"Warning: Could not spill {chunk.name} to {self.spill_dir}: {str(e)}")
+        self._queue.put(chunk)
+
+    def close(self, success=True, message=""):
+        """Mark the end of the chunks with the outcome of the extraction stage."""
+        self.success = success
+        self.message = message
+        self._queue.put(_END_OF_CHUNKS)
+
+    def __iter__(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is _END_OF_CHUNKS:
+                return
+            yield chunk
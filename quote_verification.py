@@ -0,0 +1,184 @@
+import re
+import json
+from chunk_recovery import normalize_sfr, section_tss_text
+from compact_protocol import SATISFIED_PREFIX
+
+# File (in the ephemeral directory) holding the full TSS text of every SFR, written by Blitz.py
+TSS_TEXTS_FILE = "tss_texts.json"
+
+# Word n-grams used to measure how much of a quote that is not found verbatim occurs in the TSS text
+NGRAM_SIZE = 4
+# A quote with at least this share of its n-grams in the TSS text counts as reworded rather than not found
+REWORDED_MIN_COVERAGE = 0.5
+
+# Appended to the prompt when an answer with an unverified quote is re-asked
+QUOTE_REASK_NOTE = ("## A previous answer quoted text that does not appear in the TSS text above. "
+                    "Quote only text copied exactly from the TSS text.")
+
+STATUS_VERIFIED = "verified"
+STATUS_REWORDED = "reworded"
+STATUS_NOT_FOUND = "not found"
+
+# Typographic characters the model (or the ST) may use in place of the plain ones
+_PLAIN_CHARS = str.maketrans({"\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+                              "\u2013": "-", "\u2014": "-", "\u00a0": " "})
+_WORD = re.compile(r"\w+(?:['.\-/]\w+)*")
+# Quotes are checked per sentence; omission marks ("...", "[...]") also separate spans
+_SPAN_BREAK = re.compile(r"\s*\[\s*(?:\.\.\.|\u2026)\s*\]\s*|\s*(?:\.\.\.|\u2026)\s*|(?<=[.!?;])\s+")
+
+
+def normalize_words(text):
+    """Lower-cased words of a text with typographic quotes/dashes made plain."""
+    return _WORD.findall(text.translate(_PLAIN_CHARS).lower())
+
+
+def _ngrams(words):
+    return {tuple(words[i:i + NGRAM_SIZE]) for i in range(len(words) - NGRAM_SIZE + 1)}
+
+
+def quoted_spans(answer):
+    """
+    Spans quoted by a satisfied Ans statement.
+
+    Args:
+        answer (str): Ans statement.
+
+    Returns:
+        list: Quoted spans (empty if the answer does not start with SATISFIED_PREFIX).
+    """
+    answer = (answer or "").strip()
+    if not answer.startswith(SATISFIED_PREFIX):
+        return []
+    spans = []
+    for span in _SPAN_BREAK.split(answer[len(SATISFIED_PREFIX):]):
+        span = span.strip().strip("\"'\u201c\u201d\u2018\u2019").strip()
+        if normalize_words(span):
+            spans.append(span)
+    return spans
+
+
+class QuoteIndex:
+    """Word index of the TSS text of each SFR, for checking quotes in linear time.
+
+    Args:
+        tss_texts (dict): SFR name -> TSS text.
+    """
+
+    def __init__(self, tss_texts):
+        self.texts = {}
+        self.ngrams = {}
+        for sfr, tss_text in tss_texts.items():
+            words = normalize_words(tss_text or "")
+            if not words:
+                continue
+            # Padded, so a span only matches whole words
+            self.texts[normalize_sfr(sfr)] = f" {' '.join(words)} "
+            self.ngrams[normalize_sfr(sfr)] = _ngrams(words)
+
+    def __contains__(self, sfr):
+        return normalize_sfr(sfr) in self.texts
+
+    def verify(self, sfr, answer):
+        """
+        Check the quote of a satisfied answer against the SFR's TSS text.
+
+        Each span must occur verbatim (ignoring case, whitespace and punctuation); spans that
+        do not are scored by the share of their word n-grams found in the TSS text.
+
+        Args:
+            sfr (str): SFR name.
+            answer (str): Ans statement.
+
+        Returns:
+            tuple: (status, coverage, unverified_spans), or None if the answer quotes nothing
+                   or the SFR has no indexed TSS text.
+        """
+        key = normalize_sfr(sfr)
+        spans = quoted_spans(answer)
+        if not spans or key not in self.texts:
+            return None
+        text = self.texts[key]
+        ngrams = self.ngrams[key]
+
+        unverified = []
+        matched = total = 0
+        for span in spans:
+            words = normalize_words(span)
+            span_ngrams = _ngrams(words) or {tuple(words)}
+            total += len(span_ngrams)
+            if f" {' '.join(words)} " in text:
+                matched += len(span_ngrams)
+                continue
+            unverified.append(span)
+            matched += len(span_ngrams & ngrams)
+
+        coverage = matched / total if total else 0.0
+        if not unverified:
+            return STATUS_VERIFIED, coverage, []
+        status = STATUS_REWORDED if coverage >= REWORDED_MIN_COVERAGE else STATUS_NOT_FOUND
+        return status, coverage, unverified
+
+
+def find_unverified_quotes(doc_objects, index):
+    """
+    Check every satisfied answer of the DOC objects against the quote index.
+
+    Args:
+        doc_objects (list): DOC objects ({"SFR": ..., "Ans#N": ...}).
+        index (QuoteIndex): Index of the run's TSS texts.
+
+    Returns:
+        dict: SFR name -> {answer key: (status, coverage, unverified_spans)} for the answers
+              whose quote is reworded or not found.
+    """
+    flagged = {}
+    for obj in doc_objects:
+        if not isinstance(obj, dict) or not obj.get("SFR"):
+            continue
+        for key, answer in obj.items():
+            if key == "SFR" or not isinstance(answer, str):
+                continue
+            result = index.verify(obj["SFR"], answer)
+            if result and result[0] != STATUS_VERIFIED:
+                flagged.setdefault(obj["SFR"], {})[key] = result
+    return flagged
+
+
+def load_tss_texts(path, sections, tss_texts=None):
+    """
+    TSS texts to index: the full texts written by Blitz.py, completed from the chunk sections.
+
+    Args:
+        path (str): Path of TSS_TEXTS_FILE.
+        sections (dict): Normalized SFR name -> section text of the chunks.
+        tss_texts (dict): Full texts already in memory (then path is not read).
+
+    Returns:
+        dict: SFR name -> TSS text.
+    """
+    if tss_texts is not None:
+        tss_texts = dict(tss_texts)
+    else:
+        tss_texts = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                tss_texts = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Warning: Could not read TSS texts from {path}: {str(e)}")
+    indexed = {normalize_sfr(sfr) for sfr in tss_texts}
+    for sfr, section_text in sections.items():
+        if sfr not in indexed:
+            tss_texts[sfr] = section_tss_text(section_text)
+    return tss_texts
+
+
+def quote_gap_row(sfr, requirement, status, unverified_spans):
+    """Excel row for an answer whose quote could not be verified."""
+    spans = " | ".join(unverified_spans)
+    if status == STATUS_REWORDED:
+        note = f"The answer quotes the TSS text with changed wording; verify the quote: {spans}"
+    else:
+        note = f"The quoted text was not found in the TSS text of {sfr}; verify the answer: {spans}"
+    return {"SFR": sfr, "TSS-requirement": requirement, "Missing information": note}
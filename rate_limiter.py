@@ -0,0 +1,210 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import closing
+
+# Shared by every BLITZ process on the machine (kept next to the other run files)
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ephemeral", "rate_limits.db")
+# Requests per minute when RATE_LIMIT_RPM is not set
+DEFAULT_REQUESTS_PER_MINUTE = 20
+# Longest single sleep while waiting for a bucket, so limit changes by other processes are picked up
+MAX_WAIT_STEP = 5.0
+
+
+class BudgetExceededError(Exception):
+    """Raised when a request would exceed the monthly token cap."""
+
+
+def _env_int(name, default=0):
+    try:
+        return int(os.getenv(name, "").strip() or default)
+    except ValueError:
+        print(f"Warning: {name} is not a number; using {default}")
+        return default
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute plus a monthly token cap.
+
+    The bucket levels and the monthly usage live in a SQLite database, so every thread of a
+    process and every concurrent BLITZ process using the same database share one budget.
+    A limit of 0 disables that limit.
+
+    Args:
+        requests_per_minute (int): Requests allowed per minute.
+        tokens_per_minute (int): (Estimated) tokens allowed per minute.
+        monthly_token_cap (int): Tokens allowed per calendar month.
+        db_path (str): SQLite database holding the shared state.
+        key (str): Name of the budget (e.g. one per API key).
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute=0, monthly_token_cap=0, db_path=DEFAULT_DB_PATH, key="openrouter"):
+        self.limits = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self.monthly_token_cap = monthly_token_cap
+        self.db_path = db_path
+        self.key = key
+        self._lock = threading.Lock()
+        # Usage of this run
+        self.run_requests = 0
+        self.run_prompt_tokens = 0
+        self.run_completion_tokens = 0
+        self.run_wait_seconds = 0.0
+        # Tokens recorded by the current thread (see thread_tokens)
+        self._thread_usage = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL, updated REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS usage (key TEXT, month TEXT, requests INTEGER, tokens INTEGER, PRIMARY KEY (key, month))")
+
+    @classmethod
+    def from_env(cls):
+        """Limiter configured by RATE_LIMIT_RPM, RATE_LIMIT_TPM, MONTHLY_TOKEN_CAP and RATE_LIMIT_DB; prints the limits in effect."""
+        limiter = cls(_env_int("RATE_LIMIT_RPM", DEFAULT_REQUESTS_PER_MINUTE), _env_int("RATE_LIMIT_TPM"), _env_int("MONTHLY_TOKEN_CAP"),
+                      os.getenv("RATE_LIMIT_DB", "").strip() or DEFAULT_DB_PATH)
+        note = "" if os.getenv("RATE_LIMIT_RPM", "").strip() else f" (RATE_LIMIT_RPM not set: {DEFAULT_REQUESTS_PER_MINUTE} requests/min by default)"
+        print(f"Rate limits: {limiter.describe()}{note}")
+        return limiter
+
+    def describe(self):
+        """The limits in effect and the database that shares them with other processes."""
+        limits = ", ".join(f"{limit} {kind}/min" for kind, limit in self.limits.items() if limit) or "no per-minute limits"
+        cap = f"{self.monthly_token_cap} tokens/month" if self.monthly_token_cap else "no monthly cap"
+        return f"{limits}, {cap}; shared through {self.db_path}"
+
+    def _connect(self):
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _month(self):
+        return time.strftime("%Y-%m")
+
+    def _bucket(self, conn, kind, now):
+        """Current level of a bucket (refilled up to one minute's allowance)."""
+        limit = self.limits[kind]
+        row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (f"{self.key}:{kind}",)).fetchone()
+        if row is None:
+            return float(limit)
+        level, updated = row
+        return min(float(limit), level + (now - updated) * limit / 60.0)
+
+    def _store(self, conn, kind, level, now):
+        conn.execute("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)", (f"{self.key}:{kind}", level, now))
+
+    def month_tokens(self):
+        """Tokens recorded for this budget in the current month (all processes)."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT tokens FROM usage WHERE key = ? AND month = ?", (self.key, self._month())).fetchone()
+        return row[0] if row else 0
+
+    def acquire(self, estimated_tokens):
+        """
+        Wait until a request of the given size fits both buckets, then take it from them.
+
+        Args:
+            estimated_tokens (int): Estimated tokens of the request.
+
+        Returns:
+            float: Seconds waited.
+
+        Raises:
+            BudgetExceededError: The monthly token cap would be exceeded.
+        """
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    if self.monthly_token_cap:
+                        row = conn.execute("SELECT tokens FROM usage WHERE key = ? AND month = ?", (self.key, self._month())).fetchone()
+                        used = row[0] if row else 0
+                        if used + estimated_tokens > self.monthly_token_cap:
+                            conn.execute("ROLLBACK")
+                            raise BudgetExceededError(f"Monthly token cap reached ({used} of {self.monthly_token_cap} tokens used)")
+                    now = time.time()
+                    # A request larger than a whole minute's allowance waits for a full bucket
+                    needed = {"requests": 1, "tokens": min(estimated_tokens, self.limits["tokens"])}
+                    wait = 0.0
+                    levels = {}
+                    for kind, limit in self.limits.items():
+                        if not limit:
+                            continue
+                        levels[kind] = self._bucket(conn, kind, now)
+                        if levels[kind] < needed[kind]:
+                            wait = max(wait, (needed[kind] - levels[kind]) * 60.0 / limit)
+                    if wait == 0.0:
+                        for kind, level in levels.items():
+                            self._store(conn, kind, level - needed[kind], now)
+                    conn.execute("COMMIT")
+                finally:
+                    conn.close()
+            if wait == 0.0:
+                waited = time.monotonic() - started
+                with self._lock:
+                    self.run_wait_seconds += waited
+                return waited
+            time.sleep(min(wait, MAX_WAIT_STEP))
+
+    def record(self, estimated_tokens, prompt_tokens=None, completion_tokens=None):
+        """
+        Record the actual usage of a request taken with acquire().
+
+        The token bucket is corrected by the difference to the estimate (it may go below
+        zero, which delays the next requests). Without reported usage the estimate is kept.
+
+        Args:
+            estimated_tokens (int): Estimate passed to acquire().
+            prompt_tokens (int): Prompt tokens reported by the API.
+            completion_tokens (int): Completion tokens reported by the API.
+        """
+        if prompt_tokens is None and completion_tokens is None:
+            prompt_tokens, completion_tokens = estimated_tokens, 0
+        prompt_tokens = prompt_tokens or 0
+        completion_tokens = completion_tokens or 0
+        actual_tokens = prompt_tokens + completion_tokens
+        self._thread_usage.tokens = self.thread_tokens() + actual_tokens
+        with self._lock:
+            self.run_requests += 1
+            self.run_prompt_tokens += prompt_tokens
+            self.run_completion_tokens += completion_tokens
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if self.limits["tokens"]:
+                    now = time.time()
+                    level = self._bucket(conn, "tokens", now)
+                    self._store(conn, "tokens", level - (actual_tokens - min(estimated_tokens, self.limits["tokens"])), now)
+                conn.execute("INSERT OR IGNORE INTO usage (key, month, requests, tokens) VALUES (?, ?, 0, 0)", (self.key, self._month()))
+                conn.execute("UPDATE usage SET requests = requests + 1, tokens = tokens + ? WHERE key = ? AND month = ?",
+                             (actual_tokens, self.key, self._month()))
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+
+    def start_run(self):
+        """Reset the usage of this run (a long-lived process serves several runs)."""
+        with self._lock:
+            self.run_requests = 0
+            self.run_prompt_tokens = 0
+            self.run_completion_tokens = 0
+            self.run_wait_seconds = 0.0
+
+    def thread_tokens(self):
+        """Tokens recorded so far by requests of the calling thread."""
+        return getattr(self._thread_usage, "tokens", 0)
+
+    def report(self):
+        """Summary of this run's usage and of the month's usage against the cap."""
+        limits = ", ".join(f"{limit} {kind}/min" for kind, limit in self.limits.items() if limit) or "no per-minute limits"
+        run_tokens = self.run_prompt_tokens + self.run_completion_tokens
+        lines = [
+            f"Requests: {self.run_requests} ({limits}); waited {self.run_wait_seconds:.1f}s for the rate limiter",
+            f"Tokens: {run_tokens} ({self.run_prompt_tokens} prompt, {self.run_completion_tokens} completion)",
+        ]
+        month_tokens = self.month_tokens()
+        if self.monthly_token_cap:
+            lines.append(f"This month: {month_tokens} of {self.monthly_token_cap} tokens ({month_tokens / self.monthly_token_cap:.0%})")
+        else:
+            lines.append(f"This month: {month_tokens} tokens")
+        return "\n".join(lines)
@@ -0,0 +1,132 @@
+import re
+
+# Keys of the answers in a "DOC" object, e.g. "Ans#3" (filled into <Ans#3> by AARF.py)
+ANSWER_KEY_PATTERN = r"^Ans#\d+$"
+# Columns of the Gaps sheet written by AARF.py
+EXCEL_FIELDS = ["SFR", "TSS-requirement", "Missing information"]
+
+# JSON schema of the {"DOC": [...], "Excel": [...]} response described in the system message
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "DOC": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"SFR": {"type": "string"}},
+                "patternProperties": {ANSWER_KEY_PATTERN: {"type": "string"}},
+                "required": ["SFR"],
+                "additionalProperties": False,
+            },
+        },
+        "Excel": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {field: {"type": "string"} for field in EXCEL_FIELDS},
+                "required": EXCEL_FIELDS,
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["DOC", "Excel"],
+    "additionalProperties": False,
+}
+
+# response_format for chat.completions.create. The "Ans#N" keys vary per SFR, which strict
+# mode cannot express (it needs every property listed), so the schema is sent non-strict.
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "tss_assessment",
+        "strict": False,
+        "schema": RESPONSE_SCHEMA,
+    },
+}
+
+_ANSWER_KEY = re.compile(ANSWER_KEY_PATTERN)
+
+
+def doc_object_problems(obj):
+    """
+    Check one "DOC" object against the DOC item schema of RESPONSE_SCHEMA.
+
+    Args:
+        obj: A parsed "DOC" entry.
+
+    Returns:
+        list: Descriptions of the schema violations (empty if the object is valid).
+    """
+    if not isinstance(obj, dict):
+        return ["is not an object"]
+    problems = []
+    if not isinstance(obj.get("SFR"), str) or not obj["SFR"].strip():
+        problems.append("has no 'SFR' string")
+    for key, value in obj.items():
+        if key == "SFR":
+            continue
+        if not _ANSWER_KEY.match(key):
+            problems.append(f"has unexpected key '{key}'")
+        elif not isinstance(value, str):
+            problems.append(f"{key} is not a string")
+    return problems
+
+
+def excel_row_problems(row):
+    """
+    Check one "Excel" row against the Excel item schema of RESPONSE_SCHEMA.
+
+    Args:
+        row: A parsed "Excel" entry.
+
+    Returns:
+        list: Descriptions of the schema violations (empty if the row is valid).
+    """
+    if not isinstance(row, dict):
+        return ["is not an object"]
+    problems = [f"has no '{field}' string" for field in EXCEL_FIELDS if not isinstance(row.get(field), str)]
+    problems.extend(f"has unexpected key '{key}'" for key in row if key not in EXCEL_FIELDS)
+    return problems
+
+
+# JSON schema of the compact response (compact_protocol.py): {"R": [{"S": sfr, "A": [[n, code, value], ...]}]}
+COMPACT_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "R": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "S": {"type": "string"},
+                    "A": {
+                        "type": "array",
+                        "items": {
+                            "type": "array",
+                            "minItems": 3,
+                            "maxItems": 3,
+                            "items": {"anyOf": [
+                                {"type": "integer"},
+                                {"type": "string"},
+                                {"type": "array", "items": {"type": "string"}},
+                            ]},
+                        },
+                    },
+                },
+                "required": ["S", "A"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["R"],
+    "additionalProperties": False,
+}
+
+COMPACT_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "tss_assessment_compact",
+        "strict": False,
+        "schema": COMPACT_RESPONSE_SCHEMA,
+    },
+}
@@ -0,0 +1,69 @@
+import os
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Working directory of each run (prompts, responses, metrics) and of its report
+RUNS_DIR = os.path.join(BASE_DIR, "ephemeral", "runs")
+OUTPUT_ROOT = os.path.join(BASE_DIR, "BLITZ-output")
+
+BASE_SYSTEM_MESSAGE_PATH = os.path.join(BASE_DIR, "sys_inst", "base_TSS.txt")
+TOE_TYPE_PLACEHOLDER = "## In this case the TOE is <STANDALONE/DISTRIBUTED>."
+# Name of the system message in a run's working directory (for the scripts run as subprocesses)
+SYSTEM_MESSAGE_FILE = "System_inst-TSS.txt"
+AI_RESPONSES_FILE = "ai_responses.json"
+
+
+def new_run_id():
+    """Run ID: start time plus a random suffix (e.g. 20250301-142530-9f3a1c)."""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}"
+
+
+def build_system_message(toe_type, base_path=BASE_SYSTEM_MESSAGE_PATH):
+    """
+    System message for a TOE type: the base instructions with the TOE type filled in.
+
+    Args:
+        toe_type (str): "STANDALONE" or "DISTRIBUTED".
+        base_path (str): Base instructions holding TOE_TYPE_PLACEHOLDER.
+
+    Returns:
+        str: The system message.
+    """
+    with open(base_path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    new_line = f"## In this case the TOE is {toe_type}."
+    return "".join(new_line + '\n' if line.strip() == TOE_TYPE_PLACEHOLDER else line for line in lines)
+
+
+class RunContext:
+    """ID-stamped working and output directories of one evaluation, so runs do not share files.
+
+    Args:
+        run_id (str): ID of the run; a new one if None.
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or new_run_id()
+        self.work_dir = os.path.join(RUNS_DIR, self.run_id)
+        self.debug_dir = os.path.join(self.work_dir, "debug_outputs")
+        self.output_dir = os.path.join(OUTPUT_ROOT, self.run_id)
+
+    @classmethod
+    def from_env(cls):
+        """Run handed to a subprocess through BLITZ_RUN_ID (None if the script runs on its own)."""
+        run_id = os.getenv("BLITZ_RUN_ID", "").strip()
+        return cls(run_id) if run_id else None
+
+    def create(self):
+        """Create the run's directories; returns the run."""
+        for directory in (self.work_dir, self.debug_dir, self.output_dir):
+            os.makedirs(directory, exist_ok=True)
+        return self
+
+    def path(self, name):
+        """Path of a file in the run's working directory."""
+        return os.path.join(self.work_dir, name)
+
+    def env(self):
+        """Environment for the run's subprocesses."""
+        return dict(os.environ, BLITZ_RUN_ID=self.run_id)
@@ -0,0 +1,72 @@
+import os
+from chunk_recovery import split_chunk_sections
+from output_budget import estimate_output_tokens, DEFAULT_OUTPUT_TOKENS
+from tss_trimming import estimate_tokens
+
+LPT = "lpt"            # longest (most expensive) chunk first, so big chunks do not become the tail
+FIFO = "fifo"          # file order
+AFFINITY = "affinity"  # chunks of the same SFR family (FCS, FIA, ...) back to back, largest family first
+POLICIES = (LPT, FIFO, AFFINITY)
+# Chunks streamed from the extraction stage are sent as they are produced (not selectable)
+ARRIVAL = "arrival"
+
+
+def sfr_family(sfr):
+    """Family of an SFR name ("FCS_CKM.1" -> "FCS")."""
+    return sfr.split("_", 1)[0].strip().upper()
+
+
+def chunk_estimate(name, content, compact=False):
+    """
+    Estimated cost of a chunk.
+
+    Args:
+        name (str): Chunk name (file name).
+        content (str): Chunk content.
+        compact (bool): The compact response protocol is used.
+
+    Returns:
+        dict: {"chunk", "family", "input_tokens", "output_tokens", "cost"}; the family is the
+              most frequent SFR family of the chunk.
+    """
+    families = [sfr_family(sfr) for sfr, _ in split_chunk_sections(content)]
+    family = max(sorted(set(families)), key=families.count) if families else ""
+    input_tokens = estimate_tokens(content)
+    output_tokens = estimate_output_tokens(content, compact) or DEFAULT_OUTPUT_TOKENS
+    return {
+        "chunk": name,
+        "family": family,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost": input_tokens + output_tokens,
+    }
+
+
+def order_chunks(estimates, policy=LPT):
+    """
+    Dispatch order of the chunks.
+
+    Args:
+        estimates (list): chunk_estimate() results, in file order.
+        policy (str): One of POLICIES.
+
+    Returns:
+        list: The estimates in dispatch order.
+    """
+    if policy == FIFO:
+        return list(estimates)
+    if policy == AFFINITY:
+        family_cost = {}
+        for estimate in estimates:
+            family_cost[estimate["family"]] = family_cost.get(estimate["family"], 0) + estimate["cost"]
+        return sorted(estimates, key=lambda e: (-family_cost[e["family"]], e["family"], -e["cost"]))
+    return sorted(estimates, key=lambda e: -e["cost"])
+
+
+def schedule_policy_from_env():
+    """Policy set by CHUNK_SCHEDULE (lpt, fifo or affinity; default lpt)."""
+    policy = os.getenv("CHUNK_SCHEDULE", "").strip().lower() or LPT
+    if policy not in POLICIES:
+        print(f"Warning: Unknown CHUNK_SCHEDULE '{policy}'; using {LPT}")
+        policy = LPT
+    return policy
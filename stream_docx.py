@@ -0,0 +1,374 @@
+import os
+import re
+import copy
+import zipfile
+import posixpath
+from lxml import etree
+
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS_PART = "word/_rels/document.xml.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+NUMBERING_REL_TYPE = R_NS + "/numbering"
+NUMBERING_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.numbering+xml"
+
+W_VAL = f"{{{W_NS}}}val"
+W_NUM_ID = f"{{{W_NS}}}numId"
+W_ABSTRACT_NUM_ID = f"{{{W_NS}}}abstractNumId"
+
+
+def _part_name(target, base="word"):
+    """Zip name of the part a relationship target of base/document.xml points to."""
+    return posixpath.normpath(posixpath.join(base, target))
+
+
+def _rels_part_name(part_name):
+    """Zip name of the relationships part of a part (e.g. word/_rels/footer2.xml.rels)."""
+    folder, name = posixpath.split(part_name)
+    return posixpath.join(folder, "_rels", name + ".rels")
+
+
+class _TemplateParts:
+    """Document relationships and numbering definitions of a template whose blocks are
+    appended to a report streamed with the parts of another template.
+
+    Args:
+        template_path (str): The template.
+    """
+
+    def __init__(self, template_path):
+        self.template_path = template_path
+        with zipfile.ZipFile(template_path) as template_zip:
+            self.names = set(template_zip.namelist())
+            self.rels = {}
+            if DOCUMENT_RELS_PART in self.names:
+                self.rels = {rel.get("Id"): rel for rel in etree.fromstring(template_zip.read(DOCUMENT_RELS_PART))}
+            self.content_types = etree.fromstring(template_zip.read(CONTENT_TYPES_PART))
+            numbering_rel = next((rel for rel in self.rels.values() if rel.get("Type") == NUMBERING_REL_TYPE), None)
+            self.numbering = None
+            if numbering_rel is not None and _part_name(numbering_rel.get("Target")) in self.names:
+                self.numbering = etree.fromstring(template_zip.read(_part_name(numbering_rel.get("Target"))))
+        # Template IDs -> IDs in the report
+        self.rel_ids = {}
+        self.num_ids = {}
+        self.abstract_num_ids = {}
+
+    def read(self, part_name):
+        with zipfile.ZipFile(self.template_path) as template_zip:
+            return template_zip.read(part_name)
+
+
+class StreamingDocxWriter:
+    """Writes a .docx whose body is streamed block by block into the output zip.
+
+    Every part of the template (styles, numbering, theme, footers, media, ...)
+    is copied unchanged; only word/document.xml is replaced. The document
+    prologue (root element with its namespace declarations and <w:body>) and
+    the final section properties are taken from the template, and each block
+    appended in between is serialized and written straight to the zip, so the
+    assembled report is never held in memory as a DOM.
+
+    Blocks taken from another template (source) have their list numbering and
+    relationships (images, hyperlinks, ...) merged into the report: the
+    definitions they use are copied under new IDs. A part with relationships of
+    its own (e.g. a header with an image) is reused when it is identical to the
+    report's; otherwise the block is rejected with a ValueError.
+
+    Usage:
+        with StreamingDocxWriter(template_path, output_path) as writer:
+            writer.append_element(paragraph._element)
+    """
+
+    def __init__(self, template_path, output_path):
+        self.template_path = template_path
+        self.output_path = output_path
+        self.block_count = 0
+        self._zip = None
+        self._stream = None
+        self._tail = b""
+        self._names = set()
+        self._rels = None
+        self._content_types = None
+        self._numbering = None
+        self._numbering_part = None
+        self._sources = {}
+        # Part name in the report -> (template parts, part name in the template) of the parts copied at close()
+        self._imported_parts = {}
+
+    def open(self):
+        """Copy the template parts and start streaming word/document.xml."""
+        try:
+            self._zip = zipfile.ZipFile(self.output_path, "w", zipfile.ZIP_DEFLATED)
+            template = _TemplateParts(self.template_path)
+            self._names = set(template.names)
+            self._rels = etree.Element(f"{{{PKG_REL_NS}}}Relationships", nsmap={None: PKG_REL_NS})
+            self._rels.extend(template.rels.values())
+            self._content_types = template.content_types
+            self._numbering = template.numbering
+            numbering_rel = next((rel for rel in self._rels if rel.get("Type") == NUMBERING_REL_TYPE), None)
+            if self._numbering is not None:
+                self._numbering_part = _part_name(numbering_rel.get("Target"))
+            # The parts that blocks of other templates can add to are written by close()
+            held = {DOCUMENT_RELS_PART, CONTENT_TYPES_PART, self._numbering_part}
+            with zipfile.ZipFile(self.template_path) as template_zip:
+                for item in template_zip.infolist():
+                    if item.filename == DOCUMENT_PART:
+                        prologue, self._tail = self._split_document(template_zip.read(item))
+                    elif item.filename not in held:
+                        self._zip.writestr(item, template_zip.read(item))
+            self._stream = self._zip.open(DOCUMENT_PART, "w", force_zip64=True)
+            self._stream.write(prologue)
+        except Exception:
+            self.abort()
+            raise
+        return self
+
+    @staticmethod
+    def _split_document(document_xml):
+        """Split the template's document.xml into the part before the body content
+        (including the <w:body> start tag) and the closing part (final <w:sectPr>
+        plus the closing body/document tags).
+
+        Args:
+            document_xml (bytes): Raw template document.xml.
+
+        Returns:
+            tuple: (prologue_bytes, tail_bytes)
+        """
+        body_match = re.search(rb"<w:body(\s[^>]*)?>", document_xml)
+        if not body_match:
+            raise ValueError("Template document.xml has no <w:body> element")
+        prologue = document_xml[:body_match.end()]
+
+        body_end = document_xml.rfind(b"</w:body>")
+        sect_start = document_xml.rfind(b"<w:sectPr", body_match.end(), body_end)
+        # Only keep the body-level sectPr (a paragraph-level one would be inside a <w:p>)
+        if sect_start != -1 and b"</w:p>" not in document_xml[sect_start:body_end]:
+            tail = document_xml[sect_start:]
+        else:
+            tail = document_xml[body_end:]
+        return prologue, tail
+
+    def append_element(self, elem, source=None):
+        """Serialize a body-level element (w:p or w:tbl) into the output stream.
+
+        Args:
+            elem: The element.
+            source (str): Template the element was taken from, if not the writer's template.
+        """
+        self.append_xml(etree.tostring(elem, encoding="unicode"), source)
+
+    def append_xml(self, xml_string, source=None):
+        """Write an already serialized body-level element into the output stream.
+
+        Args:
+            xml_string (str): The serialized element.
+            source (str): Template the element was taken from, if not the writer's template.
+        """
+        if source and os.path.abspath(source) != os.path.abspath(self.template_path):
+            xml_string = self._import_block(xml_string, source)
+        self._stream.write(xml_string.encode("utf-8"))
+        self.block_count += 1
+
+    def _import_block(self, xml_string, source):
+        """Block of another template with its numbering and relationship IDs moved to the report's."""
+        # Serialized blocks declare the r prefix on their root, the references use it
+        if "numId" not in xml_string and " r:" not in xml_string:
+            return xml_string
+        parts = self._sources.get(source)
+        if parts is None:
+            parts = self._sources[source] = _TemplateParts(source)
+        elem = etree.fromstring(xml_string)
+        for num_id in elem.iter(W_NUM_ID):
+            value = num_id.get(W_VAL)
+            # numId 0 removes the numbering of a paragraph
+            if value and value != "0":
+                num_id.set(W_VAL, self._import_num(parts, value))
+        for node in elem.iter(etree.Element):
+            for attr, value in node.attrib.items():
+                if attr.startswith(f"{{{R_NS}}}"):
+                    node.set(attr, self._import_rel(parts, value))
+        return etree.tostring(elem, encoding="unicode")
+
+    @staticmethod
+    def _next_id(parent, tag, attr):
+        return str(max((int(child.get(attr)) for child in parent.iter(tag) if (child.get(attr) or "").isdigit()),
+                       default=0) + 1)
+
+    def _import_num(self, parts, num_id):
+        """numId in the report of a template's numbering instance (copied with its abstract definition)."""
+        if num_id in parts.num_ids:
+            return parts.num_ids[num_id]
+        source_num = None
+        if parts.numbering is not None:
+            source_num = next((num for num in parts.numbering.iter(f"{{{W_NS}}}num") if num.get(W_NUM_ID) == num_id), None)
+        if source_num is None:
+            # Not defined in its own template either: left as it is
+            parts.num_ids[num_id] = num_id
+            return num_id
+        if self._numbering is None:
+            self._add_numbering_part()
+
+        abstract_id = source_num.find(W_ABSTRACT_NUM_ID).get(W_VAL)
+        if abstract_id not in parts.abstract_num_ids:
+            source_abstract = next(abstract for abstract in parts.numbering.iter(f"{{{W_NS}}}abstractNum")
+                                   if abstract.get(W_ABSTRACT_NUM_ID) == abstract_id)
+            abstract = copy.deepcopy(source_abstract)
+            new_abstract_id = self._next_id(self._numbering, f"{{{W_NS}}}abstractNum", W_ABSTRACT_NUM_ID)
+            abstract.set(W_ABSTRACT_NUM_ID, new_abstract_id)
+            # Word joins lists with the same nsid; the copy is a list of its own
+            for nsid in abstract.findall(f"{{{W_NS}}}nsid"):
+                abstract.remove(nsid)
+            # Abstract definitions come before the numbering instances
+            existing = self._numbering.findall(f"{{{W_NS}}}abstractNum") or self._numbering.findall(f"{{{W_NS}}}numPicBullet")
+            if existing:
+                existing[-1].addnext(abstract)
+            else:
+                self._numbering.insert(0, abstract)
+            parts.abstract_num_ids[abstract_id] = new_abstract_id
+
+        num = copy.deepcopy(source_num)
+        new_num_id = self._next_id(self._numbering, f"{{{W_NS}}}num", W_NUM_ID)
+        num.set(W_NUM_ID, new_num_id)
+        num.find(W_ABSTRACT_NUM_ID).set(W_VAL, parts.abstract_num_ids[abstract_id])
+        cleanup = self._numbering.find(f"{{{W_NS}}}numIdMacAtCleanup")
+        if cleanup is not None:
+            cleanup.addprevious(num)
+        else:
+            self._numbering.append(num)
+        parts.num_ids[num_id] = new_num_id
+        return new_num_id
+
+    def _add_numbering_part(self):
+        """Numbering part for a report whose template has none."""
+        self._numbering = etree.Element(f"{{{W_NS}}}numbering", nsmap={"w": W_NS})
+        self._numbering_part = self._unique_name("word/numbering.xml")
+        self._add_rel(NUMBERING_REL_TYPE, posixpath.relpath(self._numbering_part, "word"))
+        override = etree.SubElement(self._content_types, f"{{{CT_NS}}}Override")
+        override.set("PartName", "/" + self._numbering_part)
+        override.set("ContentType", NUMBERING_CONTENT_TYPE)
+
+    def _unique_name(self, part_name):
+        base, ext = posixpath.splitext(part_name)
+        name, count = part_name, 1
+        while name in self._names:
+            count += 1
+            name = f"{base}{count}{ext}"
+        self._names.add(name)
+        return name
+
+    def _add_rel(self, rel_type, target, mode=None):
+        rel_id = "rId" + str(max((int(rel.get("Id")[3:]) for rel in self._rels if re.fullmatch(r"rId\d+", rel.get("Id") or "")),
+                                 default=0) + 1)
+        rel = etree.SubElement(self._rels, f"{{{PKG_REL_NS}}}Relationship", Id=rel_id, Type=rel_type, Target=target)
+        if mode:
+            rel.set("TargetMode", mode)
+        return rel_id
+
+    def _import_rel(self, parts, rel_id):
+        """Relationship ID in the report of a template's relationship (its part is copied if the report lacks it)."""
+        if rel_id in parts.rel_ids:
+            return parts.rel_ids[rel_id]
+        rel = parts.rels.get(rel_id)
+        if rel is None:
+            # Dangling in its own template as well
+            return rel_id
+        rel_type, target, mode = rel.get("Type"), rel.get("Target"), rel.get("TargetMode")
+
+        if mode == "External":
+            new_id = next((own.get("Id") for own in self._rels if own.get("Type") == rel_type
+                           and own.get("Target") == target and own.get("TargetMode") == mode), None)
+            parts.rel_ids[rel_id] = new_id or self._add_rel(rel_type, target, mode)
+            return parts.rel_ids[rel_id]
+
+        source_part = _part_name(target)
+        content = parts.read(source_part)
+        same = next((own for own in self._rels if own.get("Type") == rel_type and own.get("TargetMode") != "External"
+                     and self._read_part(_part_name(own.get("Target"))) == content), None)
+        if same is not None:
+            parts.rel_ids[rel_id] = same.get("Id")
+            return parts.rel_ids[rel_id]
+        if _rels_part_name(source_part) in parts.names:
+            raise ValueError(f"{source_part} of {parts.template_path} has relationships of its own and differs from "
+                             f"the part of {self.template_path}; it cannot be merged into the streamed report")
+
+        new_part = self._unique_name(source_part)
+        self._imported_parts[new_part] = (parts, source_part)
+        self._add_content_type(parts, source_part, new_part)
+        parts.rel_ids[rel_id] = self._add_rel(rel_type, posixpath.relpath(new_part, "word"))
+        return parts.rel_ids[rel_id]
+
+    def _read_part(self, part_name):
+        """Content of a part of the report, or None if it has none by that name."""
+        if part_name in self._imported_parts:
+            parts, source_part = self._imported_parts[part_name]
+            return parts.read(source_part)
+        with zipfile.ZipFile(self.template_path) as template_zip:
+            try:
+                return template_zip.read(part_name)
+            except KeyError:
+                return None
+
+    def _add_content_type(self, parts, source_part, new_part):
+        """Declare the content type of a copied part as its template does."""
+        override = next((item for item in parts.content_types.iter(f"{{{CT_NS}}}Override")
+                         if item.get("PartName") == "/" + source_part), None)
+        if override is not None:
+            copied = etree.SubElement(self._content_types, f"{{{CT_NS}}}Override")
+            copied.set("PartName", "/" + new_part)
+            copied.set("ContentType", override.get("ContentType"))
+            return
+        extension = posixpath.splitext(source_part)[1][1:].lower()
+        if any(item.get("Extension", "").lower() == extension for item in self._content_types.iter(f"{{{CT_NS}}}Default")):
+            return
+        default = next((item for item in parts.content_types.iter(f"{{{CT_NS}}}Default")
+                        if item.get("Extension", "").lower() == extension), None)
+        if default is not None:
+            self._content_types.insert(0, copy.deepcopy(default))
+
+    def close(self):
+        """Write the closing section properties and the merged parts, and finalize the zip."""
+        if self._stream is not None:
+            self._stream.write(self._tail)
+            self._stream.close()
+            self._stream = None
+        if self._zip is not None:
+            self._zip.writestr(CONTENT_TYPES_PART, etree.tostring(self._content_types, xml_declaration=True,
+                                                                  encoding="UTF-8", standalone=True))
+            self._zip.writestr(DOCUMENT_RELS_PART, etree.tostring(self._rels, xml_declaration=True,
+                                                                  encoding="UTF-8", standalone=True))
+            if self._numbering is not None:
+                self._zip.writestr(self._numbering_part, etree.tostring(self._numbering, xml_declaration=True,
+                                                                        encoding="UTF-8", standalone=True))
+            for new_part, (parts, source_part) in self._imported_parts.items():
+                self._zip.writestr(new_part, parts.read(source_part))
+            self._zip.close()
+            self._zip = None
+
+    def abort(self):
+        """Close the output without finishing it and delete it (after an error)."""
+        try:
+            if self._stream is not None:
+                self._stream.close()
+            if self._zip is not None:
+                self._zip.close()
+        except Exception:
+            pass
+        self._stream = None
+        self._zip = None
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+        return False
@@ -0,0 +1,80 @@
+from docx import Document
+
+from AARF import SDFragmentMerger, find_placeholders, get_block_text, merge_sd_fragments
+
+
+def _first_occurrences(text):
+    keys = []
+    for placeholder in find_placeholders(text):
+        if placeholder not in keys:
+            keys.append(placeholder)
+    return keys
+
+
+def _row_cells_text(table):
+    # How the table text was read before get_block_text used the <w:tc> elements
+    return "\n".join(cell.text for row in table.rows for cell in row.cells)
+
+
+def test_table_text_without_merged_cells_matches_row_cells():
+    table = Document().add_table(rows=2, cols=2)
+    for idx, cell in enumerate(table._cells):
+        cell.text = f"<Ans#{idx + 1}>"
+    assert get_block_text(table) == _row_cells_text(table)
+
+
+def test_merged_cells_give_the_same_placeholder_order_as_row_cells():
+    table = Document().add_table(rows=3, cols=3)
+    for idx, cell in enumerate(table._cells):
+        cell.text = f"<Ans#{idx + 1}>"
+    # Horizontal merge in the first row, vertical merge in the last column
+    table.cell(0, 0).merge(table.cell(0, 1))
+    table.cell(1, 2).merge(table.cell(2, 2))
+
+    xpath_text, row_cells_text = get_block_text(table), _row_cells_text(table)
+    # row.cells repeats the merged cells' text; the <w:tc> elements hold it once
+    assert len(find_placeholders(row_cells_text)) > len(find_placeholders(xpath_text))
+    assert _first_occurrences(xpath_text) == _first_occurrences(row_cells_text)
+    assert find_placeholders(xpath_text)[0] == find_placeholders(row_cells_text)[0]
+
+
+def _fragment(sd, tss_bases, h5s, needed_bases):
+    return {'sd': sd, 'template_path': f'{sd}-template.docx', 'tss_bases': tss_bases, 'general_req': None,
+            'h3s': [{'text': 'H3', 'xml': f'{sd}:H3',
+                     'h4s': [{'text': 'H4', 'xml': f'{sd}:H4', 'needed_bases': set(needed_bases), 'h5s': h5s}]}]}
+
+
+def _tss(sd, sfr_base, agd=True):
+    return {'kind': 'tss', 'sfr_base': sfr_base, 'text': f'{sfr_base} TSS', 'xml': f'{sd}:{sfr_base} TSS',
+            'blocks': [f'{sd}:{sfr_base} content'], 'agd_text': f'{sfr_base} AGD' if agd else None,
+            'agd_blocks': [f'{sd}:{sfr_base} AGD'] if agd else []}
+
+
+def _misc(sd, text):
+    return {'kind': 'misc', 'text': text, 'xml': f'{sd}:{text}', 'blocks': []}
+
+
+def test_merge_emits_each_sfr_once_by_its_first_sd():
+    first = _fragment('SD1', ['A', 'B'], [_tss('SD1', 'A'), _misc('SD1', 'Notes')], ['A'])
+    second = _fragment('SD2', ['A', 'C'], [_tss('SD2', 'A'), _tss('SD2', 'C'), _misc('SD2', 'Notes'),
+                                          _misc('SD2', 'A AGD')], ['A', 'C'])
+    emit_blocks, sfr_owner = merge_sd_fragments([first, second])
+
+    assert sfr_owner == {'A': 'SD1', 'B': 'SD1', 'C': 'SD2'}
+    assert emit_blocks == ['SD1:H3', 'SD1:H4', 'SD1:A TSS', 'SD1:A content', 'SD1:A AGD', 'SD1:Notes',
+                           'SD2:H3', 'SD2:H4', 'SD2:C TSS', 'SD2:C content', 'SD2:C AGD']
+
+
+def test_merge_emits_a_repeated_misc_heading_once_within_an_sd():
+    fragment = _fragment('SD1', ['A'], [_misc('SD1', 'Notes'), _tss('SD1', 'A', agd=False), _misc('SD1', 'Notes')], ['A'])
+    emit_blocks, _ = merge_sd_fragments([fragment])
+    assert emit_blocks == ['SD1:H3', 'SD1:H4', 'SD1:Notes', 'SD1:A TSS', 'SD1:A content']
+
+
+def test_merger_emits_each_fragment_when_it_is_added():
+    emitted = []
+    merger = SDFragmentMerger(lambda xml_string, template_path: emitted.append(xml_string))
+    merger.add(_fragment('SD1', ['A'], [_tss('SD1', 'A', agd=False)], ['A']))
+    assert emitted == ['SD1:H3', 'SD1:H4', 'SD1:A TSS', 'SD1:A content']
+    merger.add(_fragment('SD2', ['A'], [_tss('SD2', 'A', agd=False)], ['A']))
+    assert merger.block_count == len(emitted) == 4
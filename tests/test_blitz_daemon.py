@@ -0,0 +1,66 @@
+import io
+import sys
+import json
+import threading
+
+import blitz_daemon
+import pipeline
+import run_context
+from blitz_daemon import BlitzDaemon, _DaemonServer, _RequestHandler, _RunOutput, submit_run
+
+
+def test_run_output_captures_the_run_threads_only():
+    console, client = io.StringIO(), io.StringIO()
+    output = _RunOutput(console)
+    started, release = threading.Event(), threading.Event()
+
+    def other_client():
+        started.set()
+        release.wait(5)
+        output.write("other\n")
+
+    other = threading.Thread(target=other_client)
+    other.start()
+    started.wait(5)
+    with output.capture(client):
+        output.write("run\n")
+        worker = threading.Thread(target=output.write, args=("worker\n",))
+        worker.start()
+        worker.join()
+        release.set()
+        other.join()
+    output.write("after\n")
+    assert client.getvalue() == "run\nworker\n"
+    assert console.getvalue() == "other\nafter\n"
+
+
+def test_run_with_an_st_that_is_not_a_docx_ends_with_a_failed_done_event(tmp_path, monkeypatch):
+    # A test key and scratch directories: the run fails before any request is sent
+    env_path = tmp_path / ".env"
+    env_path.write_text("TOKEN=test-token\n")
+    monkeypatch.setenv("TOKEN", "test-token")
+    monkeypatch.setattr(pipeline, "ENV_PATH", str(env_path))
+    monkeypatch.setattr(run_context, "RUNS_DIR", str(tmp_path / "runs"))
+    monkeypatch.setattr(run_context, "OUTPUT_ROOT", str(tmp_path / "output"))
+    monkeypatch.setattr(blitz_daemon, "DAEMON_FILE", str(tmp_path / "daemon.json"))
+    # BlitzDaemon installs its own streams; monkeypatch puts pytest's back afterwards
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    monkeypatch.setattr(sys, "stderr", sys.stderr)
+    st_path = tmp_path / "ST.docx"
+    st_path.write_text("not a docx")
+
+    server = _DaemonServer(("127.0.0.1", 0), _RequestHandler)
+    server.blitz = BlitzDaemon()
+    server.secret = "secret"
+    (tmp_path / "daemon.json").write_text(json.dumps({"port": server.server_address[1], "secret": "secret"}))
+    serving = threading.Thread(target=server.serve_forever, daemon=True)
+    serving.start()
+    try:
+        sd_name = next(iter(server.blitz.sd_paths()))
+        output = []
+        success, message, _ = submit_run(str(st_path), [sd_name], "STANDALONE", on_output=output.append)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert success is False
+    assert "Error processing ST document" in message
@@ -0,0 +1,33 @@
+from chunk_recovery import drop_invalid_objects, find_missing_answers, merge_duplicate_doc_objects, missing_sections
+
+
+def test_merge_joins_objects_whose_sfr_names_differ_in_case_and_spaces():
+    merged = merge_duplicate_doc_objects([{"SFR": "FCS_CKM.1", "Ans#1": "first"},
+                                          {"SFR": " fcs_ckm.1 ", "Ans#1": "second", "Ans#2": "added"}])
+    assert merged == [{"SFR": "FCS_CKM.1", "Ans#1": "first", "Ans#2": "added"}]
+
+
+def test_missing_answers_are_found_for_a_differently_written_sfr_name():
+    doc_objects = [{"SFR": "fcs_ckm.1 ", "Ans#1": "answer"}, {"SFR": "FIA_UAU.1", "Ans#1": "answer"}]
+    expected_keys = {"FCS_CKM.1": ["Ans#1", "Ans#2"], "FIA_UAU.1": ["Ans#1"]}
+    assert find_missing_answers(doc_objects, expected_keys) == {"fcs_ckm.1 ": ["Ans#2"]}
+
+
+def test_doc_objects_that_break_the_schema_are_dropped_and_their_sfrs_reasked():
+    items = [{"DOC": [{"SFR": "FCS_CKM.1", "Ans#1": "answer"}, {"SFR": "FIA_UAU.1", "Ans#1": ["not", "a string"]},
+                      {"SFR": "FPT_STM.1", "Notes": "unexpected"}, {"Ans#1": "cut off"}], "Excel": []}]
+    assert len(drop_invalid_objects(items)) == 3
+    assert items[0]["DOC"] == [{"SFR": "FCS_CKM.1", "Ans#1": "answer"}]
+    sections = [("FCS_CKM.1", ""), ("FIA_UAU.1", ""), ("FPT_STM.1", "")]
+    assert [sfr for sfr, _ in missing_sections(sections, items)] == ["FIA_UAU.1", "FPT_STM.1"]
+
+
+def test_excel_rows_are_normalized_to_the_schema_and_non_objects_removed():
+    items = [{"DOC": [], "Excel": [
+        {"SFR": "FCS_CKM.1", "TSS-requirement": "Key sizes", "Missing information": "The key sizes"},
+        {"SFR": "FIA_UAU.1", "TSS-requirement": {"number": 2}, "Missing information": ["Timeout", "lockout"], "Note": "x"},
+        "Missing information for FPT_STM.1"]}]
+    assert len(drop_invalid_objects(items)) == 2
+    assert items[0]["Excel"] == [
+        {"SFR": "FCS_CKM.1", "TSS-requirement": "Key sizes", "Missing information": "The key sizes"},
+        {"SFR": "FIA_UAU.1", "TSS-requirement": '{"number": 2}', "Missing information": "Timeout; lockout"}]
@@ -0,0 +1,72 @@
+import multiprocessing
+
+import pytest
+
+from job_queue import DONE, FAILED, JobQueue, SQLiteJobQueue
+
+
+def _lease_until_empty(db_path, worker, leased):
+    job_queue = SQLiteJobQueue(db_path)
+    while True:
+        job = job_queue.lease(worker)
+        if job is None:
+            return
+        leased.put((worker, job.name))
+        job_queue.complete(job, {"worker": worker})
+
+
+def _queue_with_jobs(tmp_path, count, **kwargs):
+    job_queue = SQLiteJobQueue(str(tmp_path / "jobs.db"), **kwargs)
+    job_queue.register_run("run", {"system_message": "message"})
+    for idx in range(count):
+        job_queue.enqueue("run", f"chunk{idx}", {"idx": idx})
+    return job_queue
+
+
+def test_job_queue_backends_must_implement_the_interface():
+    with pytest.raises(TypeError):
+        JobQueue()
+
+
+def test_concurrent_workers_lease_each_job_once(tmp_path):
+    job_queue = _queue_with_jobs(tmp_path, 40)
+    leased = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_lease_until_empty, args=(job_queue.db_path, f"worker{idx}", leased))
+               for idx in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+    names = [leased.get(timeout=5)[1] for _ in range(40)]
+    assert sorted(names) == sorted(f"chunk{idx}" for idx in range(40))
+    assert all(job_queue.outcome("run", name)[0] == DONE for name in names)
+
+
+def test_expired_lease_is_requeued_and_the_old_worker_cannot_fail_it(tmp_path):
+    job_queue = _queue_with_jobs(tmp_path, 1)
+    lost = job_queue.lease("lost", lease_seconds=-1)
+    taken = job_queue.lease("other")
+    assert (taken.name, taken.attempts) == (lost.name, 2)
+    assert not job_queue.renew(lost, "lost")
+
+    job_queue.fail(lost, "late error", "lost")
+    assert job_queue.renew(taken, "other")
+    assert job_queue.complete(taken, {"items": []})
+    assert job_queue.outcome("run", taken.name) == (DONE, {"items": []})
+
+
+def test_failed_job_is_retried_until_it_runs_out_of_attempts(tmp_path):
+    job_queue = _queue_with_jobs(tmp_path, 1, max_attempts=2)
+    job_queue.fail(job_queue.lease("worker"), "first error", "worker")
+    assert job_queue.outcome("run", "chunk0") is None
+    job_queue.fail(job_queue.lease("worker"), "second error", "worker")
+    assert job_queue.outcome("run", "chunk0") == (FAILED, "second error")
+    assert job_queue.lease("worker") is None
+
+
+def test_lease_expiring_on_the_last_attempt_fails_the_job(tmp_path):
+    job_queue = _queue_with_jobs(tmp_path, 1, max_attempts=1)
+    job_queue.lease("lost", lease_seconds=-1)
+    assert job_queue.outcome("run", "chunk0") == (FAILED, "Lease expired (worker lost)")
+    assert job_queue.lease("other") is None
+    assert job_queue.outcome("run", "chunk0") == (FAILED, "Lease expired (worker lost)")
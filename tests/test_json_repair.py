@@ -0,0 +1,79 @@
+import glob
+import json
+import os
+
+import pytest
+
+from json_repair import JSONRepairError, repair_json
+from json_repair_bench import CORPUS_PATTERNS, DEFAULT_CORPUS_DIR, EXPECTATIONS_FILE, check_regressions, run_file
+
+
+def test_valid_json_is_unchanged():
+    text = '{"DOC": [{"SFR": "FCS_CKM.1", "Ans#1": "a"}], "Excel": []}'
+    parsed, parser = repair_json(text)
+    assert parsed == json.loads(text)
+    assert parser.repairs == []
+    assert not parser.truncated
+
+
+@pytest.mark.parametrize("text, answer", [
+    ('{"DOC":[{"SFR":"A","Ans#1":"He said "no", then left"}]}', 'He said "no", then left'),
+    ('{"DOC":[{"SFR":"A","Ans#1":"shown as "*", not echoed, for all"}]}', 'shown as "*", not echoed, for all'),
+    ('{"DOC":[{"SFR":"A","Ans#1":"list: "a", "b""}]}', 'list: "a", "b"'),
+])
+def test_inner_quote_before_comma_and_words_stays_in_string(text, answer):
+    parsed, parser = repair_json(text)
+    assert parsed["DOC"][0]["Ans#1"] == answer
+    assert not parser.truncated
+
+
+def test_inner_quote_before_next_key_closes_string():
+    parsed, _ = repair_json('{"DOC":[{"SFR":"A","Ans#1":"x", "Ans#2":"y"}]}')
+    assert parsed["DOC"][0] == {"SFR": "A", "Ans#1": "x", "Ans#2": "y"}
+
+
+def test_array_members_after_comma():
+    parsed, _ = repair_json('["a", "b", 1, true, null, {"c": 2}]')
+    assert parsed == ["a", "b", 1, True, None, {"c": 2}]
+
+
+def test_key_with_embedded_colon():
+    parsed, _ = repair_json('{"SFR": "A", "Ans#1: "x", "Ans#2:" "y"}')
+    assert parsed == {"SFR": "A", "Ans#1": "x", "Ans#2": "y"}
+
+
+def test_duplicated_and_trailing_commas():
+    parsed, parser = repair_json('{"DOC": [{"SFR": "A", "Ans#1": "x",,}, ], "Excel": [],}')
+    assert parsed == {"DOC": [{"SFR": "A", "Ans#1": "x"}], "Excel": []}
+    assert not parser.truncated
+
+
+def test_truncated_tail_keeps_complete_members():
+    parsed, parser = repair_json('{"DOC": [{"SFR": "A", "Ans#1": "x"}, {"SFR": "B", "Ans#1": "cut o')
+    assert parsed == {"DOC": [{"SFR": "A", "Ans#1": "x"}, {"SFR": "B"}]}
+    assert parser.truncated
+
+
+def test_truncated_inside_next_key_keeps_previous_value():
+    parsed, parser = repair_json('{"DOC":[{"SFR":"A","Ans#1":"text", "An')
+    assert parsed == {"DOC": [{"SFR": "A", "Ans#1": "text"}]}
+    assert parser.truncated
+
+
+def test_stray_backslashes_are_kept():
+    parsed, _ = repair_json(r'{"a": "C:\Program Files\x and FCS\_COP.1"}')
+    assert parsed == {"a": r"C:\Program Files\x and FCS\_COP.1"}
+
+
+@pytest.mark.parametrize("text", ['{"a": -}', '{"a": [-, 1]}', 'no json here'])
+def test_unrecoverable_text_raises_repair_error(text):
+    with pytest.raises(JSONRepairError):
+        repair_json(text)
+
+
+def test_corpus_matches_expected_results():
+    files = sorted({path for pattern in CORPUS_PATTERNS for path in glob.glob(os.path.join(DEFAULT_CORPUS_DIR, pattern))})
+    with open(os.path.join(DEFAULT_CORPUS_DIR, EXPECTATIONS_FILE), 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    assert files
+    assert check_regressions([run_file(path, 1) for path in files], expected) == []
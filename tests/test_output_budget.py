@@ -0,0 +1,32 @@
+from chunk_recovery import SECTION_SEPARATOR
+from output_budget import (BASE_TOKENS, COMPACT_TOKENS_PER_ANSWER, DEFAULT_OUTPUT_TOKENS, MAX_OUTPUT_TOKENS,
+                           MIN_OUTPUT_TOKENS, REASONING_TOKENS, SAFETY_MARGIN, TOKENS_PER_ANSWER, TOKENS_PER_SFR,
+                           estimate_max_tokens, estimate_output_tokens, next_max_tokens)
+
+
+def _prompt(answers_per_sfr):
+    sections = []
+    for idx, answers in enumerate(answers_per_sfr):
+        entries = "\n".join(f"TSS-requirement#{n}: Check the keys.\nAns#{n}: <answer>" for n in range(1, answers + 1))
+        sections.append(f"SFR statement for FCS_CKM.{idx + 1}:\nThe TSS text.\n{entries}\n\n{SECTION_SEPARATOR}\n\n")
+    return "".join(sections)
+
+
+def test_max_tokens_grow_with_the_sfrs_and_answers_asked_for():
+    prompt = _prompt([2, 3])
+    expected = BASE_TOKENS + 2 * TOKENS_PER_SFR + 5 * TOKENS_PER_ANSWER
+    assert estimate_output_tokens(prompt) == expected
+    assert estimate_output_tokens(prompt, compact=True) == BASE_TOKENS + 2 * TOKENS_PER_SFR + 5 * COMPACT_TOKENS_PER_ANSWER
+    assert estimate_max_tokens(prompt) == int((expected + REASONING_TOKENS) * SAFETY_MARGIN)
+
+
+def test_max_tokens_stay_within_the_limits():
+    assert estimate_max_tokens("No requirement sections") == DEFAULT_OUTPUT_TOKENS
+    assert estimate_max_tokens(_prompt([1])) >= MIN_OUTPUT_TOKENS
+    assert estimate_max_tokens(_prompt([10] * 10)) == MAX_OUTPUT_TOKENS
+
+
+def test_truncated_response_is_retried_with_a_doubled_cap_up_to_the_maximum():
+    assert next_max_tokens(4000) == 8000
+    assert next_max_tokens(12000) == MAX_OUTPUT_TOKENS
+    assert next_max_tokens(MAX_OUTPUT_TOKENS) is None
@@ -0,0 +1,26 @@
+from compact_protocol import SATISFIED_PREFIX
+from quote_verification import STATUS_NOT_FOUND, STATUS_REWORDED, STATUS_VERIFIED, QuoteIndex
+
+TSS_TEXT = ("The TOE generates RSA keys of 3072 bits using the CTR_DRBG. "
+            "Keys are stored in the “secure key store” and zeroized on deletion.")
+
+
+def _index():
+    return QuoteIndex({"FCS_CKM.1": TSS_TEXT})
+
+
+def test_verbatim_quote_is_verified_ignoring_case_and_typography():
+    answer = f'{SATISFIED_PREFIX}"keys are stored in the "secure key store" and zeroized on deletion."'
+    assert _index().verify("fcs_ckm.1 ", answer) == (STATUS_VERIFIED, 1.0, [])
+
+
+def test_quote_with_a_changed_word_is_reworded_and_an_invented_one_not_found():
+    reworded = _index().verify("FCS_CKM.1", f'{SATISFIED_PREFIX}"The TOE generates RSA keys of 4096 bits using the CTR_DRBG."')
+    assert reworded[0] == STATUS_REWORDED and reworded[1] >= 0.5
+    invented = _index().verify("FCS_CKM.1", f'{SATISFIED_PREFIX}"Keys are exported to the backup server every night."')
+    assert invented[0] == STATUS_NOT_FOUND and invented[2] == ["Keys are exported to the backup server every night."]
+
+
+def test_only_quoting_answers_of_indexed_sfrs_are_checked():
+    assert _index().verify("FCS_CKM.1", "The TSS does not describe the key sizes.") is None
+    assert _index().verify("FIA_UAU.1", f'{SATISFIED_PREFIX}"The TOE generates RSA keys."') is None
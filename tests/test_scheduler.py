@@ -0,0 +1,28 @@
+from scheduler import AFFINITY, FIFO, LPT, order_chunks, schedule_policy_from_env
+
+
+def _estimates():
+    return [{"chunk": "chunk1", "family": "FIA", "cost": 300}, {"chunk": "chunk2", "family": "FCS", "cost": 500},
+            {"chunk": "chunk3", "family": "FIA", "cost": 400}, {"chunk": "chunk4", "family": "FPT", "cost": 100}]
+
+
+def _order(policy):
+    return [estimate["chunk"] for estimate in order_chunks(_estimates(), policy)]
+
+
+def test_lpt_sends_the_most_expensive_chunk_first():
+    assert _order(LPT) == ["chunk2", "chunk3", "chunk1", "chunk4"]
+
+
+def test_fifo_keeps_the_file_order():
+    assert _order(FIFO) == ["chunk1", "chunk2", "chunk3", "chunk4"]
+
+
+def test_affinity_groups_families_largest_family_first():
+    # FIA (700) before FCS (500) before FPT (100); within a family the larger chunk first
+    assert _order(AFFINITY) == ["chunk3", "chunk1", "chunk2", "chunk4"]
+
+
+def test_unknown_policy_falls_back_to_lpt(monkeypatch):
+    monkeypatch.setenv("CHUNK_SCHEDULE", "random")
+    assert schedule_policy_from_env() == LPT
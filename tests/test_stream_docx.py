@@ -0,0 +1,58 @@
+import os
+import re
+import zipfile
+
+import pytest
+from lxml import etree
+
+from stream_docx import W_NS, StreamingDocxWriter
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+FIRST = os.path.join(TEMPLATE_DIR, "NDcPP_v3.0-template.docx")
+OTHER = os.path.join(TEMPLATE_DIR, "PKG_SSH_v1.0-template.docx")
+
+
+def _numbered_block(template_path):
+    with zipfile.ZipFile(template_path) as template_zip:
+        body = etree.fromstring(template_zip.read("word/document.xml")).find(f"{{{W_NS}}}body")
+    for block in body:
+        num_id = block.find(f".//{{{W_NS}}}numId")
+        if num_id is not None and num_id.get(f"{{{W_NS}}}val") != "0":
+            return etree.tostring(block, encoding="unicode"), num_id.get(f"{{{W_NS}}}val")
+    raise AssertionError(f"No numbered paragraph in {template_path}")
+
+
+def _abstract_of(numbering, num_id):
+    w = f"{{{W_NS}}}"
+    num = next(num for num in numbering.iter(f"{w}num") if num.get(f"{w}numId") == num_id)
+    abstract_id = num.find(f"{w}abstractNumId").get(f"{w}val")
+    abstract = next(item for item in numbering.iter(f"{w}abstractNum") if item.get(f"{w}abstractNumId") == abstract_id)
+    return [etree.tostring(lvl) for lvl in abstract.iter(f"{w}lvl")]
+
+
+def test_block_of_another_template_keeps_its_numbering(tmp_path):
+    xml_string, num_id = _numbered_block(OTHER)
+    output = str(tmp_path / "report.docx")
+    with StreamingDocxWriter(FIRST, output) as writer:
+        writer.append_xml(xml_string, OTHER)
+        writer.append_xml(_numbered_block(FIRST)[0], FIRST)
+
+    with zipfile.ZipFile(output) as report, zipfile.ZipFile(OTHER) as other:
+        body = report.read("word/document.xml").decode("utf-8")
+        numbering = etree.fromstring(report.read("word/numbering.xml"))
+        other_numbering = etree.fromstring(other.read("word/numbering.xml"))
+    new_ids = re.findall(r'w:numId w:val="(\d+)"', body)
+    # The other template's list got a numbering instance of its own, with the same levels
+    assert new_ids[0] != num_id
+    assert _abstract_of(numbering, new_ids[0]) == _abstract_of(other_numbering, num_id)
+    # The writer's own template blocks are written as they are
+    assert new_ids[1] == _numbered_block(FIRST)[1]
+
+
+def test_failed_write_removes_the_output(tmp_path):
+    output = str(tmp_path / "report.docx.part")
+    with pytest.raises(RuntimeError):
+        with StreamingDocxWriter(FIRST, output) as writer:
+            writer.append_xml(_numbered_block(FIRST)[0])
+            raise RuntimeError("write failed")
+    assert not os.path.exists(output)
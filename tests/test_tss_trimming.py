@@ -0,0 +1,26 @@
+from tss_trimming import OMISSION_MARKER, estimate_tokens, split_passages, trim_tss_text
+
+
+def _tss_text():
+    filler = [f"Paragraph {idx} covers the audit record layout and the log rotation schedule of the product." for idx in range(12)]
+    filler[6] = "The TOE generates RSA keys of 3072 bits using the DRBG seeded from the hardware entropy source."
+    return "\n".join(filler)
+
+
+def test_text_within_the_budget_is_returned_unchanged():
+    text = _tss_text()
+    assert trim_tss_text(text, ["key generation"], estimate_tokens(text)) == (text, estimate_tokens(text), estimate_tokens(text))
+    assert trim_tss_text(text, [], 10)[0] == text
+
+
+def test_trimming_keeps_the_relevant_passage_with_its_neighbours_in_order():
+    text = _tss_text()
+    passages = split_passages(text)
+    trimmed, original_tokens, trimmed_tokens = trim_tss_text(text, ["RSA key generation with 3072 bits"], 90)
+    assert trimmed.split("\n") == [OMISSION_MARKER, passages[5], passages[6], passages[7], OMISSION_MARKER]
+    assert trimmed_tokens <= 90 < original_tokens
+
+
+def test_short_lines_are_merged_into_the_following_passage():
+    assert split_passages("Heading\n\nThe TOE protects the stored keys with AES-256 key wrapping.") == [
+        "Heading\nThe TOE protects the stored keys with AES-256 key wrapping."]
@@ -0,0 +1,159 @@
+import re
+import math
+
+# Rough size of a token for English prose (no tokenizer dependency)
+CHARS_PER_TOKEN = 4
+# Passages kept per TSS-requirement before the budget is applied, and neighbours kept around each
+TOP_PASSAGES_PER_REQUIREMENT = 3
+NEIGHBOR_PASSAGES = 1
+# Lines shorter than this (headings, table labels) are merged into the following passage
+MIN_PASSAGE_CHARS = 40
+# Written between passages that are not adjacent in the original TSS text
+OMISSION_MARKER = "[...]"
+
+_WORD = re.compile(r"[a-z0-9]+(?:[._/][a-z0-9]+)*")
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have if in into is it its of on or that the their this to
+which with shall should must evaluator tss examine ensure describes describe toe whether
+""".split())
+
+
+def estimate_tokens(text):
+    """Approximate token count of a text."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def tokenize(text):
+    """Lower-cased terms of a text without stopwords (SFR names such as fcs_ckm.1 stay whole)."""
+    return [term for term in _WORD.findall(text.lower()) if term not in _STOPWORDS]
+
+
+def split_passages(tss_text):
+    """
+    Split a TSS text into passages (its non-empty lines, short lines merged forward).
+
+    Args:
+        tss_text (str): TSS text of one SFR.
+
+    Returns:
+        list: Passage strings in text order.
+    """
+    passages = []
+    pending = ""
+    for line in tss_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        pending = f"{pending}\n{line}" if pending else line
+        if len(pending) >= MIN_PASSAGE_CHARS:
+            passages.append(pending)
+            pending = ""
+    if pending:
+        if passages:
+            passages[-1] = f"{passages[-1]}\n{pending}"
+        else:
+            passages.append(pending)
+    return passages
+
+
+class BM25Index:
+    """Okapi BM25 over a small list of passages.
+
+    Args:
+        documents (list): Token lists, one per passage.
+        k1 (float): Term frequency saturation.
+        b (float): Length normalisation.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = []
+        self.lengths = []
+        doc_freqs = {}
+        for tokens in documents:
+            freqs = {}
+            for term in tokens:
+                freqs[term] = freqs.get(term, 0) + 1
+            self.term_freqs.append(freqs)
+            self.lengths.append(len(tokens))
+            for term in freqs:
+                doc_freqs[term] = doc_freqs.get(term, 0) + 1
+        count = len(documents)
+        self.avg_length = (sum(self.lengths) / count) if count else 0
+        self.idf = {term: math.log(1 + (count - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+    def scores(self, query_tokens):
+        """BM25 score of every passage for a query."""
+        results = []
+        for freqs, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            score = 0.0
+            for term in set(query_tokens):
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+
+def trim_tss_text(tss_text, requirement_texts, token_budget):
+    """
+    Keep the passages of a TSS text that are most relevant to its TSS-requirements.
+
+    Each requirement selects its best BM25 passages plus their neighbours; the selected
+    passages are then added in order of relevance until the token budget is reached and
+    written back in their original order, with OMISSION_MARKER where text was left out.
+
+    Args:
+        tss_text (str): TSS text of one SFR.
+        requirement_texts (list): The SD's TSS-requirement texts for the SFR.
+        token_budget (int): Maximum (estimated) tokens of the returned text.
+
+    Returns:
+        tuple: (text, original_tokens, trimmed_tokens). The text is returned unchanged when
+               it already fits the budget or there is nothing to rank against.
+    """
+    original_tokens = estimate_tokens(tss_text)
+    if original_tokens <= token_budget or not requirement_texts:
+        return tss_text, original_tokens, original_tokens
+    passages = split_passages(tss_text)
+    if len(passages) < 2:
+        return tss_text, original_tokens, original_tokens
+
+    index = BM25Index([tokenize(passage) for passage in passages])
+    best = {}  # passage index -> best relevance for any requirement
+    for requirement in requirement_texts:
+        scores = index.scores(tokenize(requirement))
+        ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+        for i in ranked[:TOP_PASSAGES_PER_REQUIREMENT]:
+            if scores[i] <= 0:
+                break
+            best[i] = max(best.get(i, 0.0), scores[i])
+            # Neighbours rank just below the passage they surround
+            for j in range(i - NEIGHBOR_PASSAGES, i + NEIGHBOR_PASSAGES + 1):
+                if 0 <= j < len(passages) and j != i:
+                    best[j] = max(best.get(j, 0.0), scores[i] * 0.5)
+
+    selected = set()
+    used_tokens = 0
+    for i in sorted(best, key=lambda i: best[i], reverse=True):
+        passage_tokens = estimate_tokens(passages[i]) + 1
+        if used_tokens + passage_tokens > token_budget:
+            continue
+        selected.add(i)
+        used_tokens += passage_tokens
+    if not selected:
+        return tss_text, original_tokens, original_tokens
+
+    parts = []
+    previous = -1
+    for i in sorted(selected):
+        if i != previous + 1:
+            parts.append(OMISSION_MARKER)
+        parts.append(passages[i])
+        previous = i
+    if previous != len(passages) - 1:
+        parts.append(OMISSION_MARKER)
+    trimmed = "\n".join(parts)
+    return trimmed, original_tokens, estimate_tokens(trimmed)
@@ -0,0 +1,59 @@
+import os
+import threading
+
+
+class FileCache:
+    """Values computed from files, kept while each file is unchanged (same size and modification time).
+
+    Lets a long-lived process (the GUI, blitz_daemon.py) parse the SD documents and templates
+    once instead of once per run. Cached values are shared: callers must not modify them.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _stamp(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def peek(self, path):
+        """Cached value of an unchanged file, or None."""
+        stamp = self._stamp(path)
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+        return entry[1] if entry and stamp and entry[0] == stamp else None
+
+    def get(self, path, load):
+        """
+        Value of a file, computed by load(path) unless the file is unchanged since it was cached.
+
+        Args:
+            path (str): The file.
+            load (callable): Computes the value from the path; exceptions are passed on (nothing is cached).
+
+        Returns:
+            The value.
+        """
+        stamp = self._stamp(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and stamp and entry[0] == stamp:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = load(path)
+        if stamp:
+            with self._lock:
+                self._entries[key] = (stamp, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()